@@ -11,10 +11,13 @@ from pathlib import Path
 
 # Ajouter le répertoire parent au path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+# Référentiel titres partagé avec le pipeline news (ISIN <-> ticker <-> secteur)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'llboursa_scraper'))
 
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from security_master import get_security_master
 
 print("="*80)
 print("🧠 TEST - Détection d'Anomalies BVMT 2025")
@@ -79,6 +82,13 @@ try:
     # Trier
     df = df.sort_values(['date', 'ticker']).reset_index(drop=True)
     
+    # Relier chaque ISIN au ticker du pipeline news et à son secteur
+    security_master = get_security_master()
+    linked_tickers = sum(
+        security_master.register_isin(isin, name) is not None
+        for isin, name in df[['ticker', 'company_name']].drop_duplicates('ticker').itertuples(index=False)
+    )
+    
     # Stats
     unique_tickers = df['ticker'].nunique()
     trading_days = df['date'].nunique()
@@ -86,6 +96,7 @@ try:
     print(f"   ✅ {len(df):,} lignes chargées")
     print(f"   ✅ {trading_days} jours de cotation")
     print(f"   ✅ {unique_tickers} actions uniques")
+    print(f"   ✅ {linked_tickers} reliées au référentiel titres")
     
     if len(df) > 0 and df['date'].notna().any():
         print(f"   ✅ Période: {df['date'].min().date()} → {df['date'].max().date()}")
@@ -292,7 +303,15 @@ try:
             # Convertir published_date en datetime
             news_df['published_date'] = pd.to_datetime(news_df['published_date'], errors='coerce')
             
-            # Matcher anomalies avec news proches (±3 jours)
+            # Titres et secteurs cités par chaque news, résolus via le référentiel titres
+            news_df['stock_keys'] = news_df['affected_stocks'].apply(
+                lambda stocks: {security_master.ticker_for(s) for s in (stocks or [])} - {None}
+            )
+            news_df['sector_keys'] = news_df['affected_sectors'].apply(
+                lambda sectors: {s.lower().replace(' ', '_') for s in (sectors or [])}
+            )
+            
+            # Matcher anomalies avec news proches (±3 jours) citant l'action, sinon son secteur
             df_anomalies['news_context'] = None
             df_anomalies['news_sentiment'] = None
             
@@ -305,6 +324,12 @@ try:
                     (news_df['published_date'] >= date_min) &
                     (news_df['published_date'] <= date_max)
                 ]
+                security = security_master.get(row['ticker'])
+                if security is None:
+                    continue
+                stock_news = related_news[related_news['stock_keys'].apply(lambda keys: security.ticker in keys)]
+                sector_news = related_news[related_news['sector_keys'].apply(lambda keys: security.sector in keys)]
+                related_news = stock_news if len(stock_news) > 0 else sector_news
                 
                 if len(related_news) > 0:
                     # Prendre la news la plus proche
@@ -420,6 +445,8 @@ for idx, row in all_anomalies.iterrows():
         "timestamp": date_str,
         "ticker": row['ticker'],
         "company_name": row['company_name'],
+        "news_ticker": security_master.ticker_for(row['ticker']),
+        "sector": security_master.sector_for(row['ticker']),
         "type": alert_type,
         "severity": severity,
         "description": description,
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+BVMT listing parser
+Extracts articles from a bvmt.com.tn news listing page (/fr/actualites?page=N)
+with CSS selectors, without an LLM call.
+
+parse_listing() raises LayoutChanged when the page does not look like the
+listing it was written for (no article rows, or rows without a title, link
+or date), so the scraper can fall back to the agent instead of silently
+storing nothing.
+
+Experimental: the selectors have not been checked against live pages yet
+(the test fixtures are reconstructed), so the scraper only uses this parser
+with --html-parser / BVMT_HTML_PARSER=1.
+
+Usage (offline, on saved pages):
+    python listing_parser.py page_0.html page_1.html
+    python listing_parser.py page_0.html --json     # Print the parsed articles
+"""
+
+import re
+import sys
+import json
+import argparse
+from typing import List, Dict, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+BASE_URL = "https://www.bvmt.com.tn/fr/actualites"
+
+# Drupal views markup of the listing
+ITEM_SELECTOR = ".view-content .views-row"
+EMPTY_SELECTOR = ".view-empty"
+TITLE_SELECTOR = ".views-field-title a, h2 a, h3 a"
+DATE_SELECTOR = ".views-field-created, .views-field-field-date, .date-display-single, time"
+BODY_SELECTOR = ".views-field-body, .views-field-field-resume, .views-field-field-description"
+
+FRENCH_MONTHS = {
+    "janvier": 1, "fevrier": 2, "février": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6,
+    "juillet": 7, "aout": 8, "août": 8, "septembre": 9, "octobre": 10, "novembre": 11,
+    "decembre": 12, "décembre": 12,
+}
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b")
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})")
+WORDED_DATE = re.compile(r"\b(\d{1,2})\s+([a-zéû]+)\s+(\d{4})\b", re.IGNORECASE)
+
+
+class LayoutChanged(Exception):
+    """The page no longer matches the listing selectors"""
+
+
+def listing_url(page_num: int) -> str:
+    """URL of a listing page (page 0 has no page parameter)"""
+    url = f"{BASE_URL}?uid=0&datedebut=&datefin="
+    return url if page_num == 0 else f"{url}&page={page_num}"
+
+
+def normalize_date(text: str) -> Optional[str]:
+    """DD/MM/YYYY from a numeric, ISO or French worded date (None if none is found)"""
+    text = text or ""
+    match = NUMERIC_DATE.search(text)
+    if match:
+        day, month, year = (int(g) for g in match.groups())
+    else:
+        match = ISO_DATE.search(text)
+        if match:
+            year, month, day = (int(g) for g in match.groups())
+        else:
+            match = WORDED_DATE.search(text)
+            month = FRENCH_MONTHS.get(match.group(2).lower()) if match else None
+            if not month:
+                return None
+            day, year = int(match.group(1)), int(match.group(3))
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    return f"{day:02d}/{month:02d}/{year}"
+
+
+def clean_text(element) -> str:
+    return " ".join(element.get_text(" ", strip=True).split()) if element else ""
+
+
+def parse_listing(html: str, page_url: str = BASE_URL) -> List[Dict]:
+    """
+    Articles of a listing page as {title, date, link, content} dicts, in page order.
+    Returns [] for a listing past the last page; raises LayoutChanged otherwise.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    rows = soup.select(ITEM_SELECTOR)
+    if not rows:
+        if soup.select_one(EMPTY_SELECTOR):
+            return []
+        raise LayoutChanged(f"no rows match {ITEM_SELECTOR!r}")
+
+    articles = []
+    for position, row in enumerate(rows):
+        anchor = row.select_one(TITLE_SELECTOR)
+        title = clean_text(anchor)
+        href = anchor.get("href") if anchor else None
+        link = urljoin(page_url, href) if href else ""
+        date_element = row.select_one(DATE_SELECTOR)
+        date_text = (date_element.get("datetime") or clean_text(date_element)) if date_element else ""
+        date = normalize_date(date_text)
+        if not (title and link and date):
+            raise LayoutChanged(f"row {position} has no title, link or date")
+
+        articles.append({
+            "title": title,
+            "content": clean_text(row.select_one(BODY_SELECTOR)),
+            "date": date,
+            "link": link,
+        })
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse saved bvmt.com.tn listing pages")
+    parser.add_argument("paths", nargs="+", help="Saved listing pages (.html)")
+    parser.add_argument("--json", action="store_true", help="Print the parsed articles")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        try:
+            articles = parse_listing(html)
+        except LayoutChanged as e:
+            print(f"❌ {path}: layout changed ({e})")
+            failed += 1
+            continue
+        print(f"✅ {path}: {len(articles)} articles")
+        if args.json:
+            print(json.dumps(articles, indent=2, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Resumable NDJSON export
+Streams articles to a newline-delimited JSON file, one article per line,
+as they are produced, and keeps a checkpoint next to it (PATH.checkpoint)
+with the byte offset and the position reached (e.g. the next listing page
+or the last exported row id). An interrupted export resumes from the
+checkpoint: the file is truncated to the last complete write, so no line
+is duplicated or cut in half. The checkpoint is removed once the export
+finishes; the next export to the same path starts over.
+"""
+
+import os
+import json
+from typing import Dict, Iterable
+
+
+class NdjsonExport:
+    """Append-only NDJSON file with a resume checkpoint"""
+
+    def __init__(self, path: str, kind: str, resume: bool = True):
+        """kind names what the position refers to ("crawl", "store"); a checkpoint of another kind is ignored"""
+        self.path = path
+        self.kind = kind
+        self.checkpoint_path = path + ".checkpoint"
+
+        state = self._load_checkpoint() if resume else None
+        if state and state.get("kind") == kind and os.path.exists(path):
+            self.position = state["position"]
+            self.written = state["written"]
+            offset = state["offset"]
+            print(f"⏯️  Resuming export to {path} after {self.written} articles")
+        else:
+            self.position, self.written, offset = {}, 0, 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "r+b" if offset else "wb")
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, articles: Iterable[Dict], **position):
+        """Append articles, then record the position reached (only after the lines are on disk)"""
+        for article in articles:
+            self.file.write(json.dumps(article, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            self.written += 1
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.position.update(position)
+        state = {"kind": self.kind, "offset": self.file.tell(), "written": self.written, "position": self.position}
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def finish(self):
+        """Close the file and drop the checkpoint: the export is complete"""
+        self.file.close()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        print(f"✅ Exported {self.written} articles to {self.path}")
+
+    def close(self):
+        """Close the file and keep the checkpoint so the export can resume"""
+        self.file.close()
@@ -0,0 +1,86 @@
+"""
+The scraper is a flat script run from bvmt_scraper/: import it the same way.
+FakeSupabase stands in for the few table queries the scraper makes.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPER_DIR)
+
+
+@pytest.fixture(autouse=True)
+def scraper_dir(monkeypatch):
+    monkeypatch.chdir(SCRAPER_DIR)
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.limit_to = None
+        self.action = None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return self
+
+    def upsert(self, rows, on_conflict, ignore_duplicates=False):
+        self.action = ("upsert", rows, on_conflict)
+        return self
+
+    def update(self, values):
+        self.action = ("update", values)
+        return self
+
+    def execute(self):
+        if self.action and self.action[0] == "upsert":
+            _, rows, key = self.action
+            stored = {row.get(key) for row in self.rows}
+            inserted = [dict(row, id=len(self.rows) + i + 1) for i, row in enumerate(rows) if row[key] not in stored]
+            self.rows.extend(inserted)
+            return SimpleNamespace(data=inserted)
+        matched = sorted((row for row in self.rows if all(f(row) for f in self.filters)), key=lambda row: row.get("id", 0))
+        if self.action:
+            for row in matched:
+                row.update(self.action[1])
+        return SimpleNamespace(data=matched[:self.limit_to])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name):
+        return FakeQuery(self.tables.setdefault(name, []))
+
+
+@pytest.fixture
+def supabase():
+    return FakeSupabase()
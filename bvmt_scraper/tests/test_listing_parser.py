@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from listing_parser import LayoutChanged, listing_url, normalize_date, parse_listing
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def test_listing_rows_give_title_date_and_link():
+    articles = parse_listing(load("listing_page_0.html"), listing_url(0))
+
+    assert [(a["title"], a["date"], a["link"]) for a in articles] == [
+        ("SFBT : Indicateurs d'activité au 30 juin 2024", "12/07/2024",
+         "https://www.bvmt.com.tn/fr/content/sfbt-indicateurs-dactivite-au-30-juin-2024"),
+        ("BIAT : Paiement de dividendes", "11/07/2024",
+         "https://www.bvmt.com.tn/fr/content/biat-paiement-de-dividendes"),
+        ("Avis de la Bourse : Suspension de cotation", "08/07/2024",
+         "https://www.bvmt.com.tn/fr/content/avis-de-la-bourse-suspension-de-cotation"),
+    ]
+    assert articles[0]["content"] == "La SFBT publie ses indicateurs d'activité relatifs au deuxième trimestre 2024."
+    assert articles[2]["content"] == ""
+
+
+def test_listing_past_last_page_is_empty():
+    assert parse_listing(load("listing_past_last_page.html")) == []
+
+
+def test_unknown_layout_raises():
+    with pytest.raises(LayoutChanged):
+        parse_listing(load("listing_redesigned.html"))
+
+
+def test_row_without_date_raises():
+    html = load("listing_page_0.html").replace("08/07/2024", "")
+    with pytest.raises(LayoutChanged, match="row 2"):
+        parse_listing(html)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12/07/2024", "12/07/2024"),
+    ("2024-07-12T10:30:00+01:00", "12/07/2024"),
+    ("Publié le 3 août 2024", "03/08/2024"),
+    ("31/13/2024", None),
+    ("hier", None),
+])
+def test_normalize_date(text, expected):
+    assert normalize_date(text) == expected
@@ -0,0 +1,40 @@
+import json
+
+from ndjson_export import NdjsonExport
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_truncates_to_last_checkpoint(tmp_path):
+    path = str(tmp_path / "news.ndjson")
+    export = NdjsonExport(path, "crawl")
+    export.write([{"title": "a"}, {"title": "b"}], next_page=1)
+    # Interrupted mid-write: a half line after the checkpointed offset
+    export.file.write(b'{"title": "c", "con')
+    export.close()
+
+    resumed = NdjsonExport(path, "crawl")
+    assert resumed.position == {"next_page": 1}
+    assert resumed.written == 2
+    resumed.write([{"title": "c"}], next_page=2)
+    resumed.finish()
+
+    assert [row["title"] for row in read_lines(path)] == ["a", "b", "c"]
+    assert not (tmp_path / "news.ndjson.checkpoint").exists()
+
+
+def test_checkpoint_of_another_kind_starts_over(tmp_path):
+    path = str(tmp_path / "news.ndjson")
+    export = NdjsonExport(path, "store")
+    export.write([{"title": "a"}], last_id=10)
+    export.close()
+
+    restarted = NdjsonExport(path, "crawl")
+    assert restarted.position == {}
+    restarted.write([{"title": "b"}], next_page=1)
+    restarted.finish()
+
+    assert [row["title"] for row in read_lines(path)] == ["b"]
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("agno")
+pytest.importorskip("supabase")
+
+import tunisian_news_scraper
+from near_duplicates import NearDuplicateIndex
+from listing_parser import LayoutChanged
+from ndjson_export import NdjsonExport
+from tunisian_news_scraper import TunisianNewsScaper, content_hash
+
+STORY = ("La Société Frigorifique et Brasserie de Tunis annonce un chiffre d'affaires "
+         "consolidé en hausse de douze pour cent au premier semestre, porté par les ventes "
+         "de boissons gazeuses et l'export vers les marchés africains de la région. "
+         "Le groupe confirme ses objectifs annuels et prévoit de nouveaux investissements "
+         "dans ses usines de production, ainsi qu'un dividende stable pour ses actionnaires. "
+         "La direction souligne la bonne tenue des marges malgré la hausse du coût des matières "
+         "premières et de l'énergie, grâce à une politique de prix maîtrisée et à des gains "
+         "de productivité. L'endettement net recule par rapport à la fin de l'exercice précédent "
+         "et la trésorerie disponible permet de financer le programme d'investissement sans "
+         "recourir à de nouveaux emprunts bancaires au cours des deux prochaines années.")
+
+
+LISTINGS = Path(__file__).parent / "fixtures"
+
+
+def article(title, content=STORY, day="12/07/2024"):
+    return {"title": title, "date": day, "content": content}
+
+
+@pytest.fixture
+def scraper(supabase, tmp_path, monkeypatch):
+    """Scraper over a fake Supabase whose listing is set through scraper.pages"""
+    scraper = TunisianNewsScaper.__new__(TunisianNewsScaper)
+    scraper.supabase = supabase
+    scraper.local = threading.local()
+    scraper.lock = threading.Lock()
+    scraper.total_scraped = 0
+    scraper.failed_pages = []
+    scraper.dedup_index = NearDuplicateIndex(str(tmp_path / "index.sqlite"))
+    scraper.html_parser = False
+    scraper.agent_fallback = False
+    scraper.pages = []
+    scraper.broken = set()
+    scraper.read = []
+
+    def fetch_page(page_num):
+        scraper.read.append(page_num)
+        if page_num in scraper.broken:
+            raise ConnectionError("listing unreachable")
+        listing = scraper.pages[page_num] if page_num < len(scraper.pages) else []
+        return [dict(a, content_hash=content_hash(a)) for a in listing]
+
+    monkeypatch.setattr(scraper, "fetch_page", fetch_page)
+    monkeypatch.setattr(tunisian_news_scraper.time, "sleep", lambda seconds: None)
+    return scraper
+
+
+def test_until_known_stops_at_first_fully_known_page(scraper):
+    scraper.pages = [[article("Résultats SFBT", STORY)], [article("Dividende BIAT", "Le conseil propose un dividende " * 10)]]
+    scraper.insert_batch([article("Dividende BIAT", "Le conseil propose un dividende " * 10)])
+
+    assert scraper.scrape_until_known(max_pages=5) == 2
+    assert scraper.read == [0, 1]
+    assert len(scraper.supabase.tables["tunisian_news"]) == 2
+
+
+def test_dropped_near_duplicates_count_as_known(scraper):
+    # The same story republished the next day with a source line: dropped, never stored
+    scraper.pages = [[article("Résultats SFBT"), article("Résultats SFBT", STORY + " Source: BVMT", "13/07/2024")]]
+    assert scraper.scrape_until_known(max_pages=5) == 2
+    assert len(scraper.supabase.tables["tunisian_news"]) == 1
+    assert len(scraper.supabase.tables["tunisian_news_seen"]) == 1
+
+    scraper.read = []
+    assert scraper.scrape_until_known(max_pages=5) == 1
+    assert scraper.read == [0]
+
+
+def test_backfill_hashes_fills_legacy_rows_and_skips_duplicates(scraper):
+    rows = scraper.supabase.tables.setdefault("tunisian_news", [])
+    legacy = article("Résultats SFBT")
+    rows.extend([dict(legacy, id=1, content_hash=None), dict(legacy, id=2, content_hash=None),
+                 dict(article("Dividende BIAT"), id=3, content_hash="hash of the body")])
+
+    assert scraper.backfill_hashes(chunk_size=2) == 2
+    assert [row["content_hash"] for row in rows] == [content_hash(legacy), None, content_hash(article("Dividende BIAT"))]
+    assert scraper.backfill_hashes(chunk_size=2) == 0
+
+    scraper.pages = [[legacy]]
+    assert scraper.scrape_until_known(max_pages=5) == 1
+
+
+def test_hash_ignores_the_body_and_prefers_the_link():
+    first = article("Résultats SFBT", "Résumé rédigé par l'agent.")
+    assert content_hash(first) == content_hash(article("  résultats  SFBT ", "Un autre résumé du même article."))
+    assert content_hash(first) != content_hash(article("Résultats SFBT", day="13/07/2024"))
+
+    link = "https://www.bvmt.com.tn/fr/content/resultats-sfbt"
+    assert content_hash(dict(first, link=link)) == content_hash(article("Titre corrigé", day="13/07/2024") | {"link": link})
+    assert content_hash(dict(first, link=link)) != content_hash(first)
+
+
+def test_until_known_stops_at_a_failed_page(scraper):
+    notice = article("Avis de la Bourse", "Suspension de la cotation du titre en séance " * 10)
+    scraper.pages = [[article("Résultats SFBT")], [article("Dividende BIAT", "Le conseil propose un dividende " * 10)], [notice]]
+    scraper.insert_batch([notice])
+    scraper.broken = {1}
+
+    assert scraper.scrape_until_known(max_pages=5) is None
+    assert scraper.read == [0, 1, 1, 1]  # Page 1 retried, page 2 never reached
+    assert scraper.failed_pages == [1]
+
+    # The retry advised on failure: a crawl of the first pages
+    scraper.broken = set()
+    scraper.scrape_all(end_page=2, workers=1)
+    assert len(scraper.supabase.tables["tunisian_news"]) == 3
+
+
+def test_crawl_export_retries_failed_pages_on_resume(scraper, tmp_path):
+    path = str(tmp_path / "news.ndjson")
+    scraper.pages = [[article(f"Article {page}")] for page in range(4)]
+    scraper.broken = {1}
+    scraper.save_to_file(path, from_store=False, end_page=3)
+
+    checkpoint = json.load(open(path + ".checkpoint"))
+    assert checkpoint["position"] == {"next_page": 4, "failed_pages": [1]}
+
+    scraper.broken = set()
+    scraper.failed_pages = []
+    scraper.read = []
+    scraper.save_to_file(path, from_store=False, end_page=3)
+
+    assert scraper.read == [1]
+    assert not os.path.exists(path + ".checkpoint")
+    with open(path, encoding="utf-8") as f:
+        titles = [json.loads(line)["title"] for line in f]
+    assert titles == ["Article 0", "Article 2", "Article 3", "Article 1"]
+
+
+@pytest.mark.parametrize("listing, titles", [
+    ("listing_page_0.html", ["SFBT : Indicateurs d'activité au 30 juin 2024", "BIAT : Paiement de dividendes",
+                             "Avis de la Bourse : Suspension de cotation"]),
+    # No row matches the selectors: the agent reads the page
+    ("listing_redesigned.html", ["Lu par l'agent"]),
+])
+def test_agent_reads_only_pages_the_selectors_miss(scraper, monkeypatch, listing, titles):
+    monkeypatch.delattr(scraper, "fetch_page")
+    monkeypatch.setattr(scraper, "fetch_html", lambda url: (LISTINGS / listing).read_text(encoding="utf-8"))
+    monkeypatch.setattr(scraper, "agent_page", lambda url: [article("Lu par l'agent")])
+    scraper.html_parser = True
+    scraper.agent_fallback = True
+
+    articles = scraper.fetch_page(0)
+    assert [a["title"] for a in articles] == titles
+    assert all(a["content_hash"] == content_hash(a) for a in articles)
+
+
+def test_agent_reads_every_page_unless_the_html_parser_is_enabled(scraper, monkeypatch):
+    monkeypatch.delattr(scraper, "fetch_page")
+    monkeypatch.setattr(scraper, "fetch_html", lambda url: pytest.fail("listing downloaded without --html-parser"))
+    monkeypatch.setattr(scraper, "agent_page", lambda url: [article("Lu par l'agent")])
+
+    articles = scraper.fetch_page(0)
+    assert [a["title"] for a in articles] == ["Lu par l'agent"]
+    assert articles[0]["link"] is None
+
+
+def test_layout_change_fails_the_page_without_the_agent(scraper, monkeypatch):
+    monkeypatch.delattr(scraper, "fetch_page")
+    scraper.html_parser = True
+    monkeypatch.setattr(scraper, "fetch_html", lambda url: (LISTINGS / "listing_redesigned.html").read_text(encoding="utf-8"))
+
+    with pytest.raises(LayoutChanged):
+        scraper.fetch_page(0)
+    assert scraper.scrape_page(0) == []
+    assert scraper.failed_pages == [0]
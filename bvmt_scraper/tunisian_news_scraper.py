@@ -5,18 +5,36 @@ Scrapes financial news from BVMT website and stores in Supabase
 """
 
 import os
+import sys
 import json
 import re
 import time
-from datetime import datetime
-from typing import List, Dict
+import hashlib
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+from pathlib import Path
+from typing import List, Dict, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
+import requests
 from agno.agent import Agent
 from agno.tools.firecrawl import FirecrawlTools
 from agno.models.anthropic import Claude
 from supabase import create_client, Client
 
+# Shared near-duplicate index and job ledger with the ilboursa pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "llboursa_scraper"))
+from near_duplicates import NearDuplicateIndex
+from job_ledger import JobLedger
+from host_limiter import get_host_limiter, parse_retry_after
+from metrics import get_metrics
+
+from listing_parser import LayoutChanged, listing_url, parse_listing
+from ndjson_export import NdjsonExport
+
 # Load environment variables
 load_dotenv()
 
@@ -26,6 +44,56 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
 BATCH_SIZE = 5  # Process 5 pages before inserting to DB
+PAGE_WORKERS = int(os.getenv("BVMT_PAGE_WORKERS", "4"))  # Pages fetched concurrently
+PAGE_RETRIES = int(os.getenv("BVMT_PAGE_RETRIES", "3"))  # Attempts per page
+SOURCE = "bvmt"  # High-water mark key in the job ledger
+USER_AGENT = "Mozilla/5.0 (compatible; llboursa-news-scraper)"
+# Experimental: the listing_parser selectors have only been checked on reconstructed pages, not on the live site
+HTML_PARSER = os.getenv("BVMT_HTML_PARSER", "0") == "1"
+
+
+def agent_usage(response) -> Dict[str, int]:
+    """Token usage of an agno run (Metrics object, or dict of per-message lists in older agno)"""
+    usage = getattr(response, "metrics", None)
+    if usage is None:
+        return {"input": 0, "cached": 0, "output": 0}
+
+    def read(*names):
+        for name in names:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            if isinstance(value, list):
+                value = sum(v or 0 for v in value)
+            if value:
+                return int(value)
+        return 0
+
+    return {
+        "input": read("input_tokens", "prompt_tokens"),
+        "cached": read("cache_read_tokens", "cached_tokens"),
+        "output": read("output_tokens", "completion_tokens"),
+    }
+
+
+def parse_article_date(value) -> Optional[date]:
+    """Parse a DD/MM/YYYY article date (None if missing or malformed)"""
+    try:
+        return datetime.strptime((value or "").strip(), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def content_hash(article: Dict) -> str:
+    """
+    Identity of an article: SHA-256 of its link, or of its title and date
+    (case- and whitespace-normalized) when it has none. The body is left out:
+    on pages read by the agent it is a summary that changes between runs.
+    """
+    link = (article.get('link') or "").strip()
+    if link:
+        key = f"link\n{link}"
+    else:
+        key = "\n".join(" ".join((article.get(part) or "").split()).casefold() for part in ('title', 'date'))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
 
 class TunisianNewsScaper:
@@ -34,13 +102,26 @@ class TunisianNewsScaper:
     def __init__(self, supabase_url: str, supabase_key: str):
         """Initialize the scraper with Supabase credentials"""
         self.supabase = create_client(supabase_url, supabase_key)
-        self.agent = Agent(
-            model=Claude(),
-            tools=[FirecrawlTools(enable_scrape=True)],
-            debug_mode=False
-        )
+        self.local = threading.local()
+        self.lock = threading.Lock()
         self.total_scraped = 0
         self.failed_pages = []
+        self.dedup_index = NearDuplicateIndex()
+        # The agent reads every page, or with the HTML parser only the pages it no longer understands
+        self.html_parser = HTML_PARSER
+        self.agent_fallback = bool(ANTHROPIC_API_KEY and FIRECRAWL_API_KEY)
+
+    @property
+    def agent(self) -> Agent:
+        """The calling thread's agent (an agno Agent keeps per-run state, so workers don't share one)"""
+        agent = getattr(self.local, "agent", None)
+        if agent is None:
+            agent = self.local.agent = Agent(
+                model=Claude(),
+                tools=[FirecrawlTools(enable_scrape=True)],
+                debug_mode=False
+            )
+        return agent
 
     def extract_json(self, text: str) -> List[Dict]:
         """Extract JSON array from response text"""
@@ -56,17 +137,21 @@ class TunisianNewsScaper:
 
         return []
 
-    def scrape_page(self, page_num: int) -> List[Dict]:
-        """Scrape a single page of news articles"""
-        url = (
-            f"https://www.bvmt.com.tn/fr/actualites?uid=0&datedebut=&datefin="
-            if page_num == 0
-            else f"https://www.bvmt.com.tn/fr/actualites?uid=0&datedebut=&datefin=&page={page_num}"
-        )
-
-        print(f"📄 Page {page_num}: {url}")
-
-        try:
+    def fetch_html(self, url: str) -> str:
+        """Download a listing page under the shared per-host limiter"""
+        with get_host_limiter().slot(url) as slot:
+            response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=30)
+            slot.status = response.status_code
+            slot.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        response.raise_for_status()
+        return response.text
+
+    def agent_page(self, url: str) -> List[Dict]:
+        """Have the agent (Claude + Firecrawl) read a listing page"""
+        metrics = get_metrics()
+        # An agent run (LLM + fetch) is too slow to be a latency signal, so only failures adapt the pace
+        with get_host_limiter().slot(url, measure_latency=False):
+            started = datetime.now()
             response = self.agent.run(
                 f"""Scrape {url}
 
@@ -80,109 +165,428 @@ class TunisianNewsScaper:
                 ]"""
             )
 
-            articles = self.extract_json(response.content)
-
-            # Add metadata to each article
-            for article in articles:
-                article['page_number'] = page_num
-                article['source_url'] = url
-                article['scraped_at'] = datetime.now().isoformat()
-
-            print(f"✅ Found {len(articles)} articles")
-            return articles
+        usage = agent_usage(response)
+        metrics.record_llm_call(
+            getattr(self.agent.model, "id", None), (datetime.now() - started).total_seconds(),
+            usage["input"] + usage["cached"], usage["cached"], usage["output"]
+        )
+        return self.extract_json(response.content)
 
-        except Exception as e:
-            print(f"❌ Error on page {page_num}: {e}")
+    def fetch_page(self, page_num: int) -> List[Dict]:
+        """Scrape a single page of news articles (raises on failure)"""
+        url = listing_url(page_num)
+        print(f"📄 Page {page_num}: {url}")
+        metrics = get_metrics()
+
+        with metrics.timer("stage_seconds", stage="listing_page", source="bvmt"):
+            if not self.html_parser:
+                articles = self.agent_page(url)
+                parser = "agent"
+            else:
+                html = self.fetch_html(url)
+                try:
+                    articles = parse_listing(html, url)
+                    parser = "html"
+                except LayoutChanged as e:
+                    if not self.agent_fallback:
+                        raise
+                    print(f"⚠️  Page {page_num} layout changed ({e}), falling back to the agent")
+                    articles = self.agent_page(url)
+                    parser = "agent"
+
+        # Add metadata to each article
+        for article in articles:
+            article.setdefault('link', None)  # The agent fallback returns no links
+            article['content_hash'] = content_hash(article)
+            article['page_number'] = page_num
+            article['source_url'] = url
+            article['scraped_at'] = datetime.now().isoformat()
+
+        print(f"✅ Found {len(articles)} articles")
+        metrics.inc("pages_total", source="bvmt", parser=parser, result="ok" if articles else "empty")
+        metrics.inc("articles_total", len(articles), source="bvmt", result="discovered")
+        return articles
+
+    def scrape_page(self, page_num: int, retries: int = PAGE_RETRIES) -> List[Dict]:
+        """Scrape a page with retries and exponential backoff ([] and failed_pages on failure)"""
+        for attempt in range(1, retries + 1):
+            try:
+                return self.fetch_page(page_num)
+            except Exception as e:
+                print(f"❌ Error on page {page_num} (attempt {attempt}/{retries}): {e}")
+                if attempt < retries:
+                    # Jittered so concurrent workers don't retry in lockstep
+                    time.sleep(min(30, 2 ** attempt) * (0.5 + random.random()))
+
+        get_metrics().inc("pages_total", source="bvmt", result="failed")
+        with self.lock:
             self.failed_pages.append(page_num)
-            return []
+        return []
+
+    def drop_near_duplicates(self, articles: List[Dict]) -> List[Dict]:
+        """
+        Keep only the first copy of stories already seen on any source.
+        The hashes of dropped copies are recorded as seen, so they count as known.
+        """
+        unique, dropped = [], []
+        for article in articles:
+            key = f"bvmt:{article.get('date', '')}:{article.get('title', '')}"
+            text = f"{article.get('title', '')}\n{article.get('content', '')}"
+            canonical = self.dedup_index.add(key, text, source="bvmt")
+            if canonical == key:
+                unique.append(article)
+            else:
+                print(f"🔁 Near-duplicate of {canonical}: {article.get('title', '')[:50]}")
+                get_metrics().inc("articles_total", source="bvmt", result="near_duplicate")
+                dropped.append({"content_hash": article['content_hash'], "canonical": canonical})
+        if dropped:
+            try:
+                self.supabase.table('tunisian_news_seen').upsert(
+                    dropped, on_conflict='content_hash', ignore_duplicates=True
+                ).execute()
+            except Exception as e:
+                print(f"⚠️  Could not record near-duplicate hashes: {e}")
+        return unique
+
+    def stored_hashes(self, table: str, hashes: List[str]) -> set:
+        if not hashes:
+            return set()
+        result = self.supabase.table(table).select('content_hash').in_('content_hash', list(hashes)).execute()
+        return {row['content_hash'] for row in result.data}
+
+    def known_hashes(self, hashes: List[str]) -> set:
+        """Content hashes already stored in tunisian_news or dropped as near-duplicates"""
+        known = self.stored_hashes('tunisian_news', hashes)
+        return known | self.stored_hashes('tunisian_news_seen', [h for h in hashes if h not in known])
 
     def insert_batch(self, articles: List[Dict]):
-        """Insert a batch of articles to Supabase"""
+        """Upsert a batch of articles to Supabase (articles already stored, by content hash, are left alone)"""
+        unique = {}
+        for article in articles:
+            article['content_hash'] = article.get('content_hash') or content_hash(article)
+            unique.setdefault(article['content_hash'], article)
+        articles = self.drop_near_duplicates(list(unique.values()))
         if not articles:
             return
 
+        metrics = get_metrics()
         try:
-            result = self.supabase.table('tunisian_news').insert(articles).execute()
-            print(f"💾 Inserted {len(articles)} articles to Supabase")
-            self.total_scraped += len(articles)
+            with metrics.timer("stage_seconds", stage="db_write", source="bvmt"):
+                result = self.supabase.table('tunisian_news').upsert(
+                    articles, on_conflict='content_hash', ignore_duplicates=True
+                ).execute()
+            inserted = len(result.data) if result.data is not None else len(articles)
+            print(f"💾 Inserted {inserted} new articles to Supabase ({len(articles) - inserted} already stored)")
+            self.total_scraped += inserted
+            metrics.inc("articles_total", inserted, source="bvmt", result="saved")
+            metrics.inc("articles_total", len(articles) - inserted, source="bvmt", result="known")
         except Exception as e:
             print(f"❌ Supabase error: {e}")
-
-    def scrape_all(self, start_page: int = 0, end_page: int = 20):
-        """Scrape all pages with batch processing"""
+            metrics.inc("articles_total", len(articles), source="bvmt", result="save_failed")
+
+    def iter_pages(self, start_page: int = 0, end_page: int = 20, workers: int = PAGE_WORKERS,
+                   pages: Optional[List[int]] = None) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Yield (page_num, articles) in page order while pages are fetched concurrently.
+
+        Each page is retried with backoff; a page is yielded as soon as
+        every earlier page has finished, so callers see a deterministic
+        order whatever order the workers finish in. `pages` overrides the
+        start_page..end_page range.
+        """
+        pages = list(pages) if pages is not None else list(range(start_page, end_page + 1))
+        finished = {}
+        next_index = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(self.scrape_page, page_num): page_num for page_num in pages}
+            for future in as_completed(futures):
+                finished[futures[future]] = future.result()
+
+                # Hand out the contiguous run of finished pages
+                while next_index < len(pages) and pages[next_index] in finished:
+                    yield pages[next_index], finished.pop(pages[next_index])
+                    next_index += 1
+
+    def scrape_all(self, start_page: int = 0, end_page: int = 20, workers: int = PAGE_WORKERS,
+                   export: Optional[NdjsonExport] = None):
+        """
+        Scrape all pages with a bounded worker pool and batch processing.
+
+        Articles are batched and inserted in page order (see iter_pages),
+        so runs stay deterministic (e.g. which copy of a near-duplicate is
+        kept). With `export`, each page is also appended to the NDJSON
+        export as it completes.
+        """
         batch = []
-
-        for page_num in range(start_page, end_page + 1):
-            articles = self.scrape_page(page_num)
+        pages = self.export_pages(export, start_page, end_page) if export else None
+        for page_num, articles in self.iter_pages(start_page, end_page, workers, pages):
+            if export:
+                self.export_page(export, page_num, articles)
             batch.extend(articles)
-
-            # Insert batch every BATCH_SIZE pages or at the end
-            if len(batch) >= BATCH_SIZE * 10 or page_num == end_page:
+            if len(batch) >= BATCH_SIZE * 10:
                 self.insert_batch(batch)
                 batch = []
 
-            # Delay between requests to avoid rate limiting
-            if page_num < end_page:
-                time.sleep(2)
+        if batch:
+            self.insert_batch(batch)
 
         print(f"\n{'='*50}")
         print(f"🎉 Scraping Complete!")
         print(f"📊 Total articles: {self.total_scraped}")
-        print(f"❌ Failed pages: {self.failed_pages if self.failed_pages else 'None'}")
+        print(f"❌ Failed pages: {sorted(self.failed_pages) if self.failed_pages else 'None'}")
+        for host, stats in get_host_limiter().stats().items():
+            print(f"🚦 {host}: {stats['requests']} requests, {stats['errors']} errors, interval {stats['interval_s']}s")
         print(f"{'='*50}")
 
-        # Retry failed pages
-        if self.failed_pages:
-            print(f"\n🔄 Retrying {len(self.failed_pages)} failed pages...")
-            retry_batch = []
-            for page_num in self.failed_pages[:]:
-                articles = self.scrape_page(page_num)
-                if articles:
-                    retry_batch.extend(articles)
-                    self.failed_pages.remove(page_num)
-                time.sleep(2)
-
-            if retry_batch:
-                self.insert_batch(retry_batch)
-
-    def save_to_file(self, filename: str = "tunisian_news.json"):
-        """Alternative method to save scraped data to a local JSON file"""
-        all_articles = []
-        
-        for page_num in range(0, 21):
+    def scrape_since(self, since: date, max_pages: int = 20) -> Optional[date]:
+        """
+        Scrape the newest-first listing until a page holds only articles older than `since`.
+
+        Returns the newest publication date seen, i.e. the new high-water
+        mark, or None if a page failed (the mark must not advance past it).
+        """
+        newest = None
+        for page_num in range(0, max_pages + 1):
             articles = self.scrape_page(page_num)
-            all_articles.extend(articles)
-            time.sleep(2)
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(all_articles, f, indent=2, ensure_ascii=False)
-        
-        print(f"\n✅ Saved {len(all_articles)} articles to {filename}")
+            if page_num in self.failed_pages:
+                return None
 
+            dates = [d for d in (parse_article_date(a.get('date')) for a in articles) if d]
+            # Undated articles are kept: they cannot be shown to be old
+            fresh = [a for a in articles if (parse_article_date(a.get('date')) or since) >= since]
+            if fresh:
+                self.insert_batch(fresh)
+            if dates:
+                newest = max(newest or dates[0], max(dates))
+
+            if not articles or (dates and max(dates) < since):
+                print(f"⏹️  Page {page_num} is older than {since:%d/%m/%Y}, stopping")
+                break
+
+        print(f"📊 Total articles: {self.total_scraped}")
+        return newest
+
+    def scrape_until_known(self, max_pages: int = 20) -> Optional[int]:
+        """
+        Scrape the newest-first listing until a page holds only articles already stored.
+
+        Known articles are recognized by content hash, so a daily run
+        usually reads one or two pages. Returns the number of pages read, or
+        None if a page failed: its articles were not seen, so a later known
+        page proves nothing and the run stops there to be retried.
+        """
+        for page_num in range(0, max_pages + 1):
+            articles = self.scrape_page(page_num)
+            if page_num in self.failed_pages:
+                print(f"❌ Page {page_num} failed, stopping before it is skipped")
+                print(f"📊 Total articles: {self.total_scraped} new")
+                return None
+            if not articles:
+                print(f"⏹️  Page {page_num} is empty, stopping")
+                break
+
+            known = self.known_hashes([a['content_hash'] for a in articles])
+            new = [a for a in articles if a['content_hash'] not in known]
+            if not new:
+                print(f"⏹️  Page {page_num} holds only known articles, stopping")
+                get_metrics().inc("articles_total", len(articles), source="bvmt", result="known")
+                break
+            self.insert_batch(new)
+
+        print(f"📊 Total articles: {self.total_scraped} new, {page_num + 1} pages read")
+        return page_num + 1
+
+    def backfill_hashes(self, chunk_size: int = 500) -> int:
+        """
+        Fill or recompute content_hash on stored rows: rows stored before the
+        column existed, or hashed by an earlier definition of content_hash.
+
+        Rows whose hash is already taken by another row (duplicates of the
+        same article) keep their old hash and are reported. Returns the
+        number of rows updated.
+        """
+        last_id, filled, duplicates = 0, 0, []
+        while True:
+            rows = self.supabase.table('tunisian_news').select('id, title, date, link, content_hash') \
+                .gt('id', last_id).order('id').limit(chunk_size).execute().data
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            hashes = {row['id']: content_hash(row) for row in rows if row.get('content_hash') != content_hash(row)}
+            taken = self.stored_hashes('tunisian_news', list(set(hashes.values())))
+            for row_id, row_hash in hashes.items():
+                if row_hash in taken:
+                    duplicates.append(row_id)
+                    continue
+                try:
+                    self.supabase.table('tunisian_news').update({'content_hash': row_hash}).eq('id', row_id).execute()
+                except Exception as e:
+                    print(f"❌ Row {row_id}: {e}")
+                    duplicates.append(row_id)
+                    continue
+                taken.add(row_hash)
+                filled += 1
+            print(f"🔑 Hashed {filled} rows (up to id {last_id})")
+
+        print(f"✅ Updated content_hash on {filled} rows")
+        if duplicates:
+            print(f"⚠️  {len(duplicates)} rows duplicate another row and keep their old hash: ids {duplicates[:20]}")
+        return filled
+
+    def export_store(self, export: NdjsonExport, chunk_size: int = 500):
+        """Stream the tunisian_news table to an NDJSON export, by ascending id (keyset pages)"""
+        last_id = export.position.get("last_id", 0)
+        while True:
+            rows = self.supabase.table('tunisian_news').select('*') \
+                .gt('id', last_id).order('id').limit(chunk_size).execute().data
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            export.write(rows, last_id=last_id)
+
+    def export_pages(self, export: NdjsonExport, start_page: int, end_page: int) -> List[int]:
+        """Pages a crawl export still needs: the failed ones first, then those after the checkpoint"""
+        failed = export.position.get("failed_pages", [])
+        next_page = export.position.get("next_page", start_page)
+        if failed:
+            print(f"🔁 Retrying failed pages {failed}")
+        return failed + [p for p in range(next_page, end_page + 1) if p not in failed]
+
+    def export_page(self, export: NdjsonExport, page_num: int, articles: List[Dict]):
+        """Append a crawled page to the export; a failed page is recorded instead, to be retried on resume"""
+        failed = set(export.position.get("failed_pages", []))
+        if page_num in self.failed_pages:
+            failed.add(page_num)
+        else:
+            failed.discard(page_num)
+        next_page = max(page_num + 1, export.position.get("next_page", 0))
+        export.write(articles, next_page=next_page, failed_pages=sorted(failed))
+
+    def finish_export(self, export: NdjsonExport):
+        """Complete a crawl export, or keep its checkpoint while some pages are still missing"""
+        failed = export.position.get("failed_pages")
+        if failed:
+            export.close()
+            print(f"⚠️  Pages {failed} failed: run the export again to retry them")
+        else:
+            export.finish()
+
+    def save_to_file(self, filename: str = "tunisian_news.ndjson", from_store: bool = True,
+                     start_page: int = 0, end_page: int = 20):
+        """
+        Stream articles to a resumable NDJSON file, one article per line.
+
+        By default the stored articles are exported, without scraping;
+        from_store=False exports a live crawl instead (nothing is inserted).
+        """
+        export = NdjsonExport(filename, "store" if from_store else "crawl")
+        try:
+            if from_store:
+                self.export_store(export)
+            else:
+                pages = self.export_pages(export, start_page, end_page)
+                for page_num, articles in self.iter_pages(pages=pages):
+                    self.export_page(export, page_num, articles)
+        except BaseException:
+            export.close()
+            raise
+        if from_store:
+            export.finish()
+        else:
+            self.finish_export(export)
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Scrape BVMT news into Supabase")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scrape from the last high-water mark (minus INCREMENTAL_OVERLAP_DAYS) to today")
+    parser.add_argument("--until-known", action="store_true",
+                        help="Stop at the first page whose articles are all already stored")
+    parser.add_argument("--start-page", type=int, default=0)
+    parser.add_argument("--end-page", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=PAGE_WORKERS,
+                        help="Pages fetched concurrently (default: BVMT_PAGE_WORKERS or 4)")
+    parser.add_argument("--export", metavar="PATH",
+                        help="Also stream the crawled articles to PATH as NDJSON (resumes an interrupted export)")
+    parser.add_argument("--backfill-hashes", action="store_true",
+                        help="Fill or recompute content_hash on stored rows, then exit")
+    parser.add_argument("--export-store", metavar="PATH",
+                        help="Only export the stored articles to PATH as NDJSON, without scraping")
+    parser.add_argument("--metrics", metavar="PATH", default=os.getenv("METRICS_OUTPUT"),
+                        help="Write run metrics to PATH (.json snapshot, otherwise Prometheus text)")
+    parser.add_argument("--html-parser", action="store_true", default=HTML_PARSER,
+                        help="Experimental: parse listing pages with listing_parser.py, the agent only reading "
+                             "pages it cannot (or set BVMT_HTML_PARSER=1)")
+    args = parser.parse_args()
+
     # Validate environment variables
-    if not all([SUPABASE_URL, SUPABASE_KEY, ANTHROPIC_API_KEY, FIRECRAWL_API_KEY]):
+    required = {"SUPABASE_URL": SUPABASE_URL, "SUPABASE_KEY": SUPABASE_KEY}
+    scrapes_with_agent = not (args.backfill_hashes or args.export_store or args.html_parser)
+    if scrapes_with_agent:
+        required.update({"ANTHROPIC_API_KEY": ANTHROPIC_API_KEY, "FIRECRAWL_API_KEY": FIRECRAWL_API_KEY})
+    if not all(required.values()):
         print("❌ Error: Missing required environment variables!")
         print("Please check your .env file and ensure all variables are set:")
-        print("  - SUPABASE_URL")
-        print("  - SUPABASE_KEY")
-        print("  - ANTHROPIC_API_KEY")
-        print("  - FIRECRAWL_API_KEY")
+        for name in required:
+            print(f"  - {name}")
         return
+    if args.html_parser and not all([ANTHROPIC_API_KEY, FIRECRAWL_API_KEY]):
+        print("⚠️  ANTHROPIC_API_KEY or FIRECRAWL_API_KEY not set: pages the HTML parser cannot read will fail")
 
     # Initialize and run scraper
+    exit_code = 0
     scraper = TunisianNewsScaper(
         supabase_url=SUPABASE_URL,
         supabase_key=SUPABASE_KEY
     )
-
-    # Run scraper for pages 0-20
-    scraper.scrape_all(start_page=0, end_page=20)
-    
-    # Alternative: Save to local file instead
-    # scraper.save_to_file("tunisian_news.json")
+    scraper.html_parser = args.html_parser
+
+    if args.backfill_hashes:
+        scraper.backfill_hashes()
+    elif args.export_store:
+        scraper.save_to_file(args.export_store)
+    elif args.incremental:
+        ledger = JobLedger()
+        mark = ledger.get_high_water_mark(SOURCE)
+        if mark:
+            since = mark - timedelta(days=int(os.getenv("INCREMENTAL_OVERLAP_DAYS", "2")))
+        else:
+            since = date.today() - timedelta(days=int(os.getenv("INCREMENTAL_INITIAL_DAYS", "3")))
+        print(f"📌 Scraping articles published since {since:%d/%m/%Y}")
+        newest = scraper.scrape_since(since, max_pages=args.end_page)
+        if newest:
+            ledger.set_high_water_mark(SOURCE, newest)
+            print(f"📌 High-water mark for {SOURCE} now {ledger.get_high_water_mark(SOURCE):%d/%m/%Y}")
+        else:
+            print("⚠️  High-water mark unchanged")
+        ledger.close()
+    elif args.until_known:
+        if scraper.scrape_until_known(max_pages=args.end_page) is None:
+            # Another --until-known run would stop at the pages this one stored, before the failed one
+            failed = min(scraper.failed_pages)
+            print(f"⚠️  Page {failed} was not read. Retry with a crawl of the first pages: "
+                  f"python tunisian_news_scraper.py --end-page {failed + 1}")
+            exit_code = 1
+    elif args.export:
+        # Full crawl, streamed to the export as pages complete
+        export = NdjsonExport(args.export, "crawl")
+        try:
+            scraper.scrape_all(start_page=args.start_page, end_page=args.end_page, workers=args.workers, export=export)
+        except BaseException:
+            export.close()
+            raise
+        scraper.finish_export(export)
+    else:
+        # Full crawl (pages 0-20 by default)
+        scraper.scrape_all(start_page=args.start_page, end_page=args.end_page, workers=args.workers)
+
+    print("⏱️  Stage timings:")
+    get_metrics().print_summary()
+    if args.metrics:
+        get_metrics().write(args.metrics)
+        print(f"📈 Metrics written to {args.metrics}")
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
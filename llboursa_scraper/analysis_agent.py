@@ -1,52 +1,37 @@
 import os
 import json
-from openai import AzureOpenAI
+import time
+import asyncio
+import httpx
+import openai
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from dotenv import load_dotenv
 from stock_manager import StockManager
+from llm_scheduler import RateLimitScheduler
+from metrics import get_metrics
+from article_cleaner import clean_article, chunk_text, count_tokens, merge_chunk_impacts
 
 load_dotenv()
 
-def analyze_article(text: str):
-    """
-    Analyzes the financial article text using Azure OpenAI.
-    Extracts Sentiment, Summary, and Tickers.
-    Enhanced with macroeconomic interpretation.
-    """
-    
-    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    deployment = os.getenv("AZURE_DEPLOYMENT_NAME")
-    api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
-
-    if not endpoint or not api_key or not deployment:
-        raise ValueError("Azure OpenAI credentials missing in .env")
+# Bump whenever the prompt below changes so cached analyses are not reused
+PROMPT_VERSION = "v4"
 
-    client = AzureOpenAI(
-        api_version=api_version,
-        azure_endpoint=endpoint,
-        api_key=api_key,
-    )
+SYSTEM_ROLE = "You are an elite financial analyst with expertise in both direct company analysis and macroeconomic factors. You excel at finding hidden implications in news that affect stock performance. Output valid JSON only. Never use markdown code blocks."
 
-    # Load Stock Manager to get context for the LLM
-    sm = StockManager()
-    
-    # Build comprehensive context with actual company names
-    sector_context = []
-    for sector_key, stocks in sm.stocks_data.items():
-        sector_name = sector_key.replace("_", " ").title()
-        company_names = [s['name'] for s in stocks]
-        sector_context.append(f"- **{sector_name}** (use '{sector_key}' as target): {', '.join(company_names)}")
-    
-    context_text = "\n".join(sector_context)
-    
-    prompt = f"""
+# Static part of the prompt. It only depends on the list of sectors, so it is
+# rendered once per engine and sent as an identical prefix on every call,
+# which lets the provider reuse its prompt-prefix cache. Company names of the
+# sectors an article mentions and the article itself go last.
+ANALYSIS_INSTRUCTIONS = """
 You are an elite financial analyst for the Tunisian Stock Market with deep expertise in macroeconomic analysis and market psychology.
 
-**TUNISIAN STOCK UNIVERSE:**
-{context_text}
+**TUNISIAN STOCK UNIVERSE (SECTORS):**
+{universe}
+
+The listed companies of every sector the article mentions (directly or through one of its companies) are given together with the article. Use those exact names as ticker targets.
 
 **YOUR MISSION:**
-Analyze the following article and determine its impact on Tunisian stocks. You must think beyond explicit mentions and consider indirect economic effects.
+Analyze the article provided at the end of this conversation and determine its impact on Tunisian stocks. You must think beyond explicit mentions and consider indirect economic effects.
 
 ═══════════════════════════════════════════════════════════════
 
@@ -179,11 +164,6 @@ Your reasoning MUST explain:
 
 ═══════════════════════════════════════════════════════════════
 
-**ARTICLE TO ANALYZE:**
-{text}
-
-═══════════════════════════════════════════════════════════════
-
 **YOUR TASK:**
 1. Read carefully - don't just skim for company names
 2. Think macroeconomically - consider indirect effects
@@ -205,27 +185,350 @@ Your reasoning MUST explain:
 
 **REMINDERS:**
 - For sectors: Use EXACT keys like "banks", "food_and_beverage", "technology_and_telecom"
-- For tickers: Use EXACT names like "BIAT", "AMEN BANK"
+- For tickers: Use EXACT names like "BIAT", "AMEN BANK" (as listed with the article)
 - Multiple impacts are expected for most articles (companies AND sectors)
 - Empty impacts [] should be RARE - most news affects someone
 - DO NOT wrap in markdown code blocks
 - Think like a professional analyst, not a keyword matcher
 
-Now analyze the article above.
+Analyze the article in the next message.
 """
 
-    messages = [
-        {"role": "system", "content": "You are an elite financial analyst with expertise in both direct company analysis and macroeconomic factors. You excel at finding hidden implications in news that affect stock performance. Output valid JSON only. Never use markdown code blocks."},
-        {"role": "user", "content": prompt}
+ARTICLE_TEMPLATE = """{companies}**ARTICLE TO ANALYZE:**
+{text}
+"""
+
+
+def build_universe_context(stocks_data):
+    """
+    Builds the sector/company listing injected into the prompt.
+    """
+    sector_context = []
+    for sector_key, stocks in stocks_data.items():
+        sector_name = sector_key.replace("_", " ").title()
+        company_names = [s['name'] for s in stocks]
+        sector_context.append(f"- **{sector_name}** (use '{sector_key}' as target): {', '.join(company_names)}")
+    return "\n".join(sector_context)
+
+
+def build_sector_context(stocks_data):
+    """
+    Builds the compact sector listing used in the static prompt.
+    """
+    return "\n".join(
+        f"- **{sector_key.replace('_', ' ').title()}** (use '{sector_key}' as target)"
+        for sector_key in stocks_data
+    )
+
+
+def build_system_prompt(stocks_data):
+    """
+    Renders the static system prompt for a stock universe.
+    """
+    return SYSTEM_ROLE + "\n" + ANALYSIS_INSTRUCTIONS.format(universe=build_sector_context(stocks_data))
+
+
+def build_companies_context(stock_manager, text: str):
+    """
+    Lists the companies of the sectors the article mentions (empty if none).
+    """
+    sectors = stock_manager.entity_index.relevant_sectors(text)
+    if not sectors:
+        return ""
+    relevant = {sector: stock_manager.stocks_data[sector] for sector in sectors}
+    return f"**COMPANIES IN SECTORS MENTIONED BY THE ARTICLE:**\n{build_universe_context(relevant)}\n\n"
+
+
+def build_messages(system_prompt, text: str, companies: str = ""):
+    """
+    Chat messages for one article: static prefix first, article last.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": ARTICLE_TEMPLATE.format(companies=companies, text=text)},
     ]
 
-    try:
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_DEPLOYMENT_NAME"),
-            messages=messages,
+
+def parse_analysis(raw: str):
+    """
+    Parses the model output into a dict, tolerating markdown code fences.
+    Raises json.JSONDecodeError on malformed output.
+    """
+    clean = raw or ""
+    if "```json" in clean:
+        clean = clean.split("```json")[1].split("```")[0].strip()
+    elif "```" in clean:
+        clean = clean.split("```")[1].split("```")[0].strip()
+    return json.loads(clean)
+
+
+class AnalysisEngine:
+    """
+    Reusable Azure OpenAI analysis client.
+
+    Builds the API client and the static prompt prefix once, keeps HTTP
+    connections alive across calls, and records latency and
+    prompt/cached/completion token counts for every request.
+    """
+
+    def __init__(self, stock_manager=None, cache=None, max_completion_tokens=1500, max_article_tokens=None):
+        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.deployment = os.getenv("AZURE_DEPLOYMENT_NAME")
+        self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
+
+        if not self.endpoint or not self.api_key or not self.deployment:
+            raise ValueError("Azure OpenAI credentials missing in .env")
+
+        self.cache = cache
+        self.max_completion_tokens = max_completion_tokens
+        # Article token budget per request; longer articles are chunked
+        self.max_article_tokens = max_article_tokens or int(os.getenv("ANALYSIS_MAX_ARTICLE_TOKENS", "3000"))
+
+        self.client = self._build_client()
+
+        self.stock_manager = stock_manager or StockManager()
+        self.system_prompt = build_system_prompt(self.stock_manager.stocks_data)
+
+        self.calls = []
+
+    def _build_client(self):
+        # One pooled HTTP client for the lifetime of the engine
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=120),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        return AzureOpenAI(
+            api_version=self.api_version,
+            azure_endpoint=self.endpoint,
+            api_key=self.api_key,
+            http_client=self.http_client,
+        )
+
+    def build_messages(self, text: str):
+        return build_messages(self.system_prompt, text, build_companies_context(self.stock_manager, text))
+
+    def _record(self, latency, usage):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        call = {
+            "latency_s": latency,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        self.calls.append(call)
+        get_metrics().record_llm_call(self.deployment, latency, prompt_tokens, cached_tokens, completion_tokens)
+        return call
+
+    def prepare(self, text: str):
+        """
+        Cleans the article and splits it into chunks within the token budget.
+        Returns (cleaned_text, chunks).
+        """
+        cleaned = clean_article(text) or text
+        return cleaned, chunk_text(cleaned, self.max_article_tokens)
+
+    def combine(self, outputs):
+        """
+        Combines per-chunk model outputs into a single analysis JSON string.
+        Returns (analysis, number of chunk outputs that parsed); when no chunk
+        of a multi-chunk article parsed, the analysis is an error payload so
+        the article is retried instead of saved without impacts.
+        """
+        chunk_impacts = []
+        for output in outputs:
+            try:
+                analysis = parse_analysis(output)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(analysis, dict) and not analysis.get("error"):
+                chunk_impacts.append(analysis.get("impacts", []))
+        if len(outputs) == 1:
+            return outputs[0], len(chunk_impacts)
+        if not chunk_impacts:
+            return json.dumps({"impacts": [], "error": "no chunk output parsed"}), 0
+        merged = json.dumps({"impacts": merge_chunk_impacts(chunk_impacts), "chunks": len(outputs)}, ensure_ascii=False)
+        return merged, len(chunk_impacts)
+
+    def remember(self, cache, cleaned, result, parsed_chunks):
+        """
+        Caches a result only if at least one chunk parsed into a valid analysis,
+        so a malformed output or a merge of failed chunks is asked again next time.
+        """
+        if cache and result and parsed_chunks:
+            cache.put(cleaned, PROMPT_VERSION, self.deployment, result)
+
+    def _complete(self, chunk: str):
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=self.deployment,
+            messages=self.build_messages(chunk),
             # temperature=1 (default for this model - custom values not supported)
-            max_completion_tokens=1500  # Increased for detailed reasoning
+            max_completion_tokens=self.max_completion_tokens
         )
+        self._record(time.perf_counter() - started, response.usage)
         return response.choices[0].message.content
-    except Exception as e:
-        return json.dumps({"impacts": [], "error": str(e)})
\ No newline at end of file
+
+    def analyze(self, text: str, cache=None):
+        """
+        Analyzes the financial article text.
+        The text is cleaned first; articles over the token budget are analyzed
+        chunk by chunk and their impacts merged. `cache` overrides the
+        engine's analysis cache for this call.
+        Returns the raw model output (JSON string), or a JSON error payload.
+        """
+        cache = cache or self.cache
+        cleaned, chunks = self.prepare(text)
+
+        if cache:
+            cached = cache.get(cleaned, PROMPT_VERSION, self.deployment)
+            if cached is not None:
+                return cached
+
+        try:
+            result, parsed_chunks = self.combine([self._complete(chunk) for chunk in chunks])
+            self.remember(cache, cleaned, result, parsed_chunks)
+            return result
+        except Exception as e:
+            return json.dumps({"impacts": [], "error": str(e)})
+
+    def stats(self):
+        """
+        Aggregated latency and token usage over all API calls made so far.
+        """
+        n = len(self.calls)
+        prompt_tokens = sum(c["prompt_tokens"] for c in self.calls)
+        cached_tokens = sum(c["cached_tokens"] for c in self.calls)
+        return {
+            "calls": n,
+            "avg_latency_s": sum(c["latency_s"] for c in self.calls) / n if n else 0.0,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": sum(c["completion_tokens"] for c in self.calls),
+            "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+    def close(self):
+        self.http_client.close()
+
+
+def _is_throttle(e):
+    return isinstance(e, openai.RateLimitError)
+
+
+def _is_retryable(e):
+    return isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after(e):
+    """
+    Reads the retry-after hint (seconds) Azure sends with 429 responses.
+    """
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class AsyncAnalysisEngine(AnalysisEngine):
+    """
+    Async variant of AnalysisEngine for use inside the backfill event loop.
+
+    Requests go through a RateLimitScheduler (RPM/TPM token buckets,
+    bounded concurrency, jittered backoff on 429s), so many articles can be
+    analyzed concurrently up to the deployment's quota.
+    """
+
+    def __init__(self, stock_manager=None, cache=None, max_completion_tokens=1500, max_article_tokens=None, scheduler=None):
+        super().__init__(
+            stock_manager=stock_manager, cache=cache,
+            max_completion_tokens=max_completion_tokens, max_article_tokens=max_article_tokens
+        )
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.static_tokens = count_tokens(self.system_prompt)
+
+    def _build_client(self):
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=120),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        # Retries are handled by the scheduler so they respect the shared quota
+        return AsyncAzureOpenAI(
+            api_version=self.api_version,
+            azure_endpoint=self.endpoint,
+            api_key=self.api_key,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+
+    async def _complete(self, chunk: str):
+        async def call():
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(
+                model=self.deployment,
+                messages=self.build_messages(chunk),
+                max_completion_tokens=self.max_completion_tokens
+            )
+            record = self._record(time.perf_counter() - started, response.usage)
+            return response.choices[0].message.content, record["prompt_tokens"] + record["completion_tokens"]
+
+        estimated = self.static_tokens + count_tokens(chunk) + self.max_completion_tokens
+        return await self.scheduler.run(
+            call, estimated, _is_throttle, is_retryable=_is_retryable, retry_after=_retry_after
+        )
+
+    async def analyze(self, text: str):
+        """
+        Analyzes the financial article text without blocking the event loop.
+        Chunks of long articles are scheduled concurrently.
+        Returns the raw model output (JSON string), or a JSON error payload.
+        """
+        with get_metrics().timer("stage_seconds", stage="analysis"):
+            return await self._analyze(text)
+
+    async def _analyze(self, text: str):
+        cleaned, chunks = self.prepare(text)
+
+        if self.cache:
+            cached = self.cache.get(cleaned, PROMPT_VERSION, self.deployment)
+            if cached is not None:
+                return cached
+
+        try:
+            outputs = await asyncio.gather(*(self._complete(chunk) for chunk in chunks))
+            result, parsed_chunks = self.combine(list(outputs))
+            self.remember(self.cache, cleaned, result, parsed_chunks)
+            return result
+        except Exception as e:
+            return json.dumps({"impacts": [], "error": str(e)})
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+_default_engine = None
+
+def analyze_article(text: str, cache=None):
+    """
+    Analyzes the financial article text using Azure OpenAI.
+    Extracts Sentiment, Summary, and Tickers.
+    Enhanced with macroeconomic interpretation.
+
+    Kept for existing callers: delegates to a process-wide AnalysisEngine so
+    the client and prompt prefix are only built once.
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = AnalysisEngine()
+    return _default_engine.analyze(text, cache=cache)
@@ -0,0 +1,84 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from metrics import get_metrics
+
+
+def normalize_content(text: str) -> str:
+    """
+    Whitespace-insensitive form of the article text used for cache keys,
+    so re-extractions that only differ in spacing map to the same entry.
+    """
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def analysis_key(text: str, prompt_version: str, deployment: str) -> str:
+    payload = "\x00".join([normalize_content(text), prompt_version, deployment or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Persistent cache of LLM analysis results.
+
+    Entries are keyed by hash(cleaned content, prompt version, deployment name):
+    identical articles re-discovered on another date, retried runs or the same
+    story published on two sites are answered locally, while changing the prompt
+    or the deployment naturally invalidates old results.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("ANALYSIS_CACHE_PATH", ".cache/analysis_cache.sqlite")
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                cache_key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                deployment TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, text, prompt_version, deployment):
+        """
+        Returns the cached raw analysis for text, or None (counted as a miss).
+        """
+        row = self.conn.execute(
+            "SELECT result FROM analyses WHERE cache_key = ?",
+            (analysis_key(text, prompt_version, deployment),),
+        ).fetchone()
+        if row:
+            self.hits += 1
+            get_metrics().inc("cache_requests_total", cache="analysis", result="hit")
+            return row[0]
+        self.misses += 1
+        get_metrics().inc("cache_requests_total", cache="analysis", result="miss")
+        return None
+
+    def put(self, text, prompt_version, deployment, result):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO analyses (cache_key, prompt_version, deployment, result, created_at) VALUES (?, ?, ?, ?, ?)",
+            (analysis_key(text, prompt_version, deployment), prompt_version, deployment, result, time.time()),
+        )
+        self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,177 @@
+import re
+from collections import Counter
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to a character heuristic
+    _ENCODING = None
+
+# Lines that are navigation, widgets or sharing chrome rather than article text
+BOILERPLATE_PATTERNS = [
+    r"^(accueil|home|menu|rechercher|search|connexion|se connecter|s'inscrire|inscription|mon compte|newsletter)$",
+    r"^(partager|share|imprimer|print|envoyer|tweet|facebook|twitter|linkedin|whatsapp|e-?mail)\b.{0,30}$",
+    r"^(lire aussi|à lire aussi|voir aussi|articles similaires|sur le même sujet|dans la même rubrique|les plus lus)\b",
+    r"^(tous droits réservés|copyright|©|mentions légales|politique de confidentialité|cookies?)\b",
+    r"^(tunindex|tunindex20|masi|cac 40)\s*[-+]?\d",
+    r"^[-+]?\d+[.,]\d+\s*%$",
+    r"^publicité$",
+]
+_BOILERPLATE_RE = re.compile("|".join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+
+# Short lines without sentence punctuation or digits are menu items when they
+# come in a run (a navigation block) or repeat on the page (header and footer
+# menus); a lone short line is kept, it can be a headline or a subheading
+MIN_LINE_WORDS = 4
+NAV_RUN_LINES = 3
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts prompt tokens locally (tiktoken when installed, ~4 chars/token otherwise).
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _is_boilerplate(line: str) -> bool:
+    return bool(_BOILERPLATE_RE.search(line))
+
+
+def _is_short(line: str) -> bool:
+    return len(line.split()) < MIN_LINE_WORDS and not re.search(r"[.!?:;]", line) and not re.search(r"\d", line)
+
+
+def _line_key(line: str) -> str:
+    # Punctuation/case-insensitive key so re-rendered teasers are caught too
+    return re.sub(r"\W+", "", line.lower())
+
+
+def _navigation_lines(lines):
+    """
+    Indexes of the short lines that belong to a run of NAV_RUN_LINES or more
+    short lines, or that appear more than once.
+    """
+    short = [_is_short(line) for line in lines]
+    repeated = Counter(_line_key(line) for line, is_short in zip(lines, short) if is_short)
+    navigation = {i for i, line in enumerate(lines) if short[i] and repeated[_line_key(line)] > 1}
+    run = []
+    for i, is_short in enumerate(short + [False]):
+        if is_short:
+            run.append(i)
+            continue
+        if len(run) >= NAV_RUN_LINES:
+            navigation.update(run)
+        run = []
+    return navigation
+
+
+def clean_article(text: str) -> str:
+    """
+    Strips boilerplate from extracted page text.
+
+    Removes navigation/sharing/ticker-widget lines and menu blocks, and
+    drops repeated blocks (e.g. related-article teasers rendered twice),
+    keeping the first occurrence so the article reads in order.
+    """
+    if not text:
+        return ""
+
+    lines = [re.sub(r"\s+", " ", raw_line).strip() for raw_line in text.splitlines()]
+    lines = [line for line in lines if line and not _is_boilerplate(line)]
+    navigation = _navigation_lines(lines)
+
+    seen = set()
+    kept = []
+    for i, line in enumerate(lines):
+        if i in navigation:
+            continue
+        key = _line_key(line)
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(line)
+
+    return "\n".join(kept)
+
+
+def chunk_text(text: str, max_tokens: int):
+    """
+    Splits text into chunks of at most max_tokens, on paragraph then sentence boundaries.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    units = []
+    for paragraph in text.split("\n"):
+        if count_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        # Very long paragraph: fall back to sentences, then hard word splits
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if count_tokens(sentence) <= max_tokens:
+                units.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // count_tokens(sentence))
+            units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = count_tokens(unit) + 1  # Joining newline
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _score(value):
+    """
+    Numeric sentiment of an impact (the model sometimes returns "+2"), or None if invalid.
+    """
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    if score != score:  # NaN
+        return None
+    return int(score) if score.is_integer() else score
+
+
+def merge_chunk_impacts(chunk_results):
+    """
+    Merges per-chunk impacts into one list.
+
+    Impacts on the same (type, target) are combined: the score with the
+    largest magnitude wins (ties keep the earliest chunk), and reasonings are
+    concatenated so nothing the model found is lost.
+    """
+    merged = {}
+    order = []
+    for impacts in chunk_results:
+        for impact in impacts:
+            target = impact.get("target")
+            score = _score(impact.get("sentiment_score"))
+            if not target or score is None:
+                continue
+            key = (impact.get("type"), str(target).strip().lower())
+            if key not in merged:
+                merged[key] = dict(impact, sentiment_score=score)
+                order.append(key)
+                continue
+            current = merged[key]
+            if abs(score) > abs(current["sentiment_score"]):
+                current["sentiment_score"] = score
+            reasoning = impact.get("reasoning")
+            if reasoning and reasoning not in current.get("reasoning", ""):
+                current["reasoning"] = f"{current.get('reasoning', '')} | {reasoning}".strip(" |")
+    return [merged[key] for key in order]
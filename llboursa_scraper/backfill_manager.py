@@ -1,17 +1,46 @@
 import asyncio
 import os
 import json
+import argparse
 from datetime import datetime, timedelta
 from discovery_agent import discovery_run
 from extraction_agent import extraction_run
-from analysis_agent import analyze_article
+from extraction_cache import ExtractionCache
+from job_ledger import JobLedger, STATE_DISCOVERED, STATE_ANALYZED, TERMINAL_STATES
+from near_duplicates import NearDuplicateIndex
+from analysis_agent import AsyncAnalysisEngine, parse_analysis, build_system_prompt, build_messages, build_companies_context, PROMPT_VERSION
+from article_cleaner import clean_article, chunk_text
+from batch_analysis import BatchJob
+from analysis_cache import AnalysisCache
 from stock_manager import StockManager
-from db_manager import DBManager
+from db_manager import create_db_manager
+from host_limiter import get_host_limiter
+from metrics import get_metrics
 from dotenv import load_dotenv
 
 load_dotenv()
 
-async def backfill_process():
+async def backfill_process(batch_dir=None, start_date=None, end_date=None, metrics_path=None, rediscover_from=None):
+    """
+    Discovers, extracts, analyzes and saves the articles published from
+    start_date to end_date (dates; default: the last 30 days through today).
+
+    Dates already discovered in the job ledger are not rediscovered, except
+    from rediscover_from on (e.g. the overlap of an incremental run, where
+    late-published articles can still appear); their new articles are added
+    to the ledger next to the known jobs.
+
+    With batch_dir, analyses are not run inline: extracted articles are
+    written to a batch request file (see batch_analysis.py) instead.
+
+    Stage timings, outcome counters and LLM usage are collected in the
+    metrics registry and written to metrics_path (or METRICS_OUTPUT) at the
+    end: Prometheus text, or a JSON snapshot for a .json path.
+
+    Returns:
+        date: last date up to which every day was fully processed
+        (discovered and all its articles finished), or None
+    """
     print("=" * 80)
     print("📰 TUNISIAN STOCK MARKET NEWS SCRAPER")
     print("=" * 80)
@@ -19,31 +48,81 @@ async def backfill_process():
     
     # Initialize Managers
     sm_data = StockManager()
-    db = DBManager()
+    db = create_db_manager()
+    extraction_cache = ExtractionCache()
+    analysis_cache = AnalysisCache()
+    dedup_index = NearDuplicateIndex()
+    ledger = JobLedger()
+    metrics = get_metrics()
+    metrics_path = metrics_path or os.getenv("METRICS_OUTPUT")
+    if batch_dir:
+        batch_job = BatchJob(batch_dir)
+        system_prompt = build_system_prompt(sm_data.stocks_data)
+        deployment = os.getenv("AZURE_DEPLOYMENT_NAME")
+        max_article_tokens = int(os.getenv("ANALYSIS_MAX_ARTICLE_TOKENS", "3000"))
+        print(f"📦 Batch mode: writing analysis requests to {batch_dir}")
+    else:
+        batch_job = None
+        engine = AsyncAnalysisEngine(stock_manager=sm_data, cache=analysis_cache)
     
     # Setup Database
     await db.check_connection_and_setup()
     
-    # Get existing processed URLs to skip
-    existing_urls = await db.get_existing_urls()
-    print(f"📚 Found {len(existing_urls)} existing articles in database")
+    # URLs known to be in the database (checked per discovery batch)
+    existing_urls = set()
     print("=" * 80)
     
-    # Calculate dates: Today minus 30 days
-    today = datetime.now()
-    days_to_backfill = 30
+    # Date range (default: today minus 30 days through today)
+    today = datetime.now().date()
+    end_date = end_date or today
+    start_date = start_date or end_date - timedelta(days=30)
+    days_in_range = (end_date - start_date).days + 1
+    print(f"🗓️  {start_date:%d/%m/%Y} → {end_date:%d/%m/%Y} ({days_in_range} days)")
+    
+    # Dates whose discovery or processing broke off (not fully processed)
+    incomplete_dates = set()
     
     # Track statistics
     total_articles_found = 0
     total_articles_processed = 0
     total_articles_skipped = 0
     total_impacts_found = 0
+    total_near_duplicates = 0
+    total_resumed = 0
+    
+    # Near-duplicates waiting for their canonical copy to be saved (canonical url -> [urls])
+    waiting_duplicates = {}
+    
+    def confirm_saved():
+        """
+        Marks the articles the database confirmed as saved in the job ledger,
+        registers them in the near-duplicate index and skips the copies that
+        were waiting for them.
+        """
+        nonlocal total_near_duplicates, total_articles_skipped
+        for saved_url, saved_id in db.take_saved_articles().items():
+            ledger.mark_saved(saved_url, saved_id)
+            dedup_index.confirm(saved_url)
+            for duplicate_url in waiting_duplicates.pop(saved_url, []):
+                ledger.mark_skipped(duplicate_url, f"near-duplicate of {saved_url}")
+                dedup_index.confirm(duplicate_url)
+                total_near_duplicates += 1
+                total_articles_skipped += 1
+                metrics.inc("articles_total", source="ilboursa", result="near_duplicate")
+    
+    def forget(url):
+        """
+        Drops an article that will not be saved this run from the near-duplicate
+        index; copies waiting for it stay extracted and are retried next run.
+        """
+        dedup_index.discard(url)
+        waiting_duplicates.pop(url, None)
     
     # Track articles by URL to detect duplicates across dates
     articles_by_url = {}
     
-    for i in range(days_to_backfill, -1, -1):
-        target_date_obj = today - timedelta(days=i)
+    for i in range(days_in_range):
+        target_date_obj = start_date + timedelta(days=i)
         target_date_str = target_date_obj.strftime("%d/%m/%Y")
         
         print(f"\n{'='*80}")
@@ -51,27 +130,41 @@ async def backfill_process():
         print(f"{'='*80}")
         
         try:
-            # Discovery Phase
-            print(f"  🔍 Discovering articles...")
-            discovery_res = await discovery_run(target_date_str)
-            
-            # Clean JSON
-            if "```json" in discovery_res:
-                discovery_res = discovery_res.split("```json")[1].split("```")[0].strip()
-            elif "```" in discovery_res:
-                discovery_res = discovery_res.split("```")[1].split("```")[0].strip()
-            
-            try:
-                articles = json.loads(discovery_res)
-            except json.JSONDecodeError as e:
-                print(f"  ❌ Failed to parse discovery results: {e}")
-                continue
+            rediscover = rediscover_from is not None and target_date_obj >= rediscover_from
+            if ledger.is_discovered(target_date_str) and not rediscover:
+                articles = ledger.jobs_for_date(target_date_str)
+                print(f"  📒 Discovery already done: {len(articles)} articles in the job ledger")
+            else:
+                # Discovery Phase
+                print(f"  🔍 Discovering articles...")
+                with metrics.timer("stage_seconds", stage="discovery", source="ilboursa"):
+                    discovery_res = await discovery_run(target_date_str)
+                
+                # Clean JSON
+                if "```json" in discovery_res:
+                    discovery_res = discovery_res.split("```json")[1].split("```")[0].strip()
+                elif "```" in discovery_res:
+                    discovery_res = discovery_res.split("```")[1].split("```")[0].strip()
+                
+                try:
+                    articles = json.loads(discovery_res)
+                except json.JSONDecodeError as e:
+                    print(f"  ❌ Failed to parse discovery results: {e}")
+                    incomplete_dates.add(target_date_str)
+                    continue
+                
+                # Today's listing is still growing: keep its jobs but rediscover it next run
+                ledger.record_discovery(target_date_str, articles or [], complete=target_date_obj < today)
+                if rediscover:
+                    # Known jobs of the date (finished ones are skipped below) plus the new ones
+                    articles = ledger.jobs_for_date(target_date_str)
             
             if not articles:
                 print(f"  ℹ️  No articles found for {target_date_str}")
                 continue
             
             total_articles_found += len(articles)
+            metrics.inc("articles_total", len(articles), source="ilboursa", result="discovered")
             print(f"  ✅ Found {len(articles)} articles")
             
             # Filter duplicates
@@ -95,7 +188,11 @@ async def backfill_process():
                 print(f"  ⚠️  All articles are duplicates - skipping date")
                 continue
             
-            # Process each article
+            # One server-side lookup for the whole batch
+            existing_urls |= await db.find_existing_urls(art.get('url') for art in new_articles)
+            
+            # Extract each article; analyses run concurrently while the next pages are fetched
+            pending = []
             for idx, art in enumerate(new_articles, 1):
                 url = art.get('url')
                 title = art.get('title', 'Unknown Title')
@@ -103,12 +200,23 @@ async def backfill_process():
                 if not url:
                     print(f"\n  [{idx}/{len(new_articles)}] ⚠️  Skipping - no URL")
                     total_articles_skipped += 1
+                    metrics.inc("articles_total", source="ilboursa", result="no_url")
+                    continue
+                
+                job = ledger.get(url)
+                state = job['state'] if job else STATE_DISCOVERED
+                if state in TERMINAL_STATES:
+                    print(f"\n  [{idx}/{len(new_articles)}] ⏭️  Already {state} in job ledger: {title[:50]}...")
+                    total_articles_skipped += 1
+                    metrics.inc("articles_total", source="ilboursa", result="ledger_done")
                     continue
                 
                 # Check if already in database
                 if url in existing_urls:
                     print(f"\n  [{idx}/{len(new_articles)}] ⏭️  Already in DB: {title[:50]}...")
+                    ledger.mark_saved(url)
                     total_articles_skipped += 1
+                    metrics.inc("articles_total", source="ilboursa", result="already_in_db")
                     continue
                 
                 print(f"\n  [{idx}/{len(new_articles)}] 📄 {title[:60]}...")
@@ -118,85 +226,102 @@ async def backfill_process():
                     print(f"    ⚠️  URL might be truncated (no article ID)")
                     print(f"    URL: {url}")
                 
-                # Extract content
-                content = await extraction_run(url)
+                # Extract content (unless a previous run already did)
+                if state == STATE_DISCOVERED:
+                    with metrics.timer("stage_seconds", stage="extraction", source="ilboursa"):
+                        content = await extraction_run(url, cache=extraction_cache)
+                    
+                    if not content or len(content.strip()) < 100:
+                        print(f"    ❌ Skipping - content extraction failed or too short")
+                        ledger.record_failure(url, "content extraction failed or too short")
+                        total_articles_skipped += 1
+                        metrics.inc("articles_total", source="ilboursa", result="extraction_failed")
+                        continue
+                    ledger.mark_extracted(url, content)
+                else:
+                    content = job['content']
+                    total_resumed += 1
+                    print(f"    📒 Resuming from job ledger ({state})")
                 
-                if not content or len(content.strip()) < 100:
-                    print(f"    ❌ Skipping - content extraction failed or too short")
+                # Same story already seen on another URL or source: analyze the canonical copy only.
+                # The index keeps the article pending until its save succeeds.
+                cleaned = clean_article(content) or content
+                canonical_url = dedup_index.add(url, cleaned, source="ilboursa", pending=True)
+                if canonical_url != url and dedup_index.is_pending(canonical_url):
+                    print(f"    🔁 Near-duplicate of {canonical_url} - waiting for it to be saved")
+                    waiting_duplicates.setdefault(canonical_url, []).append(url)
+                    continue
+                if canonical_url != url:
+                    print(f"    🔁 Near-duplicate of {canonical_url} - skipping analysis")
+                    ledger.mark_skipped(url, f"near-duplicate of {canonical_url}")
+                    dedup_index.confirm(url)
+                    total_near_duplicates += 1
                     total_articles_skipped += 1
+                    metrics.inc("articles_total", source="ilboursa", result="near_duplicate")
                     continue
                 
-                # Analyze sentiment
-                print(f"    🤖 Analyzing with GPT-4.5.2...")
-                analysis_raw = analyze_article(content)
+                if batch_job and state != STATE_ANALYZED:
+                    cached_analysis = analysis_cache.get(cleaned, PROMPT_VERSION, deployment)
+                    if cached_analysis is not None:
+                        # Analyzed before (interactive run or an ingested batch): save it now
+                        print(f"    💾 Analysis cached - not queued in batch file")
+                        pending.append((idx, url, title, content, cached_analysis))
+                        continue
+                    chunks = chunk_text(cleaned, max_article_tokens)
+                    messages_per_chunk = [
+                        build_messages(system_prompt, chunk, build_companies_context(sm_data, chunk))
+                        for chunk in chunks
+                    ]
+                    if batch_job.add(url, title, target_date_str, content, messages_per_chunk, deployment):
+                        print(f"    📦 Queued in batch file")
+                    # The batch file is the durable copy until ingestion saves it
+                    dedup_index.confirm(url)
+                    continue
                 
-                # Clean analysis
-                clean_analysis = analysis_raw
-                if "```json" in clean_analysis:
-                    clean_analysis = clean_analysis.split("```json")[1].split("```")[0].strip()
-                elif "```" in clean_analysis:
-                    clean_analysis = clean_analysis.split("```")[1].split("```")[0].strip()
+                if state == STATE_ANALYZED:
+                    # Analysis finished in a previous run; only the save is left
+                    pending.append((idx, url, title, content, job['analysis']))
+                    continue
+                
+                # Analyze sentiment (scheduled against the deployment quota)
+                print(f"    🤖 Queued for analysis with GPT-4.5.2")
+                pending.append((idx, url, title, content, asyncio.create_task(engine.analyze(content))))
+            
+            # Save results in discovery order as analyses complete
+            for idx, url, title, content, analysis in pending:
+                analysis_raw = await analysis if isinstance(analysis, asyncio.Task) else analysis
+                print(f"\n  [{idx}/{len(new_articles)}] 🤖 Analysis ready: {title[:50]}...")
                 
                 try:
-                    analysis_data = json.loads(clean_analysis)
+                    analysis_data = parse_analysis(analysis_raw)
+                    if analysis_data.get("error"):
+                        print(f"    ❌ Analysis failed: {analysis_data['error']}")
+                        ledger.record_failure(url, f"analysis: {analysis_data['error']}")
+                        forget(url)
+                        total_articles_skipped += 1
+                        metrics.inc("articles_total", source="ilboursa", result="analysis_failed")
+                        continue
+                    ledger.mark_analyzed(url, analysis_raw)
                     impacts = analysis_data.get("impacts", [])
                     
                     # Expand sector impacts to individual tickers
-                    expanded_impacts = []
-                    
-                    for impact in impacts:
-                        target = impact.get("target")
-                        itype = impact.get("type")
-                        score = impact.get("sentiment_score")
-                        reason = impact.get("reasoning", "")
-                        
-                        if not target or score is None:
-                            continue
-                        
-                        if itype == "sector":
-                            # Resolve sector to tickers
-                            sector_key = target.lower().replace(" ", "_")
-                            
-                            if sector_key in sm_data.stocks_data:
-                                tickers = [s['ticker'] for s in sm_data.stocks_data[sector_key]]
-                                
-                                # Add sector-level impact
-                                expanded_impacts.append({
-                                    "target": target,
-                                    "type": "sector",
-                                    "sentiment_score": score,
-                                    "reasoning": reason
-                                })
-                                
-                                # Add individual ticker impacts
-                                for ticker in tickers:
-                                    expanded_impacts.append({
-                                        "target": ticker,
-                                        "type": "ticker",
-                                        "sentiment_score": score,
-                                        "reasoning": f"[Via {target} sector] {reason}"
-                                    })
-                                
-                                print(f"    📊 Sector '{target}' → {len(tickers)} tickers (score: {score:+d})")
-                            else:
-                                print(f"    ⚠️  Sector '{target}' not found in stock data")
-                        
-                        elif itype == "ticker":
-                            expanded_impacts.append(impact)
-                            print(f"    📈 Ticker '{target}' (score: {score:+d})")
+                    expanded_impacts = sm_data.expand_impacts(impacts)
                     
                     # Save to database
-                    article_id = await db.save_article_with_impacts(
-                        url=url,
-                        title=title,
-                        content=content,
-                        published_date=target_date_str,
-                        impacts=expanded_impacts
-                    )
+                    with metrics.timer("stage_seconds", stage="db_write", source="ilboursa"):
+                        article_id = await db.save_article_with_impacts(
+                            url=url,
+                            title=title,
+                            content=content,
+                            published_date=target_date_str,
+                            impacts=expanded_impacts
+                        )
                     
-                    if article_id:
+                    if article_id is not None:
+                        # 0: queued in the write-behind cache, marked saved once a flush writes it
                         existing_urls.add(url)
                         total_articles_processed += 1
+                        metrics.inc("articles_total", source="ilboursa", result="saved")
                         total_impacts_found += len(expanded_impacts)
                         
                         if expanded_impacts:
@@ -204,17 +329,42 @@ async def backfill_process():
                         else:
                             print(f"    ✅ Saved (no market impact)")
                     else:
+                        ledger.record_failure(url, "database save failed or article already saved")
+                        forget(url)
                         total_articles_skipped += 1
+                        metrics.inc("articles_total", source="ilboursa", result="save_failed")
+                    
+                    confirm_saved()
                     
                 except json.JSONDecodeError as e:
                     print(f"    ❌ Failed to parse analysis: {e}")
+                    ledger.record_failure(url, f"unparseable analysis: {e}")
+                    forget(url)
                     total_articles_skipped += 1
+                    metrics.inc("articles_total", source="ilboursa", result="unparseable_analysis")
         
         except Exception as e:
+            incomplete_dates.add(target_date_str)
+            metrics.inc("dates_failed_total", source="ilboursa")
             print(f"\n❌ Error processing {target_date_str}: {e}")
             import traceback
             traceback.print_exc()
     
+    # Write any articles and scores still pending in the write-behind cache
+    if not await db.flush_scores():
+        raise RuntimeError("Write-behind flush failed: queued articles stay analyzed in the job ledger "
+                           "and are saved again on the next run")
+    confirm_saved()
+    
+    # Last date of the unbroken run of fully processed days from start_date
+    completed_through = None
+    for i in range(days_in_range):
+        day = start_date + timedelta(days=i)
+        day_str = day.strftime("%d/%m/%Y")
+        if day_str in incomplete_dates or ledger.pending_count(day_str):
+            break
+        completed_through = day
+    
     # Final Summary
     print("\n" + "=" * 80)
     print("✅ BACKFILL COMPLETE!")
@@ -222,26 +372,62 @@ async def backfill_process():
     print(f"\n📊 Statistics:")
     print(f"   Articles discovered: {total_articles_found}")
     print(f"   Articles processed:  {total_articles_processed}")
-    print(f"   Articles skipped:    {total_articles_skipped}")
+    print(f"   Articles skipped:    {total_articles_skipped} ({total_near_duplicates} near-duplicates)")
     print(f"   Stock impacts:       {total_impacts_found}")
+    print(f"   Resumed from ledger: {total_resumed}")
+    for host, host_stats in get_host_limiter().stats().items():
+        print(f"   Rate limit {host}: {host_stats['requests']} requests, {host_stats['throttled']} throttled, "
+              f"{host_stats['errors']} errors, window {host_stats['window']} (peak {host_stats['peak_window']})")
+    print(f"   Completed through:   {completed_through:%d/%m/%Y}" if completed_through else "   Completed through:   -")
+    ledger_stats = ledger.stats()
+    print(f"   Job ledger:          " + ", ".join(f"{state} {count}" for state, count in sorted(ledger_stats.items())))
+    print(f"\n⏱️  Stage timings:")
+    metrics.print_summary()
+    if metrics_path:
+        metrics.write(metrics_path)
+        print(f"   Metrics written to {metrics_path}")
+    if batch_job:
+        print(f"   Batch requests:      {len(batch_job)} in {batch_dir}")
+        print(f"\n➡️  Next: python batch_analysis.py submit {batch_dir}")
+        return completed_through
+    
+    cache_stats = analysis_cache.stats()
+    print(f"   Analysis cache:      {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    llm_stats = engine.stats()
+    print(f"   LLM calls:           {llm_stats['calls']} (avg {llm_stats['avg_latency_s']:.1f}s)")
+    print(f"   LLM tokens:          {llm_stats['prompt_tokens']} prompt "
+          f"({llm_stats['cached_tokens']} cached) / {llm_stats['completion_tokens']} completion")
+    scheduler_stats = engine.scheduler.stats()
+    print(f"   LLM throttling:      {scheduler_stats['throttled']} throttled / {scheduler_stats['retries']} retries")
+    if metrics.prices:
+        print(f"   LLM cost:            ${metrics.total('llm_cost_usd_total'):.4f}")
+    await engine.aclose()
     
     # Get sentiment summary
     print(f"\n📈 Top Mentioned Stocks:")
-    sentiment_summary = await db.get_stock_sentiment_summary()
-    
-    if sentiment_summary:
-        # Sort by mention count
-        sorted_stocks = sorted(
-            sentiment_summary.items(),
-            key=lambda x: x[1]['mention_count'],
-            reverse=True
-        )[:10]
-        
-        for stock, data in sorted_stocks:
-            print(f"   {stock:.<40} {data['mention_count']} mentions | "
-                  f"Avg sentiment: {data['avg_sentiment']:+.1f}")
+    sentiment_summary = await db.get_stock_sentiment_summary(limit=10)
+    
+    # Already sorted by mention count
+    for stock, data in sentiment_summary.items():
+        print(f"   {stock:.<40} {data['mention_count']} mentions | "
+              f"Avg sentiment: {data['avg_sentiment']:+.1f} | Recent: {data['recent_sentiment']:+.1f}")
     
     print("\n" + "=" * 80)
+    return completed_through
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
 
 if __name__ == "__main__":
-    asyncio.run(backfill_process())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Backfill Tunisian stock market news")
+    parser.add_argument("--batch", metavar="DIR", help="Write analyses to a batch request file instead of calling the API")
+    parser.add_argument("--start", type=parse_date, metavar="YYYY-MM-DD", help="First publication date (default: --days before --end)")
+    parser.add_argument("--end", type=parse_date, metavar="YYYY-MM-DD", help="Last publication date (default: today)")
+    parser.add_argument("--days", type=int, default=30, help="Days before --end when --start is not given")
+    parser.add_argument("--metrics", metavar="PATH", help="Write run metrics to PATH (.json snapshot, otherwise Prometheus text)")
+    args = parser.parse_args()
+    end_date = args.end or datetime.now().date()
+    start_date = args.start or end_date - timedelta(days=args.days)
+    asyncio.run(backfill_process(batch_dir=args.batch, start_date=start_date, end_date=end_date, metrics_path=args.metrics))
\ No newline at end of file
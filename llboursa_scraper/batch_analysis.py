@@ -0,0 +1,374 @@
+"""
+Offline batch analysis for large historical backfills.
+
+Instead of calling Azure OpenAI once per article, the backfill can write its
+pending analyses to a JSONL request file in the OpenAI Batch format. The file
+is submitted as a batch job, and once the results file is available it is
+ingested and the impacts are applied to the database.
+
+Usage:
+    python backfill_manager.py --batch batches/2026-01     # Write requests.jsonl + manifest.jsonl
+    python batch_analysis.py submit batches/2026-01         # Upload and create the batch job
+    python batch_analysis.py status batches/2026-01         # Poll, download results.jsonl when done
+    python batch_analysis.py ingest batches/2026-01         # Apply impacts to the database
+    python batch_analysis.py local batches/2026-01 --fixtures fixtures/  # Fulfil locally (tests)
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BATCH_ENDPOINT = "/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+
+def custom_id_for(url: str) -> str:
+    return "art-" + hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+class BatchJob:
+    """
+    A batch directory on disk:
+        requests.jsonl  - one chat completion request per article chunk (OpenAI Batch format)
+        manifest.jsonl  - article metadata and content, keyed by custom_id
+        results.jsonl   - batch output, once downloaded
+        state.json      - remote batch/file ids and last known status
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.requests_path = os.path.join(directory, "requests.jsonl")
+        self.manifest_path = os.path.join(directory, "manifest.jsonl")
+        self.results_path = os.path.join(directory, "results.jsonl")
+        self.state_path = os.path.join(directory, "state.json")
+        self._queued = set(self.manifest().keys())
+
+    def add(self, url, title, published_date, content, messages_per_chunk, deployment, max_completion_tokens=1500):
+        """
+        Appends one article to the request file, one request per chunk.
+        Returns False if it was already queued.
+        """
+        custom_id = custom_id_for(url)
+        if custom_id in self._queued:
+            return False
+
+        with open(self.requests_path, "a", encoding="utf-8") as f:
+            for i, messages in enumerate(messages_per_chunk):
+                request = {
+                    "custom_id": f"{custom_id}-{i}",
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {
+                        "model": deployment,
+                        "messages": messages,
+                        "max_completion_tokens": max_completion_tokens,
+                    },
+                }
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        entry = {
+            "custom_id": custom_id,
+            "chunks": len(messages_per_chunk),
+            "url": url,
+            "title": title,
+            "published_date": published_date,
+            "content": content,
+        }
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._queued.add(custom_id)
+        return True
+
+    def __len__(self):
+        return len(self._queued)
+
+    def _read_jsonl(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def manifest(self):
+        return {entry["custom_id"]: entry for entry in self._read_jsonl(self.manifest_path)}
+
+    def requests(self):
+        return self._read_jsonl(self.requests_path)
+
+    def results(self):
+        """
+        Returns {article custom_id: [model output text per chunk]}.
+        A failed request yields None in place of its output.
+        """
+        outputs = {}
+        for line in self._read_jsonl(self.results_path):
+            article_id, chunk = line["custom_id"].rsplit("-", 1)
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                content = None
+            else:
+                choices = response.get("body", {}).get("choices") or [{}]
+                content = choices[0].get("message", {}).get("content")
+            outputs.setdefault(article_id, {})[int(chunk)] = content
+        return {article_id: [chunks[i] for i in sorted(chunks)] for article_id, chunks in outputs.items()}
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+
+
+def _azure_client():
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+    )
+
+
+def submit_batch(job, client=None):
+    """
+    Uploads requests.jsonl and creates the batch job.
+    """
+    client = client or _azure_client()
+    with open(job.requests_path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=COMPLETION_WINDOW,
+    )
+    job.save_state({"batch_id": batch.id, "input_file_id": input_file.id, "status": batch.status})
+    print(f"📤 Submitted batch {batch.id} ({len(job)} articles)")
+    return batch.id
+
+
+def poll_batch(job, client=None):
+    """
+    Refreshes the batch status and downloads results.jsonl once the job completed.
+    Returns the batch status.
+    """
+    client = client or _azure_client()
+    state = job.load_state()
+    if not state.get("batch_id"):
+        raise ValueError(f"No submitted batch in {job.directory}")
+
+    batch = client.batches.retrieve(state["batch_id"])
+    state["status"] = batch.status
+    state["output_file_id"] = batch.output_file_id
+    job.save_state(state)
+
+    counts = batch.request_counts
+    if counts:
+        print(f"⏳ Batch {batch.id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+    else:
+        print(f"⏳ Batch {batch.id}: {batch.status}")
+
+    if batch.status == "completed" and batch.output_file_id:
+        content = client.files.content(batch.output_file_id)
+        with open(job.results_path, "wb") as f:
+            f.write(content.read())
+        print(f"📥 Results saved to {job.results_path}")
+    return batch.status
+
+
+class LocalBatchRunner:
+    """
+    Local stand-in for the Batch API, for tests and dry runs.
+
+    Fulfils every request from a fixtures directory containing
+    `<custom_id>.json` files (one per chunk, e.g. `art-1a2b...-0.json`)
+    with the model output to return; requests without a fixture get
+    `{"impacts": []}`. Writes results.jsonl in the same format as the
+    real service.
+    """
+
+    def __init__(self, fixtures_dir=None, default_output=None):
+        self.fixtures_dir = fixtures_dir
+        self.default_output = default_output or json.dumps({"impacts": []})
+
+    def _output_for(self, custom_id):
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f"{custom_id}.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    return f.read()
+        return self.default_output
+
+    def run(self, job):
+        requests = job.requests()
+        with open(job.results_path, "w", encoding="utf-8") as f:
+            for request in requests:
+                output = self._output_for(request["custom_id"])
+                line = {
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "request_id": uuid.uuid4().hex,
+                        "body": {
+                            "object": "chat.completion",
+                            "model": request["body"]["model"],
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": output},
+                                "finish_reason": "stop",
+                            }],
+                            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                        },
+                    },
+                    "error": None,
+                }
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        job.save_state({**job.load_state(), "status": "completed", "local": True})
+        print(f"🧪 Fulfilled {len(requests)} requests locally → {job.results_path}")
+
+
+async def ingest_batch(job, db, stock_manager, cache=None, prompt_version=None, deployment=None,
+                       ledger=None, chunk_size=None):
+    """
+    Applies the batch results to the database.
+
+    Every successful result is parsed, its sector impacts expanded to tickers
+    and the articles saved with their impacts in bulk, `chunk_size` articles
+    per request (BATCH_SAVE_CHUNK, default 50). Results are also written to
+    the analysis cache so later interactive runs reuse them. With a job
+    ledger, articles are marked analyzed when parsed and saved once stored.
+
+    Returns:
+        dict: counters (saved, skipped, failed, impacts)
+    """
+    from analysis_agent import parse_analysis, PROMPT_VERSION
+    from article_cleaner import clean_article, merge_chunk_impacts
+
+    prompt_version = prompt_version or PROMPT_VERSION
+    deployment = deployment or os.getenv("AZURE_DEPLOYMENT_NAME")
+    chunk_size = chunk_size or int(os.getenv("BATCH_SAVE_CHUNK", "50"))
+    manifest = job.manifest()
+    results = job.results()
+    stats = {"saved": 0, "skipped": 0, "failed": 0, "impacts": 0}
+
+    existing_urls = await db.find_existing_urls(
+        manifest[custom_id]["url"] for custom_id in results if custom_id in manifest
+    )
+
+    def record_saved():
+        if ledger:
+            for saved_url, saved_id in db.take_saved_articles().items():
+                ledger.mark_saved(saved_url, saved_id)
+
+    async def save(articles):
+        saved = await db.save_articles_bulk(articles, chunk_size=chunk_size)
+        for article in articles:
+            if saved.get(article["url"]) is not None:
+                existing_urls.add(article["url"])
+                stats["saved"] += 1
+                stats["impacts"] += len(article["impacts"])
+            else:
+                stats["skipped"] += 1
+        record_saved()
+
+    to_save = []
+    for custom_id, outputs in results.items():
+        entry = manifest.get(custom_id)
+        if not entry:
+            print(f"  ⚠️  Unknown custom_id in results: {custom_id}")
+            stats["failed"] += 1
+            continue
+        if len(outputs) < entry.get("chunks", 1) or any(raw is None for raw in outputs):
+            print(f"  ❌ Request failed: {entry['title'][:50]}...")
+            stats["failed"] += 1
+            if ledger:
+                ledger.record_failure(entry["url"], "batch request failed")
+            continue
+        if entry["url"] in existing_urls:
+            stats["skipped"] += 1
+            if ledger:
+                ledger.mark_saved(entry["url"])
+            continue
+
+        try:
+            chunk_impacts = [parse_analysis(raw).get("impacts", []) for raw in outputs]
+        except json.JSONDecodeError as e:
+            print(f"  ❌ Failed to parse analysis for {entry['url']}: {e}")
+            stats["failed"] += 1
+            if ledger:
+                ledger.record_failure(entry["url"], f"unparseable analysis: {e}")
+            continue
+
+        if len(outputs) == 1:
+            raw = outputs[0]
+            impacts = chunk_impacts[0]
+        else:
+            impacts = merge_chunk_impacts(chunk_impacts)
+            raw = json.dumps({"impacts": impacts, "chunks": len(outputs)}, ensure_ascii=False)
+
+        if cache:
+            cache.put(clean_article(entry["content"]) or entry["content"], prompt_version, deployment, raw)
+        if ledger:
+            ledger.mark_analyzed(entry["url"], raw)
+
+        print(f"  📄 {entry['title'][:60]}...")
+        to_save.append({
+            "url": entry["url"],
+            "title": entry["title"],
+            "content": entry["content"],
+            "published_date": entry["published_date"],
+            "impacts": stock_manager.expand_impacts(impacts),
+        })
+        if len(to_save) >= chunk_size:
+            await save(to_save)
+            to_save = []
+
+    if to_save:
+        await save(to_save)
+    if not await db.flush_scores():
+        raise RuntimeError("Score flush failed: queued articles and score changes were not written")
+    record_saved()
+    return stats
+
+
+async def _ingest(directory):
+    from db_manager import create_db_manager
+    from stock_manager import StockManager
+    from analysis_cache import AnalysisCache
+    from job_ledger import JobLedger
+
+    stats = await ingest_batch(BatchJob(directory), create_db_manager(), StockManager(), cache=AnalysisCache(),
+                               ledger=JobLedger())
+    print(f"\n✅ Ingested batch: {stats['saved']} saved, {stats['skipped']} skipped, "
+          f"{stats['failed']} failed, {stats['impacts']} impacts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch analysis for historical backfills")
+    parser.add_argument("command", choices=["submit", "status", "ingest", "local"])
+    parser.add_argument("directory", help="Batch directory written by backfill_manager.py --batch")
+    parser.add_argument("--fixtures", help="Fixtures directory for the local stand-in")
+    args = parser.parse_args()
+
+    job = BatchJob(args.directory)
+    if args.command == "submit":
+        submit_batch(job)
+    elif args.command == "status":
+        poll_batch(job)
+    elif args.command == "local":
+        LocalBatchRunner(args.fixtures).run(job)
+    elif args.command == "ingest":
+        asyncio.run(_ingest(args.directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Incremental daily run of the ilboursa pipeline.
+
+Starts discovery at the source's high-water mark (last fully processed
+publication date, kept in the job ledger) minus a small overlap for
+late-published articles, runs through today, then advances the mark.
+The overlap days are rediscovered even though the ledger already has them,
+so articles published late on those dates are picked up.
+Gaps further back are filled with the explicit backfill command
+(`python backfill_manager.py --start ... --end ...`).
+
+Usage:
+    python daily_run.py                    # From the mark (or the last INCREMENTAL_INITIAL_DAYS days)
+    python daily_run.py --overlap 3        # Re-check 3 days before the mark
+
+Cron (every day at 06:15):
+    15 6 * * * cd /path/to/llboursa_scraper && python daily_run.py >> .cache/daily_run.log 2>&1
+"""
+
+import os
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from backfill_manager import backfill_process
+from job_ledger import JobLedger
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; overlapping runs are then not prevented
+    fcntl = None
+
+SOURCE = "ilboursa"
+
+
+def incremental_range(mark, today, overlap_days, initial_days):
+    """
+    Returns the (start, end) publication dates of an incremental run.
+    """
+    if mark is None:
+        return today - timedelta(days=initial_days), today
+    return min(mark - timedelta(days=overlap_days), today), today
+
+
+def acquire_lock(path):
+    """
+    Exclusive lock so a slow run is not overlapped by the next cron tick.
+    Returns the open lock file, or None if another run holds it.
+    """
+    handle = open(path, "w")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+async def daily_run(overlap_days=None, initial_days=None, metrics_path=None):
+    overlap_days = overlap_days if overlap_days is not None else int(os.getenv("INCREMENTAL_OVERLAP_DAYS", "2"))
+    initial_days = initial_days if initial_days is not None else int(os.getenv("INCREMENTAL_INITIAL_DAYS", "3"))
+
+    ledger = JobLedger()
+    mark = ledger.get_high_water_mark(SOURCE)
+    today = datetime.now().date()
+    start_date, end_date = incremental_range(mark, today, overlap_days, initial_days)
+    print(f"📌 High-water mark for {SOURCE}: {mark:%d/%m/%Y}" if mark else f"📌 No high-water mark for {SOURCE} yet")
+
+    # Force rediscovery of [mark - overlap, today]: those dates are complete in the ledger
+    rediscover_from = start_date if mark else None
+    completed_through = await backfill_process(
+        start_date=start_date, end_date=end_date, metrics_path=metrics_path, rediscover_from=rediscover_from
+    )
+
+    if completed_through:
+        ledger.set_high_water_mark(SOURCE, completed_through)
+        print(f"📌 High-water mark for {SOURCE} now {ledger.get_high_water_mark(SOURCE):%d/%m/%Y}")
+    else:
+        print(f"⚠️  No day was fully processed; high-water mark unchanged")
+    ledger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental daily run from the high-water mark")
+    parser.add_argument("--overlap", type=int, help="Days re-checked before the mark (default: INCREMENTAL_OVERLAP_DAYS or 2)")
+    parser.add_argument("--initial-days", type=int, help="Days covered when there is no mark yet (default: INCREMENTAL_INITIAL_DAYS or 3)")
+    parser.add_argument("--metrics", metavar="PATH", help="Write run metrics to PATH (.json snapshot, otherwise Prometheus text)")
+    args = parser.parse_args()
+
+    lock_path = os.getenv("DAILY_RUN_LOCK", ".cache/daily_run.lock")
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    lock = acquire_lock(lock_path)
+    if lock is None:
+        print("⏭️  Another daily run is still in progress, exiting")
+        return
+    try:
+        asyncio.run(daily_run(args.overlap, args.initial_days, args.metrics))
+    finally:
+        lock.close()
+
+
+if __name__ == "__main__":
+    main()
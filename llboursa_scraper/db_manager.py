@@ -1,23 +1,183 @@
 import os
+import re
+import math
 import asyncio
 import json
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from score_cache import ScoreCache
+
+try:
+    from supabase import create_client, Client
+except ImportError:  # Only the local backend (local_store.py) can run without it
+    create_client = None
 
 load_dotenv()
 
-class DBManager:
-    def __init__(self):
+
+# Numeric scores as accepted by save_article_with_impacts in schema.sql
+SCORE_PATTERN = re.compile(r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]{1,3})?$")
+MAX_SENTIMENT = 2147483647  # INTEGER column
+
+
+def sentiment_value(value):
+    """
+    Integer sentiment of an impact, rounded half away from zero like the SQL
+    round() in save_article_with_impacts (merged chunks can produce 2.5).
+    Returns None for a missing or non-numeric value, which the RPC skips too.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not SCORE_PATTERN.match(value):
+            return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(value):
+        return None
+    rounded = int(value + 0.5) if value >= 0 else -int(-value + 0.5)
+    return rounded if abs(rounded) <= MAX_SENTIMENT else None
+
+
+def create_db_manager(backend=None, **kwargs):
+    """
+    Returns the storage backend selected by `backend` or DB_BACKEND:
+    "supabase" (default) or "local" (embedded SQLite, see local_store.py).
+    """
+    backend = (backend or os.getenv("DB_BACKEND", "supabase")).lower()
+    if backend == "local":
+        from local_store import LocalDBManager
+        return LocalDBManager(**kwargs)
+    if backend == "supabase":
+        return DBManager(**kwargs)
+    raise ValueError(f"Unknown DB_BACKEND: {backend} (expected 'supabase' or 'local')")
+
+
+class StorageBackend:
+    """
+    Storage interface shared by the Supabase backend (DBManager) and the
+    embedded one (local_store.LocalDBManager): the methods create_db_manager
+    callers (backfill_manager, elo_replay, local_store sync) may use, plus
+    the ELO settings and formula both backends apply.
+    Backend-specific operations (write-behind cache, legacy scoring) live on
+    the backend that supports them only.
+    """
+
+    def _configure(self, write_behind):
+        """
+        Settings shared by every storage backend.
+        """
+        # ELO Rating System Configuration
+        # (overridable so parameters chosen with elo_replay.py can be deployed)
+        self.K_FACTOR = float(os.getenv("ELO_K_FACTOR", "32"))  # Sensitivity to new information (higher = more volatile)
+        self.INITIAL_RATING = float(os.getenv("ELO_INITIAL_RATING", "1500"))  # Starting point for all stocks
+        self.MARKET_AVERAGE = self.INITIAL_RATING  # Reference point
+
+        # Write-behind mode: scores are cached in-process and flushed in batches
+        if write_behind is None:
+            write_behind = os.getenv("SCORE_WRITE_BEHIND", "0") == "1"
+        self.write_behind = write_behind
+        self.score_cache = None
+        self.saved_articles = {}  # url -> article id, durably saved since the last take_saved_articles()
+
+    def calculate_elo_change(self, current_rating, sentiment_score, market_avg=None):
+        """
+        Calculate ELO rating change based on sentiment score.
+        
+        Args:
+            current_rating: Current ELO rating of the stock
+            sentiment_score: Sentiment from -5 to +5
+            market_avg: Current market average (optional)
+        
+        Returns:
+            float: Rating change to apply
+        
+        ELO Formula:
+        - Expected score = 1 / (1 + 10^((opponent_rating - player_rating) / 400))
+        - New rating = old_rating + K * (actual_score - expected_score)
+        
+        We treat each news event as a "match" against the market average:
+        - Positive news = "win" (actual_score closer to 1)
+        - Negative news = "loss" (actual_score closer to 0)
+        """
+        if market_avg is None:
+            market_avg = self.MARKET_AVERAGE
+        
+        # Convert sentiment (-5 to +5) to actual score (0 to 1)
+        # -5 → 0 (total loss), 0 → 0.5 (draw), +5 → 1 (total win)
+        actual_score = (sentiment_score + 5) / 10.0
+        
+        # Calculate expected score (probability of winning against market)
+        expected_score = 1 / (1 + 10 ** ((market_avg - current_rating) / 400))
+        
+        # Calculate rating change
+        rating_change = self.K_FACTOR * (actual_score - expected_score)
+        
+        return rating_change
+
+    def take_saved_articles(self):
+        """
+        Returns {url: article_id} of the articles written since the last call
+        (article_id is None for an article another writer had already stored).
+        """
+        saved, self.saved_articles = self.saved_articles, {}
+        return saved
+
+    async def check_connection_and_setup(self):
+        raise NotImplementedError
+
+    async def get_existing_urls(self, page_size=1000):
+        raise NotImplementedError
+
+    async def find_existing_urls(self, urls, chunk_size=50):
+        raise NotImplementedError
+
+    async def get_all_scores(self):
+        raise NotImplementedError
+
+    async def get_market_average(self):
+        raise NotImplementedError
+
+    async def initialize_scores(self, tickers):
+        raise NotImplementedError
+
+    async def update_ticker_score(self, ticker, sentiment_delta, reason, article_id):
+        raise NotImplementedError
+
+    async def save_article_with_impacts(self, url, title, content, published_date, impacts):
+        raise NotImplementedError
+
+    async def save_articles_bulk(self, articles, chunk_size=50):
+        raise NotImplementedError
+
+    async def flush_scores(self, max_attempts=3):
+        raise NotImplementedError
+
+    async def get_stock_sentiment_summary(self, limit=None):
+        raise NotImplementedError
+
+    async def get_score_history(self, page_size=1000):
+        raise NotImplementedError
+
+    async def bulk_upsert_scores(self, scores, chunk_size=500):
+        raise NotImplementedError
+
+    async def bulk_update_history_changes(self, rows, chunk_size=500):
+        raise NotImplementedError
+
+
+class DBManager(StorageBackend):
+    def __init__(self, write_behind=None):
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
         if not url or not key:
             raise ValueError("Supabase URL or Key missing in .env")
+        if create_client is None:
+            raise ImportError("The supabase package is required for the Supabase backend: pip install supabase")
         self.supabase: Client = create_client(url, key)
-        
-        # ELO Rating System Configuration
-        self.K_FACTOR = 32  # Sensitivity to new information (higher = more volatile)
-        self.INITIAL_RATING = 1500  # Starting point for all stocks
-        self.MARKET_AVERAGE = 1500  # Reference point
+        self._configure(write_behind)
 
     async def check_connection_and_setup(self):
         """
@@ -30,19 +190,49 @@ class DBManager:
         except Exception as e:
             print(f"Database Warning: Could not access 'scores' table. Please run 'schema.sql' in your Supabase SQL Editor. Error: {e}")
 
-    async def get_existing_urls(self):
+    async def get_existing_urls(self, page_size=1000):
         """
         Returns a set of all URLs already in 'articles' table.
+
+        Pages through the table by id so results are not truncated by the
+        PostgREST row limit. Costs O(archive); prefer find_existing_urls
+        when the candidate URLs are known.
         """
+        urls = set()
+        last_id = 0
         try:
-            response = await asyncio.to_thread(
-                lambda: self.supabase.table("articles").select("url").execute()
-            )
-            data = response.data
-            return set(item['url'] for item in data)
+            while True:
+                response = await asyncio.to_thread(
+                    lambda: self.supabase.table("articles").select("id, url")
+                    .gt("id", last_id).order("id").limit(page_size).execute()
+                )
+                urls.update(item['url'] for item in response.data)
+                if len(response.data) < page_size:
+                    return urls
+                last_id = response.data[-1]['id']
         except Exception as e:
             print(f"Error fetching existing URLs: {e}")
-            return set()
+            return urls
+
+    async def find_existing_urls(self, urls, chunk_size=50):
+        """
+        Returns the subset of urls already in 'articles' table.
+
+        One server-side `url IN (...)` query per chunk (chunks keep the
+        request line short), answered from the unique index on url.
+        """
+        candidates = sorted({url for url in urls if url})
+        existing = set()
+        for i in range(0, len(candidates), chunk_size):
+            chunk = candidates[i:i + chunk_size]
+            try:
+                response = await asyncio.to_thread(
+                    lambda: self.supabase.table("articles").select("url").in_("url", chunk).execute()
+                )
+                existing.update(item['url'] for item in response.data)
+            except Exception as e:
+                print(f"Error checking existing URLs: {e}")
+        return existing
 
     async def get_all_scores(self):
         """
@@ -59,8 +249,24 @@ class DBManager:
 
     async def get_market_average(self):
         """
-        Calculate current market average rating (for ELO system)
+        Current market average rating (for ELO system).
+
+        Reads the running sum/count kept in 'market_stats' by a trigger on
+        'scores' (one row, O(1)); falls back to averaging the whole table if
+        the schema predates it.
         """
+        try:
+            response = await asyncio.to_thread(
+                lambda: self.supabase.table("market_stats").select("score_sum, score_count").eq("id", 1).execute()
+            )
+            if response.data:
+                stats = response.data[0]
+                if not stats['score_count']:
+                    return self.MARKET_AVERAGE
+                return float(stats['score_sum']) / stats['score_count']
+        except Exception as e:
+            print(f"market_stats unavailable ({e}), averaging 'scores' instead. Re-run schema.sql to create it.")
+
         try:
             response = await asyncio.to_thread(
                 lambda: self.supabase.table("scores").select("score").execute()
@@ -96,41 +302,6 @@ class DBManager:
                 except Exception as e:
                     print(f"Error initializing scores: {e}")
 
-    def calculate_elo_change(self, current_rating, sentiment_score, market_avg=None):
-        """
-        Calculate ELO rating change based on sentiment score.
-        
-        Args:
-            current_rating: Current ELO rating of the stock
-            sentiment_score: Sentiment from -5 to +5
-            market_avg: Current market average (optional)
-        
-        Returns:
-            float: Rating change to apply
-        
-        ELO Formula:
-        - Expected score = 1 / (1 + 10^((opponent_rating - player_rating) / 400))
-        - New rating = old_rating + K * (actual_score - expected_score)
-        
-        We treat each news event as a "match" against the market average:
-        - Positive news = "win" (actual_score closer to 1)
-        - Negative news = "loss" (actual_score closer to 0)
-        """
-        if market_avg is None:
-            market_avg = self.MARKET_AVERAGE
-        
-        # Convert sentiment (-5 to +5) to actual score (0 to 1)
-        # -5 → 0 (total loss), 0 → 0.5 (draw), +5 → 1 (total win)
-        actual_score = (sentiment_score + 5) / 10.0
-        
-        # Calculate expected score (probability of winning against market)
-        expected_score = 1 / (1 + 10 ** ((market_avg - current_rating) / 400))
-        
-        # Calculate rating change
-        rating_change = self.K_FACTOR * (actual_score - expected_score)
-        
-        return rating_change
-
     async def update_ticker_score(self, ticker, sentiment_delta, reason, article_id):
         """
         Updates a specific ticker's score using ELO rating system.
@@ -173,7 +344,8 @@ class DBManager:
                     "ticker": ticker,
                     "change": rating_change,
                     "reason": f"[Sentiment: {sentiment_delta:+d}] {reason}",
-                    "article_id": article_id
+                    "article_id": article_id,
+                    "sentiment": sentiment_delta
                 }).execute()
             )
             
@@ -182,6 +354,292 @@ class DBManager:
         except Exception as e:
             print(f"Error updating score for {ticker}: {e}")
 
+    async def save_article_with_impacts(self, url, title, content, published_date, impacts):
+        """
+        Saves an article with its analysis and applies every ticker impact to the ELO scores.
+
+        Runs as a single RPC (`save_article_with_impacts` in schema.sql): the
+        article insert, the ELO deltas, the `scores` updates and the
+        `score_history` rows are committed in one transaction, in one request.
+
+        Args:
+            url: Article URL (unique)
+            title: Article title
+            content: Extracted article text
+            published_date: Publication date (DD/MM/YYYY)
+            impacts: Expanded impacts (sector entries are stored, ticker entries are scored)
+
+        In write-behind mode the article is queued with its score changes
+        and written by the next flush: the call returns 0 while the article
+        is still queued. take_saved_articles() reports which articles have
+        actually reached the database.
+
+        Returns:
+            int: New article id (0 if queued), or None if the article already exists or could not be saved
+        """
+        if self.write_behind:
+            return await self._save_article_write_behind(url, title, content, published_date, impacts)
+
+        try:
+            res = await asyncio.to_thread(
+                lambda: self.supabase.rpc("save_article_with_impacts", {
+                    "p_url": url,
+                    "p_title": title,
+                    "p_content": content,
+                    "p_published_date": published_date,
+                    "p_impacts": impacts,
+                    "p_k_factor": self.K_FACTOR,
+                    "p_default_average": self.MARKET_AVERAGE,
+                }).execute()
+            )
+        except Exception as e:
+            print(f"Error saving article {url}: {e}")
+            return None
+
+        result = res.data
+        if not result:
+            print(f"Article already saved: {url}")
+            return None
+
+        for update in result["updates"]:
+            print(f"      > ELO Update: {update['ticker']} | Sentiment: {update['sentiment']:+d} | "
+                  f"Rating: {float(update['old']):.1f} → {float(update['new']):.1f} ({float(update['change']):+.1f})")
+
+        self.saved_articles[url] = result["article_id"]
+        return result["article_id"]
+
+    async def save_articles_bulk(self, articles, chunk_size=50):
+        """
+        Saves many articles ({url, title, content, published_date, impacts})
+        with one `save_articles_with_impacts` RPC per chunk, in order.
+
+        In write-behind mode the articles are queued like single saves.
+
+        Returns:
+            dict: {url: article_id} (0 if queued, None if already stored or the chunk failed)
+        """
+        results = {}
+        if self.write_behind:
+            for article in articles:
+                article_id = await self._save_article_write_behind(
+                    article["url"], article["title"], article["content"],
+                    article["published_date"], article["impacts"]
+                )
+                results.setdefault(article["url"], article_id)  # A repeated URL keeps its first result
+            return results
+
+        for i in range(0, len(articles), chunk_size):
+            chunk = articles[i:i + chunk_size]
+            try:
+                res = await asyncio.to_thread(
+                    lambda: self.supabase.rpc("save_articles_with_impacts", {
+                        "p_articles": chunk,
+                        "p_k_factor": self.K_FACTOR,
+                        "p_default_average": self.MARKET_AVERAGE,
+                    }).execute()
+                )
+            except Exception as e:
+                print(f"Error saving {len(chunk)} articles: {e}")
+                for article in chunk:
+                    results.setdefault(article["url"], None)
+                continue
+
+            ids = res.data or {}
+            for article in chunk:
+                article_id = ids.get(article["url"])
+                results.setdefault(article["url"], article_id)
+                if article_id:
+                    self.saved_articles[article["url"]] = article_id
+            print(f"      💾 Saved {sum(1 for a in chunk if ids.get(a['url']))}/{len(chunk)} articles in one request")
+        return results
+
+    async def _save_article_write_behind(self, url, title, content, published_date, impacts):
+        """
+        Queues the article and applies its ticker impacts to the score cache;
+        the article row, scores and history rows are written by one flush.
+        """
+        if self.score_cache is None:
+            await self.load_score_cache()
+        queued = self.score_cache.add_article({
+            "url": url,
+            "title": title,
+            "content": content,
+            "published_date": published_date,
+            "analysis_json": {"impacts": impacts},
+        })
+        if not queued:
+            print(f"Article already queued: {url}")
+            return None
+
+        for impact in impacts:
+            sentiment = sentiment_value(impact.get("sentiment_score"))
+            if impact.get("type") != "ticker" or sentiment is None:
+                continue
+            await self.apply_impact_cached(
+                impact["target"],
+                sentiment,
+                impact.get("reasoning", ""),
+                None,
+                article_url=url
+            )
+
+        # Only flush between articles, never halfway through one
+        if self.score_cache.should_flush():
+            await self.flush_scores()
+        return self.saved_articles.get(url, 0)
+
+    async def load_score_cache(self):
+        """
+        Loads every ticker's score and row version into the in-process cache.
+        """
+        response = await asyncio.to_thread(
+            lambda: self.supabase.table("scores").select("ticker, score, version").execute()
+        )
+        self.score_cache = ScoreCache()
+        self.score_cache.load(response.data)
+        print(f"Loaded {len(response.data)} scores into the write-behind cache.")
+        return self.score_cache
+
+    async def apply_impact_cached(self, ticker, sentiment_delta, reason, article_id, article_url=None):
+        """
+        Applies an ELO update to the cached score; the write happens on the next flush.
+        article_url links the history row to an article queued in the same cache.
+        """
+        if self.score_cache is None:
+            await self.load_score_cache()
+        if ticker not in self.score_cache:
+            print(f"Ticker {ticker} not found in DB. Skipping.")
+            return
+
+        current_rating = self.score_cache.get(ticker)
+        market_avg = self.score_cache.market_average(self.MARKET_AVERAGE)
+        rating_change = self.calculate_elo_change(current_rating, sentiment_delta, market_avg)
+        _, new_rating = self.score_cache.apply(
+            ticker, rating_change, f"[Sentiment: {sentiment_delta:+d}] {reason}", article_id, sentiment_delta,
+            article_url=article_url
+        )
+        print(f"      > ELO Update: {ticker} | Sentiment: {sentiment_delta:+d} | Rating: {current_rating:.1f} → {new_rating:.1f} ({rating_change:+.1f})")
+
+    async def flush_scores(self, max_attempts=3):
+        """
+        Writes pending articles, cached scores and history rows in one
+        `apply_score_batch` RPC (one transaction).
+
+        The RPC checks every row version first; if another writer changed a
+        ticker since it was cached, nothing is written, the local changes are
+        rebased on the current rows and the flush is retried. Queued articles
+        whose URL is already stored are dropped with their score changes.
+
+        Returns:
+            bool: True if everything pending was written; on False the
+            pending changes stay queued and must not be reported as saved
+        """
+        if self.score_cache is None or not self.score_cache.has_pending():
+            return True
+
+        for attempt in range(max_attempts):
+            scores, history, articles = self.score_cache.pending()
+            try:
+                res = await asyncio.to_thread(
+                    lambda: self.supabase.rpc("apply_score_batch", {
+                        "p_scores": scores,
+                        "p_history": history,
+                        "p_articles": articles,
+                    }).execute()
+                )
+            except Exception as e:
+                print(f"Error flushing scores: {e}")
+                return False
+
+            duplicates = res.data.get("duplicates") or []
+            if duplicates:
+                print(f"      ⚠️  {len(duplicates)} queued articles already saved, dropping them (attempt {attempt + 1}/{max_attempts})")
+                self.score_cache.drop_articles(duplicates)
+                self.saved_articles.update(dict.fromkeys(duplicates))
+                continue
+
+            conflicts = res.data.get("conflicts") or []
+            if not conflicts:
+                self.score_cache.mark_flushed()
+                self.saved_articles.update(res.data.get("article_ids") or {})
+                print(f"      💾 Flushed {len(articles)} articles, {len(scores)} scores, {len(history)} history rows")
+                return True
+
+            print(f"      ⚠️  {len(conflicts)} scores changed concurrently, rebasing (attempt {attempt + 1}/{max_attempts})")
+            self.score_cache.rebase(conflicts)
+
+        print("Error flushing scores: too many concurrent updates, pending changes kept in cache")
+        return False
+
+    async def get_stock_sentiment_summary(self, limit=None):
+        """
+        Returns {ticker: {mention_count, avg_sentiment, recent_sentiment, last_sentiment, last_updated}},
+        most mentioned first (optionally only the top `limit` tickers).
+
+        Reads the 'ticker_sentiment_summary' table, kept up to date by a
+        trigger on 'score_history' (one small query, no history scan).
+        """
+        try:
+            query = self.supabase.table("ticker_sentiment_summary").select(
+                "ticker, mention_count, avg_sentiment, recent_sentiment, last_sentiment, last_updated"
+            ).order("mention_count", desc=True)
+            if limit:
+                query = query.limit(limit)
+            response = await asyncio.to_thread(query.execute)
+        except Exception as e:
+            print(f"Error fetching sentiment summary: {e}")
+            return {}
+
+        return {
+            item['ticker']: {
+                "mention_count": item['mention_count'],
+                "avg_sentiment": float(item['avg_sentiment']),
+                "recent_sentiment": float(item['recent_sentiment']),
+                "last_sentiment": item['last_sentiment'],
+                "last_updated": item['last_updated'],
+            }
+            for item in response.data
+        }
+
+    async def get_score_history(self, page_size=1000):
+        """
+        Returns every 'score_history' row (id, ticker, sentiment, reason), oldest first.
+        Paged by id so the PostgREST row limit does not truncate it.
+        """
+        rows = []
+        last_id = 0
+        while True:
+            response = await asyncio.to_thread(
+                lambda: self.supabase.table("score_history").select("id, ticker, sentiment, reason")
+                .gt("id", last_id).order("id").limit(page_size).execute()
+            )
+            rows.extend(response.data)
+            if len(response.data) < page_size:
+                return rows
+            last_id = response.data[-1]['id']
+
+    async def bulk_upsert_scores(self, scores, chunk_size=500):
+        """
+        Upserts [{ticker, score}] rows in chunks.
+        """
+        for i in range(0, len(scores), chunk_size):
+            chunk = scores[i:i + chunk_size]
+            await asyncio.to_thread(
+                lambda: self.supabase.table("scores").upsert(chunk).execute()
+            )
+        print(f"Upserted {len(scores)} scores.")
+
+    async def bulk_update_history_changes(self, rows, chunk_size=500):
+        """
+        Rewrites the 'change' of existing score_history rows ([{id, ticker, change}]) in chunks.
+        """
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            await asyncio.to_thread(
+                lambda: self.supabase.table("score_history").upsert(chunk, on_conflict="id").execute()
+            )
+        print(f"Updated {len(rows)} score history rows.")
+
     async def update_ticker_score_simple(self, ticker, sentiment_delta, reason, article_id):
         """
         LEGACY: Simple addition scoring (kept for comparison)
@@ -1,6 +1,7 @@
 # from langchain_openai import AzureChatOpenAI  <-- Caused the error
 from browser_use import Agent, ChatAzureOpenAI
 from browser_config import get_local_browser
+from host_limiter import get_host_limiter
 import os
 import asyncio
 from dotenv import load_dotenv
@@ -18,6 +19,7 @@ async def discovery_run(target_date: str):
     Returns:
         JSON string with list of articles
     """
+    news_url = "https://www.ilboursa.com/marches/actualites_bourse_tunis"
     
     # Initialize Azure OpenAI using browser-use's wrapper
     # IMPORTANT: Use newer API version that supports json_schema
@@ -37,7 +39,7 @@ You are navigating the ilboursa.com website to extract news articles for a SPECI
 **CRITICAL INSTRUCTIONS:**
 
 1. **Navigate to the page:**
-   - Go to https://www.ilboursa.com/marches/actualites_bourse_tunis
+   - Go to {news_url}
    - Wait 3 seconds for full page load
 
 2. **Clear and set the date (VERY IMPORTANT):**
@@ -89,7 +91,9 @@ You are navigating the ilboursa.com website to extract news articles for a SPECI
     )
 
     try:
-        history = await agent.run()
+        # The whole browsing session counts as one request to the site (its duration is not a latency signal)
+        async with get_host_limiter().aslot(news_url, measure_latency=False):
+            history = await agent.run()
         result = history.final_result()
         
         # Basic validation
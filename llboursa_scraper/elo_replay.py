@@ -0,0 +1,332 @@
+"""
+Offline ELO replay and parameter sweeps.
+
+Re-computes every ticker's rating trajectory from the stored sentiment
+events (score_history, in insertion order) without calling the LLM again,
+for many (K factor, market average, initial rating) configurations at once:
+each event updates a (tickers x configs) rating matrix. Events depend on
+each other (every update moves the market average), so they are applied
+one by one: numba compiles that loop (~0.2 s for 100k events x 12
+configs). Without numba the NumPy fallback vectorizes each step across
+configurations only, which costs ~1.5 s per 100k events whatever the
+number of configs; install numba for archive-sized replays. The chosen
+configuration can then be written back in bulk, if it is the one the live
+scorer uses (market "mean", ELO_K_FACTOR, ELO_INITIAL_RATING).
+
+Market average definitions:
+    mean    - running mean of all tickers' ratings (what DBManager uses)
+    fixed   - constant reference at the initial rating
+    sector  - running mean of the ticker's own sector
+
+Usage:
+    python elo_replay.py                                   # Sweep K=16,24,32,48 x mean/fixed/sector
+    python elo_replay.py --k 20 32 --market mean sector    # Custom sweep
+    python elo_replay.py --synthetic 100000                # Timing on synthetic events (no DB)
+    ELO_K_FACTOR=24 python elo_replay.py --k 24 --market mean --apply 0   # Write config #0 back (must match the live config)
+"""
+
+import re
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Falls back to the NumPy path, ~10x slower (see module docstring)
+    njit = None
+
+MARKET_MODES = ("mean", "fixed", "sector")
+LIVE_MARKET_MODE = "mean"  # What DBManager.calculate_elo_change and the RPC use
+SLOW_REPLAY_EVENTS = 20000  # Above this, the NumPy fallback takes noticeably long
+_SENTIMENT_RE = re.compile(r"^\[Sentiment: ([+-]?\d+)\]")
+
+
+class ReplayEvents:
+    """
+    Sentiment events in application order, encoded as integer arrays.
+    """
+
+    def __init__(self, tickers, sectors, ticker_idx, sentiment, history_ids=None):
+        self.tickers = list(tickers)            # index -> ticker
+        self.sectors = np.asarray(sectors)      # ticker index -> sector index
+        self.ticker_idx = np.asarray(ticker_idx, dtype=np.int64)
+        self.sentiment = np.asarray(sentiment, dtype=np.float64)
+        self.history_ids = history_ids          # score_history ids, for write-back
+
+    def __len__(self):
+        return len(self.ticker_idx)
+
+    @classmethod
+    def from_rows(cls, rows, stocks_data, universe=None):
+        """
+        Builds events from score_history rows ({id, ticker, sentiment, reason}, oldest first).
+
+        universe: tickers counted in the market mean (defaults to every
+        ticker of stocks_data plus any ticker found in the rows).
+        """
+        sector_of = {stock['ticker']: sector for sector, stocks in stocks_data.items() for stock in stocks}
+        tickers = list(universe or sector_of)
+        index = {ticker: i for i, ticker in enumerate(tickers)}
+
+        ticker_idx, sentiment, history_ids = [], [], []
+        for row in rows:
+            value = row.get('sentiment')
+            if value is None:
+                match = _SENTIMENT_RE.match(row.get('reason') or "")
+                if not match:
+                    continue  # Not an ELO event (e.g. legacy simple scoring)
+                value = int(match.group(1))
+            ticker = row['ticker']
+            if ticker not in index:
+                index[ticker] = len(tickers)
+                tickers.append(ticker)
+            ticker_idx.append(index[ticker])
+            sentiment.append(value)
+            history_ids.append(row.get('id'))
+
+        sector_names = sorted(set(sector_of.values())) + ["__other__"]
+        sector_index = {name: i for i, name in enumerate(sector_names)}
+        sectors = [sector_index[sector_of.get(ticker, "__other__")] for ticker in tickers]
+        return cls(tickers, sectors, ticker_idx, sentiment, history_ids)
+
+    @classmethod
+    def synthetic(cls, n_events, stocks_data, seed=0):
+        rng = np.random.default_rng(seed)
+        tickers = [stock['ticker'] for stocks in stocks_data.values() for stock in stocks]
+        sectors = [i for i, stocks in enumerate(stocks_data.values()) for _ in stocks]
+        return cls(
+            tickers,
+            sectors,
+            rng.integers(0, len(tickers), n_events),
+            rng.integers(-5, 6, n_events),
+        )
+
+
+def sweep_configs(k_factors, market_modes, initial_ratings):
+    return [
+        {"k": float(k), "market": market, "initial": float(initial)}
+        for k, market, initial in itertools.product(k_factors, market_modes, initial_ratings)
+    ]
+
+
+def _replay_numpy(ticker_idx, event_sector, actual, k, base, base_weight, sector_weight, ratings, sector_total, changes, trajectory):
+    """
+    One vectorized step per event, across all configurations.
+    """
+    scale = np.log(10.0) / 400.0
+    for i in range(len(ticker_idx)):
+        t, s = ticker_idx[i], event_sector[i]
+        current = ratings[t]
+        market_avg = base + sector_total[s] * sector_weight[s]
+        expected = 1.0 / (1.0 + np.exp((market_avg - current) * scale))
+        delta = k * (actual[i] - expected)
+        current += delta
+        base += delta * base_weight
+        sector_total[s] += delta
+        changes[i] = delta
+        trajectory[i] = current
+
+
+def _replay_loops(ticker_idx, event_sector, actual, k, base, base_weight, sector_weight, ratings, sector_total, changes, trajectory):
+    """
+    Same computation as _replay_numpy with explicit loops, compiled by numba when installed.
+    """
+    scale = np.log(10.0) / 400.0
+    n_configs = k.shape[0]
+    for i in range(ticker_idx.shape[0]):
+        t = ticker_idx[i]
+        s = event_sector[i]
+        for c in range(n_configs):
+            current = ratings[t, c]
+            market_avg = base[c] + sector_total[s, c] * sector_weight[s, c]
+            expected = 1.0 / (1.0 + np.exp((market_avg - current) * scale))
+            delta = k[c] * (actual[i] - expected)
+            ratings[t, c] = current + delta
+            base[c] += delta * base_weight[c]
+            sector_total[s, c] += delta
+            changes[i, c] = delta
+            trajectory[i, c] = current + delta
+
+
+if njit is not None:
+    _replay_loops = njit(cache=True)(_replay_loops)
+
+
+def replay(events, configs):
+    """
+    Replays all events under every configuration.
+
+    Every event is applied in order (the market average moves with each
+    update, exactly as in DBManager), to all configurations at once.
+
+    Returns:
+        dict: final ratings (configs x tickers), per-event changes and
+        post-event ratings (configs x events), and the elapsed seconds
+    """
+    n_configs, n_tickers = len(configs), len(events.tickers)
+    k = np.array([c["k"] for c in configs])
+    initial = np.array([c["initial"] for c in configs])
+    mode = np.array([MARKET_MODES.index(c["market"]) for c in configs])
+
+    n_sectors = int(events.sectors.max()) + 1 if n_tickers else 0
+    sector_size = np.bincount(events.sectors, minlength=n_sectors).astype(np.float64)
+
+    # market_avg = base + sector_total[sector] * sector_weight[sector]:
+    #   mean   -> base is the running mean (moves by delta / n_tickers), no sector term
+    #   fixed  -> base is the initial rating, no sector term
+    #   sector -> base is 0, sector running sum / sector size
+    base = np.where(mode == 2, 0.0, initial)
+    base_weight = np.where(mode == 0, 1.0 / max(n_tickers, 1), 0.0)
+    with np.errstate(divide="ignore"):
+        inv_size = np.where(sector_size > 0, 1.0 / sector_size, 0.0)
+    sector_weight = inv_size[:, None] * (mode == 2)[None, :]
+
+    ratings = np.repeat(initial[None, :], n_tickers, axis=0)     # tickers x configs
+    sector_total = sector_size[:, None] * initial[None, :]       # sectors x configs
+    actual = (events.sentiment + 5) / 10.0                       # -5..+5 -> 0..1
+    event_sector = events.sectors[events.ticker_idx] if len(events) else np.zeros(0, dtype=np.int64)
+
+    changes = np.empty((len(events), n_configs))
+    trajectory = np.empty((len(events), n_configs))
+
+    kernel = _replay_loops if njit is not None else _replay_numpy
+    start = time.perf_counter()
+    kernel(events.ticker_idx, np.ascontiguousarray(event_sector, dtype=np.int64), actual, k, base, base_weight,
+           sector_weight, ratings, sector_total, changes, trajectory)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "configs": configs,
+        "tickers": events.tickers,
+        "ratings": ratings.T,
+        "changes": changes.T,
+        "trajectory": trajectory.T,
+        "seconds": elapsed,
+    }
+
+
+def summarize(result):
+    """
+    Per-configuration statistics of the final ratings and of the changes.
+    """
+    rows = []
+    for i, config in enumerate(result["configs"]):
+        final = result["ratings"][i]
+        changes = result["changes"][i]
+        rows.append({
+            **config,
+            "spread": float(final.std()),
+            "min": float(final.min()),
+            "max": float(final.max()),
+            "mean_abs_change": float(np.abs(changes).mean()) if changes.size else 0.0,
+            "top": result["tickers"][int(final.argmax())] if final.size else None,
+            "bottom": result["tickers"][int(final.argmin())] if final.size else None,
+        })
+    return rows
+
+
+async def load_events(db, stocks_data, page_size=1000):
+    """
+    Reads score_history (oldest first) and the current ticker universe from the database.
+    """
+    universe = list((await db.get_all_scores()).keys()) or None
+    rows = await db.get_score_history(page_size=page_size)
+    return ReplayEvents.from_rows(rows, stocks_data, universe=universe)
+
+
+def apply_error(db, configs, config_index):
+    """
+    Reason why configs[config_index] cannot be written back, or None.
+
+    Written-back ratings must be the ones the live scorer would have
+    produced, otherwise the next article's update starts from ratings
+    computed under other parameters.
+    """
+    if not 0 <= config_index < len(configs):
+        return f"no config #{config_index} (0..{len(configs) - 1})"
+    config = configs[config_index]
+    if config["market"] != LIVE_MARKET_MODE:
+        return f"market={config['market']} is not used by live scoring (only '{LIVE_MARKET_MODE}')"
+    if config["k"] != db.K_FACTOR or config["initial"] != db.INITIAL_RATING:
+        return (f"K={config['k']:g}, initial={config['initial']:g} differ from the live "
+                f"ELO_K_FACTOR={db.K_FACTOR:g}, ELO_INITIAL_RATING={db.INITIAL_RATING:g}; "
+                f"set them first so new updates use the same parameters")
+    return None
+
+
+async def write_back(db, events, result, config_index):
+    """
+    Replaces scores and score_history changes with one configuration's replay, in bulk.
+    """
+    changes = result["changes"][config_index]
+    ratings = result["ratings"][config_index]
+    history = [
+        {"id": history_id, "ticker": events.tickers[t], "change": float(change)}
+        for history_id, t, change in zip(events.history_ids, events.ticker_idx, changes)
+        if history_id is not None
+    ]
+    scores = [{"ticker": ticker, "score": float(rating)} for ticker, rating in zip(events.tickers, ratings)]
+    await db.bulk_update_history_changes(history)
+    await db.bulk_upsert_scores(scores)
+
+
+def _print_summary(rows, result, n_events):
+    print(f"\n⚡ Replayed {n_events} events x {len(rows)} configs in {result['seconds'] * 1000:.1f} ms\n")
+    print(f"{'#':>3}  {'K':>5}  {'market':<7} {'initial':>7}  {'spread':>7}  {'min':>7}  {'max':>7}  {'|Δ|':>5}  top / bottom")
+    for i, row in enumerate(rows):
+        print(f"{i:>3}  {row['k']:>5.0f}  {row['market']:<7} {row['initial']:>7.0f}  {row['spread']:>7.1f}  "
+              f"{row['min']:>7.1f}  {row['max']:>7.1f}  {row['mean_abs_change']:>5.2f}  {row['top']} / {row['bottom']}")
+
+
+async def _main(args):
+    with open(args.sectors, "r", encoding="utf-8") as f:
+        stocks_data = json.load(f)
+
+    db = None
+    if args.synthetic:
+        events = ReplayEvents.synthetic(args.synthetic, stocks_data)
+    else:
+        from db_manager import create_db_manager
+        db = create_db_manager()
+        events = await load_events(db, stocks_data)
+        print(f"📚 Loaded {len(events)} ELO events for {len(events.tickers)} tickers")
+
+    configs = sweep_configs(args.k, args.market, args.initial)
+    if njit is None and len(events) > SLOW_REPLAY_EVENTS:
+        print(f"⚠️  numba is not installed: replaying {len(events)} events with NumPy "
+              f"(~{len(events) * 1.5e-5:.0f} s). pip install numba for the compiled replay.")
+    result = replay(events, configs)
+    _print_summary(summarize(result), result, len(events))
+
+    if args.apply is not None:
+        if db is None:
+            print("❌ --apply needs the database (not available with --synthetic)")
+            return
+        error = apply_error(db, configs, args.apply)
+        if error:
+            print(f"❌ Not applying: {error}")
+            return
+        config = configs[args.apply]
+        print(f"\n💾 Writing config #{args.apply} (K={config['k']:.0f}, market={config['market']}, "
+              f"initial={config['initial']:.0f}) back to scores and score_history...")
+        await write_back(db, events, result, args.apply)
+        print("✅ Done.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized ELO replay with parameter sweeps")
+    parser.add_argument("--k", type=float, nargs="+", default=[16, 24, 32, 48], help="K factors to sweep")
+    parser.add_argument("--market", nargs="+", choices=MARKET_MODES, default=list(MARKET_MODES),
+                        help="Market average definitions to sweep")
+    parser.add_argument("--initial", type=float, nargs="+", default=[1500], help="Initial ratings to sweep")
+    parser.add_argument("--sectors", default="tunisian_stocks_by_sector.json")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Replay N random events instead of the database")
+    parser.add_argument("--apply", type=int, metavar="INDEX", help="Write this configuration's replay back to the database")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
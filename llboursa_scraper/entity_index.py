@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import unicodedata
+from collections import deque, namedtuple
+
+Mention = namedtuple("Mention", ["kind", "canonical", "start", "end", "surface"])
+
+
+def normalize_text(text: str) -> str:
+    """
+    Uppercases, strips accents and replaces punctuation with single spaces,
+    padded with spaces so patterns only match on word boundaries.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^0-9A-Za-z]+", " ", text).upper().strip()
+    return f" {text} "
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: finds every occurrence of every pattern in one pass over the text.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter(self, text):
+        """
+        Yields (start, end, value) for every match.
+        """
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, value in self.output[state]:
+                yield i - length + 1, i + 1, value
+
+
+class EntityIndex:
+    """
+    Local index of company, ticker, alias and sector mentions.
+
+    Built once from tunisian_stocks_by_sector.json and stock_aliases.json,
+    it finds every listed company or sector term an article mentions in a
+    single linear pass, and maps free-form targets returned by the LLM
+    ("Banking", "Banque Internationale Arabe de Tunisie", "biat") to the
+    canonical ticker or sector key.
+
+    Ambiguous acronyms ("strict_tickers" in the alias file, e.g. BT) are only
+    reported as mentions when they appear in uppercase as a whole token and
+    the text also names the company or its sector; as LLM targets they
+    resolve like any alias.
+    """
+
+    def __init__(self, stocks_data, alias_file="stock_aliases.json"):
+        self.stocks_data = stocks_data
+        self.ticker_sector = {
+            stock['ticker']: sector for sector, stocks in stocks_data.items() for stock in stocks
+        }
+
+        aliases = {"tickers": {}, "sectors": {}}
+        if alias_file and os.path.exists(alias_file):
+            with open(alias_file, "r", encoding="utf-8") as f:
+                aliases = json.load(f)
+
+        # normalized surface form -> (kind, canonical)
+        self.lookup = {}
+        for sector, stocks in stocks_data.items():
+            self._register("sector", sector, sector.replace("_", " "))
+            for term in aliases.get("sectors", {}).get(sector, []):
+                self._register("sector", sector, term)
+            for stock in stocks:
+                self._register("ticker", stock['ticker'], stock['ticker'])
+                self._register("ticker", stock['ticker'], stock['name'])
+        for ticker, names in aliases.get("tickers", {}).items():
+            if ticker not in self.ticker_sector:
+                continue
+            for name in names:
+                self._register("ticker", ticker, name)
+
+        # normalized surface -> case-sensitive whole-token pattern of a strict alias
+        self.strict = {}
+        for ticker, names in aliases.get("strict_tickers", {}).items():
+            if ticker not in self.ticker_sector:
+                continue
+            for name in names:
+                self._register("ticker", ticker, name)
+                self.strict[normalize_text(name)] = re.compile(rf"(?<![^\W_]){re.escape(name)}(?![^\W_])")
+
+        self.matcher = AhoCorasick()
+        for surface, entity in self.lookup.items():
+            self.matcher.add(surface, entity)
+        self.matcher.build()
+
+    def _register(self, kind, canonical, surface):
+        key = normalize_text(surface)
+        if key.strip():
+            # Ticker names win over sector terms on collisions
+            if key not in self.lookup or kind == "ticker":
+                self.lookup[key] = (kind, canonical)
+
+    def find_mentions(self, text):
+        """
+        Returns non-overlapping mentions, leftmost-longest first.
+        Offsets refer to the normalized text.
+        """
+        normalized = normalize_text(text)
+        candidates = sorted(self.matcher.iter(normalized), key=lambda m: (m[0], -(m[1] - m[0])))
+        mentions = []
+        last_end = -1
+        for start, end, (kind, canonical) in candidates:
+            # Patterns carry their boundary spaces, so adjacent matches share one character
+            if start < last_end - 1:
+                continue
+            mentions.append(Mention(kind, canonical, start, end, normalized[start + 1:end - 1]))
+            last_end = end
+        if self.strict:
+            mentions = self._confirm_strict(text, mentions)
+        return mentions
+
+    def _confirm_strict(self, text, mentions):
+        """
+        Drops strict-alias mentions that are not an uppercase whole token of
+        the original text or lack a second signal (another mention of the same
+        company or of its sector).
+        """
+        strict = [m for m in mentions if f" {m.surface} " in self.strict]
+        if not strict:
+            return mentions
+        signals = {
+            (m.kind, m.canonical) for m in mentions if f" {m.surface} " not in self.strict
+        }
+        dropped = set()
+        for mention in strict:
+            pattern = self.strict[f" {mention.surface} "]
+            supported = (("ticker", mention.canonical) in signals
+                         or ("sector", self.ticker_sector[mention.canonical]) in signals)
+            if not (supported and pattern.search(text)):
+                dropped.add(mention)
+        return [m for m in mentions if m not in dropped]
+
+    def mentioned_tickers(self, text):
+        return sorted({m.canonical for m in self.find_mentions(text) if m.kind == "ticker"})
+
+    def relevant_sectors(self, text):
+        """
+        Sectors mentioned directly or through one of their companies, in universe order.
+        """
+        sectors = set()
+        for mention in self.find_mentions(text):
+            sectors.add(mention.canonical if mention.kind == "sector" else self.ticker_sector[mention.canonical])
+        return [sector for sector in self.stocks_data if sector in sectors]
+
+    def normalize_target(self, target, impact_type=None):
+        """
+        Maps an LLM-returned target to (kind, canonical), or None if unknown.
+
+        Exact tickers/sector keys are returned as is; otherwise the normalized
+        form is looked up among names and aliases, and as a last resort the
+        target is scanned for a single unambiguous mention.
+        """
+        if not target:
+            return None
+        if target in self.ticker_sector and impact_type != "sector":
+            return ("ticker", target)
+        sector_key = target.lower().replace(" ", "_")
+        if sector_key in self.stocks_data and impact_type != "ticker":
+            return ("sector", sector_key)
+
+        entity = self.lookup.get(normalize_text(target))
+        if entity and (impact_type is None or entity[0] == impact_type):
+            return entity
+
+        mentions = {(m.kind, m.canonical) for m in self.find_mentions(target)}
+        if impact_type:
+            mentions = {m for m in mentions if m[0] == impact_type}
+        if len(mentions) == 1:
+            return mentions.pop()
+        return None
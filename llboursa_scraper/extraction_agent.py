@@ -1,33 +1,103 @@
 import asyncio
 from playwright.async_api import async_playwright
+from extraction_cache import STATUS_OK, STATUS_DEAD, STATUS_FAILED, normalize_url
+from host_limiter import get_host_limiter, parse_retry_after
+from metrics import get_metrics
 
-async def extraction_run(url: str):
+async def extraction_run(url: str, cache=None):
     """
     Extracts content from a single URL using a local Playwright instance.
+
+    When an ExtractionCache is given, fresh extractions are served from disk
+    without touching the site, dead pages are skipped until their TTL expires,
+    and stale entries are revalidated with If-None-Match / If-Modified-Since
+    (sent on the article's navigation request only, not on its subresources).
     """
+    entry = cache.get(url) if cache else None
+
+    metrics = get_metrics()
+    if cache and cache.is_fresh(entry):
+        print(f"Using cached extraction for: {url}")
+        metrics.inc("cache_requests_total", cache="extraction", result="hit")
+        return entry["content"]
+
+    if cache and cache.is_dead(entry):
+        print(f"Skipping known dead page: {url}")
+        metrics.inc("cache_requests_total", cache="extraction", result="dead")
+        return ""
+
+    if cache:
+        metrics.inc("cache_requests_total", cache="extraction", result="miss")
+
     print(f"Extracting content from: {url}")
-    
+
     async with async_playwright() as p:
         # Launch local browser (headless=True for background execution)
         browser = await p.chromium.launch(headless=True)
-        
+
         try:
             page = await browser.new_page()
-            await page.goto(url, timeout=60000)
-            
+
+            headers = cache.conditional_headers(entry) if cache else {}
+            if headers:
+                async def add_validators(route):
+                    request = route.request
+                    if request.is_navigation_request() and request.frame == page.main_frame:
+                        await route.continue_(headers={**request.headers, **headers})
+                    else:
+                        await route.continue_()
+
+                url_key = normalize_url(url)
+                await page.route(lambda request_url: normalize_url(request_url) == url_key, add_validators)
+
+            # Paced by the shared per-host limiter (adapts to latency and 429/5xx)
+            async with get_host_limiter().aslot(url) as slot:
+                response = await page.goto(url, timeout=60000)
+                http_status = response.status if response else None
+                slot.status = http_status
+                if response:
+                    slot.retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+            if http_status == 304 and entry:
+                print(f"Not modified since last fetch: {url}")
+                metrics.inc("cache_requests_total", cache="extraction", result="revalidated")
+                cache.touch(url)
+                return entry["content"]
+
             # Simple extraction logic (can be enhanced)
             # Try to get the main article body
-            # Adjust selector based on actual site structure. 
+            # Adjust selector based on actual site structure.
             # Often 'article' tag or specific class.
             content = await page.evaluate("""() => {
                 const article = document.querySelector('article') || document.querySelector('.news-body') || document.body;
                 return article.innerText;
             }""")
-            
+
+            if cache:
+                if cache.is_unchanged(entry, content):
+                    # Served in full although nothing changed (no or ignored validators)
+                    print(f"Content unchanged since last fetch: {url}")
+                    metrics.inc("cache_requests_total", cache="extraction", result="unchanged")
+                response_headers = response.headers if response else {}
+                status = cache.store(
+                    url,
+                    content=content,
+                    http_status=http_status,
+                    etag=response_headers.get("etag"),
+                    last_modified=response_headers.get("last-modified"),
+                )
+                if status == STATUS_DEAD:
+                    print(f"Page is gone (HTTP {http_status}): {url}")
+                    return ""
+                if status != STATUS_OK:
+                    print(f"Extraction status for {url}: {status}")
+
             return content
-            
+
         except Exception as e:
             print(f"Error extracting {url}: {e}")
+            if cache:
+                cache.store(url, content="", status=STATUS_FAILED)
             return ""
         finally:
             await browser.close()
@@ -0,0 +1,193 @@
+import os
+import time
+import sqlite3
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that never change the article served by the site
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "xtor"}
+
+STATUS_OK = "ok"
+STATUS_SHORT = "short"
+STATUS_FAILED = "failed"
+STATUS_DEAD = "dead"
+
+# HTTP statuses that mean the page is gone rather than temporarily failing
+DEAD_HTTP_STATUSES = {404, 410}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of an article URL used as the cache key.
+    Lowercases scheme/host, drops fragments, tracking parameters and
+    trailing slashes, and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted article text, keyed by normalized URL.
+
+    Each entry keeps the extracted content, its hash, the ETag/Last-Modified
+    validators returned by the site and the extraction status, so reruns can
+    reuse finished extractions, revalidate stale ones conditionally and skip
+    pages known to be dead until their TTL expires.
+    """
+
+    def __init__(self, path=None, fresh_ttl=7 * 86400, dead_ttl=86400, min_length=100):
+        self.path = path or os.getenv("EXTRACTION_CACHE_PATH", ".cache/extraction_cache.sqlite")
+        self.fresh_ttl = fresh_ttl  # Seconds an OK extraction is reused without touching the site
+        self.dead_ttl = dead_ttl    # Seconds a dead page is skipped before being retried
+        self.min_length = min_length
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                content TEXT,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                http_status INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        # Cache files written while the hash was not stored lack the column
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(extractions)")}
+        if "content_hash" not in columns:
+            self.conn.execute("ALTER TABLE extractions ADD COLUMN content_hash TEXT")
+        self.conn.commit()
+
+    def get(self, url):
+        """
+        Returns the cached entry for url as a dict, or None.
+        """
+        row = self.conn.execute(
+            "SELECT * FROM extractions WHERE url_key = ?", (normalize_url(url),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def is_fresh(self, entry, now=None):
+        """
+        True if entry can be served without contacting the site.
+        """
+        if not entry or entry["status"] != STATUS_OK:
+            return False
+        now = now or time.time()
+        return now - entry["fetched_at"] < self.fresh_ttl
+
+    def is_dead(self, entry, now=None):
+        """
+        True if entry is a dead page whose TTL has not expired yet.
+        """
+        if not entry or entry["status"] != STATUS_DEAD:
+            return False
+        now = now or time.time()
+        return now - entry["fetched_at"] < self.dead_ttl
+
+    def conditional_headers(self, entry):
+        """
+        Request headers for revalidating a previously fetched page.
+        Only sent when we still hold the content they validate.
+        """
+        headers = {}
+        if not entry or not entry.get("content"):
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def derive_status(self, content, http_status=None):
+        """
+        Extraction status of a fetch from its HTTP status and content length.
+        """
+        if http_status in DEAD_HTTP_STATUSES:
+            return STATUS_DEAD
+        if not content:
+            return STATUS_FAILED
+        if len(content.strip()) < self.min_length:
+            return STATUS_SHORT
+        return STATUS_OK
+
+    def is_unchanged(self, entry, content):
+        """
+        True if content is the same text entry already holds (a full refetch
+        that returned what a conditional request would have revalidated).
+        """
+        return bool(entry and content and entry.get("content_hash") == content_hash(content))
+
+    def store(self, url, content="", http_status=None, etag=None, last_modified=None, status=None):
+        """
+        Records the outcome of a fetch and returns the resulting status.
+        The status is derived from the HTTP status and content length when not given.
+        A failed or dead fetch keeps the previous content and validators, so a
+        later conditional request can still revalidate them.
+        """
+        if status is None:
+            status = self.derive_status(content, http_status)
+
+        previous = self.get(url)
+        attempts = (previous["attempts"] if previous else 0) + 1
+        if previous and status in (STATUS_FAILED, STATUS_DEAD):
+            self.conn.execute("""
+                UPDATE extractions SET status = ?, http_status = ?, attempts = ?, fetched_at = ?
+                WHERE url_key = ?
+            """, (status, http_status, attempts, time.time(), normalize_url(url)))
+            self.conn.commit()
+            return status
+
+        self.conn.execute("""
+            INSERT OR REPLACE INTO extractions
+                (url_key, url, status, content, content_hash, etag, last_modified, http_status, attempts, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            normalize_url(url), url, status, content or None,
+            content_hash(content) if content else None,
+            etag, last_modified, http_status, attempts, time.time(),
+        ))
+        self.conn.commit()
+        return status
+
+    def touch(self, url):
+        """
+        Marks a cached entry as revalidated (e.g. after a 304 Not Modified).
+        The status is derived again from the kept content, since the entry may
+        have been marked failed or dead by the attempts in between.
+        """
+        entry = self.get(url)
+        if not entry:
+            return None
+        status = self.derive_status(entry["content"])
+        self.conn.execute(
+            "UPDATE extractions SET status = ?, http_status = 304, fetched_at = ?, attempts = attempts + 1 WHERE url_key = ?",
+            (status, time.time(), normalize_url(url)),
+        )
+        self.conn.commit()
+        return status
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,273 @@
+"""
+Shared per-host rate limiter with AIMD adaptive concurrency.
+
+Every scraper request to a site goes through a slot of that site's
+HostLimiter (keyed by host name):
+
+    limiter = get_host_limiter()
+    async with limiter.aslot(url) as slot:      # or `with limiter.slot(url)` in sync code
+        response = await page.goto(url)
+        slot.status = response.status
+
+Each host has a concurrency window and a minimum interval between request
+starts. A 429, a 5xx, an exception or a sustained latency spike
+(SLOW_SAMPLES responses in a row slower than RATE_LIMIT_LATENCY_FACTOR x
+the host's baseline latency) halves the window, at most once per observed
+round trip; once the window is down to one request, the interval doubles
+instead. The baseline is the 10th percentile of the last LATENCY_SAMPLES
+successful responses, never the single fastest one, so one unusually fast
+reply (e.g. served from a cache) does not mark later requests as slow and
+the baseline follows the site when it gets durably slower. Fast successful responses first
+shrink the interval back to RATE_LIMIT_MIN_INTERVAL, then grow the window
+additively. A 429 or 503 also pauses the host for its Retry-After. Each
+site therefore runs as fast as it tolerates instead of at a fixed pace.
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+LATENCY_SAMPLES = 20  # Recent successful latencies the baseline is taken from
+SLOW_SAMPLES = 3      # Consecutive slow responses that count as congestion
+
+
+class HostLimiter:
+    """
+    AIMD concurrency window and request pacing for one host.
+    Thread-safe; usable from threads (slot) and from asyncio (aslot).
+    """
+
+    def __init__(self, host, initial_concurrency=None, max_concurrency=None, min_interval=None,
+                 max_interval=30.0, latency_factor=None):
+        self.host = host
+        self.max_concurrency = max_concurrency or int(os.getenv("RATE_LIMIT_MAX_CONCURRENCY", "8"))
+        self.window = float(initial_concurrency or int(os.getenv("RATE_LIMIT_INITIAL_CONCURRENCY", "2")))
+        self.min_interval = min_interval if min_interval is not None else float(os.getenv("RATE_LIMIT_MIN_INTERVAL", "0.2"))
+        self.max_interval = max_interval
+        self.latency_factor = latency_factor or float(os.getenv("RATE_LIMIT_LATENCY_FACTOR", "3"))
+
+        self.interval = self.min_interval
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.congestion_window = None  # Window at the last congestion signal
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.avg_latency = None
+        self.slow_streak = 0
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.slow = 0
+        self.peak_window = self.window
+
+    def _try_start(self):
+        """
+        Takes a slot if the window and pacing allow it.
+        Returns 0 when started, otherwise the seconds to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.paused_until - now, self.next_start - now)
+            if wait > 0:
+                return wait
+            if self.in_flight >= max(1, int(self.window)):
+                return 0.05  # Woken by polling; slots are short compared to this
+            self.in_flight += 1
+            self.requests += 1
+            self.next_start = now + self.interval
+            return 0
+
+    def acquire(self):
+        while True:
+            wait = self._try_start()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self._try_start()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def baseline_latency(self):
+        """
+        10th percentile of the recent successful latencies, skipping the
+        fastest one once there are two (None before the first response).
+        Called with the lock held.
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(1, len(ordered) // 10))]
+
+    def release(self, latency, status=None, error=False, retry_after=None):
+        """
+        Records a finished request and adapts the window and interval.
+        latency=None skips the latency signal (e.g. multi-page browsing sessions).
+        """
+        throttled = status == 429
+        server_error = status is not None and status >= 500
+        with self.lock:
+            now = time.monotonic()
+            self.in_flight -= 1
+
+            congested = throttled or server_error or error
+            if not congested and latency is not None:
+                baseline = self.baseline_latency()
+                slow = baseline is not None and latency > self.latency_factor * baseline
+                self.latencies.append(latency)
+                self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+                self.slow_streak = self.slow_streak + 1 if slow else 0
+                if self.slow_streak >= SLOW_SAMPLES:
+                    self.slow += 1
+                    self.slow_streak = 0
+                    congested = True
+
+            if throttled:
+                self.throttled += 1
+            elif server_error or error:
+                self.errors += 1
+
+            if congested:
+                # Multiplicative decrease, once per round trip so one burst is not punished repeatedly.
+                # Concurrency goes first; pacing only slows down once a single request at a time is too much.
+                if now - self.last_decrease >= (self.avg_latency or latency or 0):
+                    self.congestion_window = self.window
+                    if self.window >= 2:
+                        self.window /= 2
+                    else:
+                        self.window = 1.0
+                        self.interval = min(self.max_interval, max(self.interval * 2, 0.5))
+                    self.last_decrease = now
+                if throttled or status == 503:
+                    pause = retry_after if retry_after else self.interval * (1 + random.random())
+                    self.paused_until = max(self.paused_until, now + pause)
+            elif self.interval > self.min_interval:
+                # Recover the request rate before adding concurrency
+                self.interval = max(self.min_interval, self.interval * 0.8)
+            else:
+                # Additive increase: about +1 slot per window of successful requests,
+                # ten times slower when probing the window that last caused congestion
+                step = 1.0 / self.window
+                if self.congestion_window and self.window + 1 >= self.congestion_window:
+                    step /= 10
+                self.window = min(float(self.max_concurrency), self.window + step)
+                self.peak_window = max(self.peak_window, self.window)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "slow": self.slow,
+                "window": round(self.window, 2),
+                "peak_window": round(self.peak_window, 2),
+                "interval_s": round(self.interval, 3),
+                "avg_latency_s": round(self.avg_latency, 3) if self.avg_latency else None,
+            }
+
+
+class Slot:
+    """
+    One request under a host's limits. Set `status` (HTTP status) and, when
+    the server sent one, `retry_after` (seconds) before the block exits; an
+    exception leaving the block counts as a failed request.
+    """
+
+    def __init__(self, host_limiter, measure_latency=True):
+        self.host_limiter = host_limiter
+        self.measure_latency = measure_latency
+        self.status = None
+        self.retry_after = None
+        self.started = None
+
+    def _finish(self, exc_type):
+        self.host_limiter.release(
+            time.monotonic() - self.started if self.measure_latency else None,
+            status=self.status,
+            error=exc_type is not None,
+            retry_after=self.retry_after,
+        )
+
+    def __enter__(self):
+        self.host_limiter.acquire()
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc_type)
+        return False
+
+    async def __aenter__(self):
+        await self.host_limiter.acquire_async()
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._finish(exc_type)
+        return False
+
+
+class RateLimiter:
+    """
+    Registry of HostLimiters, one per host name.
+    """
+
+    def __init__(self, **host_options):
+        self.host_options = host_options
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def for_host(self, url_or_host):
+        host = urlsplit(url_or_host).netloc if "://" in url_or_host else url_or_host
+        host = host.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(host, **self.host_options)
+            return self.hosts[host]
+
+    def slot(self, url, measure_latency=True):
+        return Slot(self.for_host(url), measure_latency)
+
+    def aslot(self, url, measure_latency=True):
+        return Slot(self.for_host(url), measure_latency)
+
+    def stats(self):
+        return {host: limiter.stats() for host, limiter in self.hosts.items()}
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_host_limiter():
+    """
+    Process-wide RateLimiter shared by every scraper.
+    """
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+
+def parse_retry_after(value):
+    """
+    Seconds from a Retry-After header given in seconds (HTTP dates are ignored).
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
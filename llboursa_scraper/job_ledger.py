@@ -0,0 +1,242 @@
+"""
+Crash-safe ledger of backfill work.
+
+Every discovered URL is tracked through its states
+(discovered -> extracted -> analyzed -> saved) with the extracted content,
+the raw analysis, the attempt count and the last error, committed after
+each step. A restarted backfill resumes each article from its last
+completed step, and dates whose discovery finished are not rediscovered.
+It also keeps each source's high-water mark (last fully processed
+publication date) for incremental daily runs (see daily_run.py).
+
+Usage:
+    python job_ledger.py stats            # Jobs per state
+    python job_ledger.py failed           # Jobs that gave up, with their last error
+    python job_ledger.py retry            # Give failed jobs a new set of attempts
+    python job_ledger.py marks            # High-water mark per source
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+from datetime import date
+
+STATE_DISCOVERED = "discovered"
+STATE_EXTRACTED = "extracted"
+STATE_ANALYZED = "analyzed"
+STATE_SAVED = "saved"
+STATE_SKIPPED = "skipped"   # Terminal without a save (e.g. near-duplicate)
+STATE_FAILED = "failed"     # Gave up after max_attempts
+
+TERMINAL_STATES = {STATE_SAVED, STATE_SKIPPED, STATE_FAILED}
+
+
+class JobLedger:
+    """
+    SQLite ledger of per-URL backfill jobs and completed discovery dates.
+    """
+
+    def __init__(self, path=None, max_attempts=None):
+        self.path = path or os.getenv("JOB_LEDGER_PATH", ".cache/job_ledger.sqlite")
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                url TEXT PRIMARY KEY,
+                title TEXT,
+                published_date TEXT NOT NULL,
+                state TEXT NOT NULL,
+                content TEXT,
+                analysis TEXT,
+                article_id INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_date ON jobs (published_date);
+            CREATE TABLE IF NOT EXISTS discoveries (
+                published_date TEXT PRIMARY KEY,
+                articles INTEGER NOT NULL,
+                completed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS high_water_marks (
+                source TEXT PRIMARY KEY,
+                published_date TEXT NOT NULL,  -- ISO date
+                updated_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def is_discovered(self, published_date):
+        row = self.conn.execute(
+            "SELECT 1 FROM discoveries WHERE published_date = ?", (published_date,)
+        ).fetchone()
+        return row is not None
+
+    def record_discovery(self, published_date, articles, complete=True):
+        """
+        Registers discovered articles ({url, title}) as jobs; existing jobs keep their state.
+
+        complete=False records the jobs without marking the date as done
+        (e.g. today, which will have more articles later).
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (url, title, published_date, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(art['url'], art.get('title'), published_date, STATE_DISCOVERED, now) for art in articles if art.get('url')]
+            )
+            if complete:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO discoveries (published_date, articles, completed_at) VALUES (?, ?, ?)",
+                    (published_date, len(articles), now)
+                )
+
+    def jobs_for_date(self, published_date):
+        """
+        Jobs of a date as discovery-style dicts ({url, title}), in discovery order.
+        """
+        rows = self.conn.execute(
+            "SELECT url, title FROM jobs WHERE published_date = ? ORDER BY rowid", (published_date,)
+        )
+        return [{"url": row['url'], "title": row['title']} for row in rows]
+
+    def get(self, url):
+        row = self.conn.execute("SELECT * FROM jobs WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def _update(self, url, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.conn:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE url = ?", (*fields.values(), url))
+
+    def mark_extracted(self, url, content):
+        self._update(url, state=STATE_EXTRACTED, content=content, last_error=None)
+
+    def mark_analyzed(self, url, analysis):
+        self._update(url, state=STATE_ANALYZED, analysis=analysis, last_error=None)
+
+    def mark_saved(self, url, article_id=None):
+        # Content and analysis are in the database now; keep the ledger small
+        self._update(url, state=STATE_SAVED, article_id=article_id, content=None, analysis=None, last_error=None)
+
+    def mark_skipped(self, url, reason):
+        self._update(url, state=STATE_SKIPPED, content=None, last_error=reason)
+
+    def record_failure(self, url, error):
+        """
+        Counts a failed attempt at the job's next step.
+        Returns True if the job may be retried, False if it is now marked failed.
+        """
+        job = self.get(url)
+        attempts = (job['attempts'] if job else 0) + 1
+        retry = attempts < self.max_attempts
+        fields = {"attempts": attempts, "last_error": str(error)[:1000]}
+        if not retry:
+            fields["state"] = STATE_FAILED
+        self._update(url, **fields)
+        return retry
+
+    def pending_count(self, published_date):
+        """
+        Number of jobs of a date that are not finished (saved, skipped or failed).
+        """
+        placeholders = ",".join("?" * len(TERMINAL_STATES))
+        return self.conn.execute(
+            f"SELECT COUNT(*) FROM jobs WHERE published_date = ? AND state NOT IN ({placeholders})",
+            (published_date, *sorted(TERMINAL_STATES))
+        ).fetchone()[0]
+
+    def get_high_water_mark(self, source):
+        """
+        Last fully processed publication date of a source, or None.
+        """
+        row = self.conn.execute(
+            "SELECT published_date FROM high_water_marks WHERE source = ?", (source,)
+        ).fetchone()
+        return date.fromisoformat(row['published_date']) if row else None
+
+    def set_high_water_mark(self, source, published_on):
+        """
+        Advances a source's high-water mark (never moves it backwards).
+        """
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO high_water_marks (source, published_date, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    published_date = MAX(published_date, excluded.published_date),
+                    updated_at = excluded.updated_at
+                """,
+                (source, published_on.isoformat(), time.time())
+            )
+
+    def marks(self):
+        return {
+            row['source']: row['published_date']
+            for row in self.conn.execute("SELECT source, published_date FROM high_water_marks ORDER BY source")
+        }
+
+    def stats(self):
+        return {
+            row['state']: row['n']
+            for row in self.conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state")
+        }
+
+    def failed(self):
+        return [dict(row) for row in self.conn.execute(
+            "SELECT url, published_date, attempts, last_error FROM jobs WHERE state = ? ORDER BY published_date",
+            (STATE_FAILED,)
+        )]
+
+    def retry_failed(self):
+        """
+        Puts failed jobs back in the queue: extracted if their content is kept, else discovered.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                """
+                UPDATE jobs SET
+                    state = CASE WHEN content IS NULL THEN ? ELSE ? END,
+                    attempts = 0
+                WHERE state = ?
+                """,
+                (STATE_DISCOVERED, STATE_EXTRACTED, STATE_FAILED)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill job ledger")
+    parser.add_argument("command", choices=["stats", "failed", "retry", "marks"])
+    parser.add_argument("--path", help="Ledger file (default: JOB_LEDGER_PATH or .cache/job_ledger.sqlite)")
+    args = parser.parse_args()
+
+    ledger = JobLedger(args.path)
+    if args.command == "stats":
+        stats = ledger.stats()
+        for state in (STATE_DISCOVERED, STATE_EXTRACTED, STATE_ANALYZED, STATE_SAVED, STATE_SKIPPED, STATE_FAILED):
+            print(f"   {state:.<20} {stats.get(state, 0)}")
+    elif args.command == "failed":
+        for job in ledger.failed():
+            print(f"   {job['published_date']}  {job['attempts']}x  {job['url']}\n      {job['last_error']}")
+    elif args.command == "marks":
+        for source, published_date in ledger.marks().items():
+            print(f"   {source:.<20} {published_date}")
+    else:
+        print(f"🔁 {ledger.retry_failed()} failed jobs queued again")
+    ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import asyncio
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `capacity` units per minute.
+    """
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` units are available (0 if available now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        """
+        Gives back units that were reserved but not used (may be negative to charge extra).
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimitScheduler:
+    """
+    Schedules LLM requests against a deployment's RPM/TPM quotas.
+
+    Each request reserves one unit from the request bucket and its estimated
+    prompt + completion tokens from the token bucket, runs under a concurrency
+    limit, and is retried with jittered exponential backoff when the service
+    throttles (429) or fails transiently. A throttle response pauses every
+    caller until the advertised retry-after has elapsed.
+    """
+
+    def __init__(self, rpm=None, tpm=None, concurrency=None, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.rpm = rpm or int(os.getenv("AZURE_OPENAI_RPM", "60"))
+        self.tpm = tpm or int(os.getenv("AZURE_OPENAI_TPM", "60000"))
+        self.concurrency = concurrency or int(os.getenv("ANALYSIS_CONCURRENCY", "8"))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.requests = TokenBucket(self.rpm)
+        self.tokens = TokenBucket(self.tpm)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.lock = asyncio.Lock()
+        self.paused_until = 0.0
+
+        self.throttled = 0
+        self.retries = 0
+
+    async def _reserve(self, estimated_tokens):
+        async with self.lock:
+            while True:
+                delay = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                )
+                if delay <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(estimated_tokens)
+                    return
+                await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter, but never retry before the server says we may
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, retry_after) + random.uniform(0, self.base_delay)
+        return delay
+
+    async def run(self, call, estimated_tokens, is_throttle, is_retryable=None, retry_after=None):
+        """
+        Runs `call` (an async callable returning (result, actual_tokens)) under the quotas.
+
+        Args:
+            call: coroutine function performing the request
+            estimated_tokens: prompt + max completion tokens reserved up front
+            is_throttle: predicate telling whether an exception is a 429
+            is_retryable: predicate for other transient errors (timeouts, 5xx)
+            retry_after: function extracting a retry-after delay (seconds) from an exception
+        """
+        attempt = 0
+        while True:
+            await self._reserve(estimated_tokens)
+            async with self.semaphore:
+                try:
+                    result, actual_tokens = await call()
+                    if actual_tokens:
+                        self.tokens.refund(estimated_tokens - actual_tokens)
+                    return result
+                except Exception as e:
+                    throttled = is_throttle(e)
+                    if not throttled and not (is_retryable and is_retryable(e)):
+                        raise
+                    if attempt >= self.max_retries:
+                        raise
+                    hint = retry_after(e) if retry_after else None
+                    delay = self._backoff(attempt, hint)
+                    if throttled:
+                        self.throttled += 1
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                    self.retries += 1
+                    attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "concurrency": self.concurrency,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
@@ -0,0 +1,366 @@
+"""
+Embedded local storage backend.
+
+LocalDBManager implements the StorageBackend interface on a SQLite file with
+the same tables as schema.sql (articles, scores, score_history,
+ticker_sentiment_summary), so backfills, ELO replays and summary queries
+run in-process without Supabase. Articles saved locally can be pushed to
+Supabase afterwards with `sync`.
+
+Usage:
+    DB_BACKEND=local python backfill_manager.py     # Backfill into .cache/local_store.sqlite
+    DB_BACKEND=local python elo_replay.py           # Replay the local history
+    python local_store.py stats                     # Row counts and unsynced articles
+    python local_store.py sync                      # Push unsynced articles to Supabase
+"""
+
+import os
+import json
+import asyncio
+import sqlite3
+import argparse
+from db_manager import DBManager, StorageBackend, sentiment_value
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT UNIQUE NOT NULL,
+    title TEXT,
+    content TEXT,
+    published_date TEXT,
+    analysis_json TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    synced_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS scores (
+    ticker TEXT PRIMARY KEY,
+    score REAL DEFAULT 50.0,
+    last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS score_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    change REAL NOT NULL,
+    reason TEXT,
+    article_id INTEGER REFERENCES articles(id),
+    sentiment INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_score_history_ticker ON score_history (ticker, id);
+
+CREATE TABLE IF NOT EXISTS ticker_sentiment_summary (
+    ticker TEXT PRIMARY KEY,
+    mention_count INTEGER NOT NULL DEFAULT 0,
+    sentiment_sum REAL NOT NULL DEFAULT 0,
+    avg_sentiment REAL NOT NULL DEFAULT 0,
+    recent_sentiment REAL NOT NULL DEFAULT 0,
+    last_sentiment INTEGER,
+    last_article_id INTEGER,
+    last_updated TEXT
+);
+"""
+
+
+class LocalDBManager(StorageBackend):
+    """
+    Storage backend on an embedded SQLite database.
+
+    Every write is a local transaction, so the write-behind cache is not
+    used: saving an article and its ELO updates is already in-process.
+    """
+
+    def __init__(self, path=None, sector_file="tunisian_stocks_by_sector.json"):
+        self.path = path or os.getenv("LOCAL_DB_PATH", ".cache/local_store.sqlite")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        tables = {row['name'] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "stock_sentiment_summary" in tables and "ticker_sentiment_summary" not in tables:
+            # Name used before it was aligned with schema.sql
+            self.conn.execute("ALTER TABLE stock_sentiment_summary RENAME TO ticker_sentiment_summary")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._configure(write_behind=False)
+
+        # Supabase scores are seeded once by hand; a local store seeds the stock universe itself
+        if sector_file and os.path.exists(sector_file):
+            with open(sector_file, "r", encoding="utf-8") as f:
+                stocks_data = json.load(f)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO scores (ticker, score) VALUES (?, ?)",
+                    [(stock['ticker'], self.INITIAL_RATING) for stocks in stocks_data.values() for stock in stocks]
+                )
+
+    def close(self):
+        self.conn.close()
+
+    async def check_connection_and_setup(self):
+        counts = self.stats()
+        print(f"Local database ready: {self.path} ({counts['articles']} articles, {counts['scores']} scores)")
+
+    async def get_existing_urls(self, page_size=1000):
+        return {row['url'] for row in self.conn.execute("SELECT url FROM articles")}
+
+    async def find_existing_urls(self, urls, chunk_size=500):
+        candidates = sorted({url for url in urls if url})
+        existing = set()
+        for i in range(0, len(candidates), chunk_size):
+            chunk = candidates[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT url FROM articles WHERE url IN ({placeholders})", chunk)
+            existing.update(row['url'] for row in rows)
+        return existing
+
+    async def get_all_scores(self):
+        return {row['ticker']: float(row['score']) for row in self.conn.execute("SELECT ticker, score FROM scores")}
+
+    async def get_market_average(self):
+        return self._market_average()
+
+    def _market_average(self):
+        row = self.conn.execute("SELECT SUM(score) AS total, COUNT(*) AS n FROM scores").fetchone()
+        if not row['n']:
+            return self.MARKET_AVERAGE
+        return float(row['total']) / row['n']
+
+    async def initialize_scores(self, tickers):
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO scores (ticker, score) VALUES (?, ?)",
+                [(ticker, float(self.INITIAL_RATING)) for ticker in tickers]
+            )
+        if cursor.rowcount:
+            print(f"Initializing {cursor.rowcount} new tickers with ELO rating {self.INITIAL_RATING}...")
+
+    def _apply_elo(self, ticker, sentiment, reason, article_id):
+        """
+        Applies one ELO update inside the caller's transaction.
+        Returns {ticker, old, new, change, sentiment}, or None if the ticker is unknown.
+        """
+        row = self.conn.execute("SELECT score FROM scores WHERE ticker = ?", (ticker,)).fetchone()
+        if row is None:
+            return None
+
+        old = float(row['score'])
+        change = self.calculate_elo_change(old, sentiment, self._market_average())
+        self.conn.execute(
+            "UPDATE scores SET score = ?, version = version + 1, last_updated = CURRENT_TIMESTAMP WHERE ticker = ?",
+            (old + change, ticker)
+        )
+        self.conn.execute(
+            "INSERT INTO score_history (ticker, change, reason, article_id, sentiment) VALUES (?, ?, ?, ?, ?)",
+            (ticker, change, f"[Sentiment: {sentiment:+d}] {reason}", article_id, sentiment)
+        )
+        # Same running summary as the score_history trigger in schema.sql (EMA alpha = 0.3)
+        self.conn.execute(
+            """
+            INSERT INTO ticker_sentiment_summary AS summary
+                (ticker, mention_count, sentiment_sum, avg_sentiment, recent_sentiment, last_sentiment, last_article_id, last_updated)
+            VALUES (?, 1, ?, ?, 0.3 * ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (ticker) DO UPDATE SET
+                mention_count = summary.mention_count + 1,
+                sentiment_sum = summary.sentiment_sum + excluded.sentiment_sum,
+                avg_sentiment = (summary.sentiment_sum + excluded.sentiment_sum) / (summary.mention_count + 1),
+                recent_sentiment = 0.7 * summary.recent_sentiment + excluded.recent_sentiment,
+                last_sentiment = excluded.last_sentiment,
+                last_article_id = excluded.last_article_id,
+                last_updated = excluded.last_updated
+            """,
+            (ticker, sentiment, sentiment, sentiment, sentiment, article_id)
+        )
+        return {"ticker": ticker, "old": old, "new": old + change, "change": change, "sentiment": sentiment}
+
+    async def update_ticker_score(self, ticker, sentiment_delta, reason, article_id):
+        with self.conn:
+            update = self._apply_elo(ticker, sentiment_delta, reason, article_id)
+        if update is None:
+            print(f"Ticker {ticker} not found in DB. Skipping.")
+            return
+        print(f"      > ELO Update: {ticker} | Sentiment: {sentiment_delta:+d} | "
+              f"Rating: {update['old']:.1f} → {update['new']:.1f} ({update['change']:+.1f})")
+
+    async def save_article_with_impacts(self, url, title, content, published_date, impacts):
+        """
+        Saves the article and applies its ticker impacts in one local transaction.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO articles (url, title, content, published_date, analysis_json) VALUES (?, ?, ?, ?, ?)",
+                (url, title, content, published_date, json.dumps({"impacts": impacts}))
+            )
+            if not cursor.rowcount:
+                print(f"Article already saved: {url}")
+                return None
+            article_id = cursor.lastrowid
+
+            updates = []
+            for impact in impacts:
+                sentiment = sentiment_value(impact.get("sentiment_score"))
+                if impact.get("type") != "ticker" or sentiment is None:
+                    continue
+                update = self._apply_elo(impact["target"], sentiment, impact.get("reasoning", ""), article_id)
+                if update:
+                    updates.append(update)
+
+        for update in updates:
+            print(f"      > ELO Update: {update['ticker']} | Sentiment: {update['sentiment']:+d} | "
+                  f"Rating: {update['old']:.1f} → {update['new']:.1f} ({update['change']:+.1f})")
+        self.saved_articles[url] = article_id
+        return article_id
+
+    async def save_articles_bulk(self, articles, chunk_size=50):
+        """
+        Saves many articles in order; returns {url: article_id or None}
+        (a repeated URL keeps the id of its first copy).
+        """
+        results = {}
+        for article in articles:
+            article_id = await self.save_article_with_impacts(
+                article["url"], article["title"], article["content"],
+                article["published_date"], article["impacts"]
+            )
+            results.setdefault(article["url"], article_id)
+        return results
+
+    async def flush_scores(self, max_attempts=3):
+        return True  # Nothing is buffered locally
+
+    async def get_stock_sentiment_summary(self, limit=None):
+        sql = ("SELECT ticker, mention_count, avg_sentiment, recent_sentiment, last_sentiment, last_updated "
+               "FROM ticker_sentiment_summary ORDER BY mention_count DESC")
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return {
+            row['ticker']: {
+                "mention_count": row['mention_count'],
+                "avg_sentiment": float(row['avg_sentiment']),
+                "recent_sentiment": float(row['recent_sentiment']),
+                "last_sentiment": row['last_sentiment'],
+                "last_updated": row['last_updated'],
+            }
+            for row in self.conn.execute(sql, params)
+        }
+
+    async def get_score_history(self, page_size=1000):
+        return [
+            dict(row) for row in
+            self.conn.execute("SELECT id, ticker, sentiment, reason FROM score_history ORDER BY id")
+        ]
+
+    async def bulk_upsert_scores(self, scores, chunk_size=500):
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO scores (ticker, score) VALUES (:ticker, :score)
+                ON CONFLICT (ticker) DO UPDATE SET
+                    score = excluded.score, version = version + 1, last_updated = CURRENT_TIMESTAMP
+                """,
+                scores
+            )
+        print(f"Upserted {len(scores)} scores.")
+
+    async def bulk_update_history_changes(self, rows, chunk_size=500):
+        with self.conn:
+            self.conn.executemany("UPDATE score_history SET change = :change WHERE id = :id", rows)
+        print(f"Updated {len(rows)} score history rows.")
+
+    def stats(self):
+        def count(sql):
+            return self.conn.execute(sql).fetchone()[0]
+        return {
+            "articles": count("SELECT COUNT(*) FROM articles"),
+            "unsynced": count("SELECT COUNT(*) FROM articles WHERE synced_at IS NULL"),
+            "scores": count("SELECT COUNT(*) FROM scores"),
+            "history": count("SELECT COUNT(*) FROM score_history"),
+        }
+
+
+async def sync_to_supabase(local, remote):
+    """
+    Pushes locally saved articles that were never synced to Supabase, oldest first.
+
+    Each article is saved with its stored impacts through the remote
+    `save_article_with_impacts`, so the remote ELO updates are computed on
+    the remote scores (local ratings are not copied over). Articles whose
+    URL already exists remotely are only marked as synced. Rows are marked
+    synced only once the remote flush succeeded (a write-behind remote
+    writes queued articles at flush time); a failed flush raises and
+    leaves every row of this run to the next sync.
+
+    Returns:
+        dict: {"pushed": n, "already_remote": n, "failed": n}
+    """
+    rows = local.conn.execute(
+        "SELECT id, url, title, content, published_date, analysis_json FROM articles "
+        "WHERE synced_at IS NULL ORDER BY id"
+    ).fetchall()
+    stats = {"pushed": 0, "already_remote": 0, "failed": 0}
+    if not rows:
+        return stats
+
+    await remote.initialize_scores(list((await local.get_all_scores()).keys()))
+    existing = await remote.find_existing_urls(row['url'] for row in rows)
+
+    synced_ids = []
+    for row in rows:
+        if row['url'] in existing:
+            stats["already_remote"] += 1
+        else:
+            impacts = json.loads(row['analysis_json'] or "{}").get("impacts", [])
+            article_id = await remote.save_article_with_impacts(
+                url=row['url'],
+                title=row['title'],
+                content=row['content'],
+                published_date=row['published_date'],
+                impacts=impacts
+            )
+            if article_id is None:
+                stats["failed"] += 1
+                continue  # Retried on the next sync
+            stats["pushed"] += 1
+        synced_ids.append(row['id'])
+
+    if not await remote.flush_scores():
+        raise RuntimeError("Remote score flush failed: no article was marked as synced")
+    with local.conn:
+        local.conn.executemany(
+            "UPDATE articles SET synced_at = CURRENT_TIMESTAMP WHERE id = ?", [(row_id,) for row_id in synced_ids]
+        )
+    return stats
+
+
+async def _main(args):
+    local = LocalDBManager(args.path)
+    try:
+        if args.command == "stats":
+            for name, value in local.stats().items():
+                print(f"   {name:.<20} {value}")
+            return
+
+        remote = DBManager()
+        await remote.check_connection_and_setup()
+        print(f"🔄 Syncing {local.stats()['unsynced']} local articles to Supabase...")
+        stats = await sync_to_supabase(local, remote)
+        print(f"✅ Pushed {stats['pushed']}, already remote {stats['already_remote']}, failed {stats['failed']}")
+    finally:
+        local.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded local storage backend")
+    parser.add_argument("command", choices=["stats", "sync"])
+    parser.add_argument("--path", help="SQLite file (default: LOCAL_DB_PATH or .cache/local_store.sqlite)")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Metrics registry for the news pipelines.
+
+Counters and latency histograms with labels, plus LLM token and cost
+totals per deployment, shared by the whole process (see get_metrics()).
+At the end of a run the registry is written as Prometheus text (e.g. for
+node_exporter's textfile collector) or as a JSON snapshot:
+
+    metrics = get_metrics()
+    with metrics.timer("stage_seconds", stage="extraction"):
+        content = await extraction_run(url)
+    metrics.inc("articles_total", result="saved")
+    metrics.write("run.prom")      # or run.json
+
+LLM prices are read from LLM_PRICES, a JSON object of USD per million
+tokens per deployment, e.g.
+    {"gpt-5.2": {"input": 1.25, "cached_input": 0.125, "output": 10.0}}
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+PREFIX = "news_pipeline_"
+
+# Seconds; covers cached lookups up to multi-minute browser sessions
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    "stage_seconds": "Duration of a pipeline stage for one item",
+    "articles_total": "Articles by outcome",
+    "pages_total": "Listing pages by outcome",
+    "dates_failed_total": "Backfill dates that broke off with an error",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "llm_requests_total": "LLM API calls",
+    "llm_request_seconds": "LLM API call latency",
+    "llm_tokens_total": "LLM tokens by kind (prompt, cached, completion)",
+    "llm_cost_usd_total": "Estimated LLM cost in USD",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (None when empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe labelled counters and histograms.
+    """
+
+    def __init__(self, prices=None):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.prices = prices if prices is not None else json.loads(os.getenv("LLM_PRICES", "{}") or "{}")
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Observes the duration of the block (also when it raises).
+        Works around `await` calls too: `with metrics.timer(...): await ...`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_llm_call(self, deployment, latency, prompt_tokens, cached_tokens, completion_tokens):
+        """
+        Counts one LLM call's latency, tokens and estimated cost.
+        Cached prompt tokens are billed at the cached rate when it is configured.
+        """
+        deployment = deployment or "unknown"
+        self.inc("llm_requests_total", deployment=deployment)
+        self.observe("llm_request_seconds", latency, deployment=deployment)
+        self.inc("llm_tokens_total", prompt_tokens, deployment=deployment, kind="prompt")
+        self.inc("llm_tokens_total", cached_tokens, deployment=deployment, kind="cached")
+        self.inc("llm_tokens_total", completion_tokens, deployment=deployment, kind="completion")
+
+        price = self.prices.get(deployment)
+        if price:
+            cached_rate = price.get("cached_input", price.get("input", 0))
+            cost = (
+                (prompt_tokens - cached_tokens) * price.get("input", 0)
+                + cached_tokens * cached_rate
+                + completion_tokens * price.get("output", 0)
+            ) / 1_000_000
+            self.inc("llm_cost_usd_total", cost, deployment=deployment)
+
+    def total(self, name):
+        """
+        Sum of a counter over all its label sets.
+        """
+        with self.lock:
+            return sum(value for (series_name, _), value in self.counters.items() if series_name == name)
+
+    def snapshot(self):
+        with self.lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.sum,
+                    "avg": h.sum / h.count if h.count else None,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "buckets": {_format_number(b): n for b, n in zip(h.buckets + (float("inf"),), h.counts)},
+                }
+                for (name, labels), h in sorted(self.histograms.items())
+            ]
+        return {
+            "started_at": self.started,
+            "duration_s": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for metric_type, series in (("counter", self.counters), ("histogram", self.histograms)):
+                names = sorted({name for name, _ in series})
+                for name in names:
+                    full_name = PREFIX + name
+                    if name in HELP:
+                        lines.append(f"# HELP {full_name} {HELP[name]}")
+                    lines.append(f"# TYPE {full_name} {metric_type}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name != name:
+                            continue
+                        if metric_type == "counter":
+                            lines.append(f"{full_name}{_format_labels(labels)} {_format_number(value)}")
+                            continue
+                        cumulative = 0
+                        for bound, n in zip(value.buckets + (float("inf"),), value.counts):
+                            cumulative += n
+                            le = _format_labels(labels, {"le": _format_number(bound)})
+                            lines.append(f"{full_name}_bucket{le} {cumulative}")
+                        lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_number(value.sum)}")
+                        lines.append(f"{full_name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Writes a JSON snapshot (.json) or Prometheus text (any other extension).
+        The file is replaced atomically so a collector never reads half of it.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_prometheus()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def print_summary(self):
+        """
+        One line per stage histogram: count, average and p95.
+        """
+        for item in self.snapshot()["histograms"]:
+            labels = ", ".join(f"{k}={v}" for k, v in item["labels"].items())
+            print(f"   {item['name']} [{labels}]: {item['count']} x avg {item['avg']:.2f}s, p95 ≤ {_format_number(item['p95'])}s")
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Process-wide MetricsRegistry.
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = MetricsRegistry()
+        return _default_registry
@@ -0,0 +1,48 @@
+-- Typed publication dates and indexes for the dashboard queries.
+-- Run after schema.sql (Supabase SQL Editor or psql); safe to re-run.
+
+-- DD/MM/YYYY text -> DATE (NULL for anything else). Declared IMMUTABLE so it
+-- can back a generated column: it only depends on its argument.
+CREATE OR REPLACE FUNCTION parse_ddmmyyyy(p_text TEXT) RETURNS DATE
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+    IF p_text !~ '^\s*[0-9]{1,2}/[0-9]{1,2}/[0-9]{4}\s*$' THEN
+        RETURN NULL;
+    END IF;
+    RETURN make_date(
+        split_part(trim(p_text), '/', 3)::INTEGER,
+        split_part(trim(p_text), '/', 2)::INTEGER,
+        split_part(trim(p_text), '/', 1)::INTEGER
+    );
+EXCEPTION WHEN others THEN
+    RETURN NULL;  -- e.g. 31/02/2026
+END;
+$$;
+
+-- Real DATE column, computed from published_date on insert/update and
+-- backfilled for existing rows when the column is added. Writers keep
+-- sending DD/MM/YYYY text.
+ALTER TABLE articles
+    ADD COLUMN IF NOT EXISTS published_on DATE
+    GENERATED ALWAYS AS (parse_ddmmyyyy(published_date)) STORED;
+
+-- url is already indexed by its UNIQUE constraint
+DROP INDEX IF EXISTS idx_articles_url;
+
+-- Articles by publication date (range scans, newest first)
+CREATE INDEX IF NOT EXISTS idx_articles_published_on ON articles (published_on DESC, id DESC);
+
+-- Score history of one ticker over time
+CREATE INDEX IF NOT EXISTS idx_score_history_ticker_created_at ON score_history (ticker, created_at DESC);
+
+-- History is append-only, so created_at follows the physical order: a BRIN
+-- index answers time-window scans over the whole table for a few KB
+CREATE INDEX IF NOT EXISTS idx_score_history_created_at_brin ON score_history USING BRIN (created_at);
+
+-- Joins from articles to their score changes
+CREATE INDEX IF NOT EXISTS idx_score_history_article_id ON score_history (article_id);
+
+ANALYZE articles;
+ANALYZE score_history;
@@ -0,0 +1,209 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import unicodedata
+from collections import Counter
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Bands of the signature used as exact-match buckets; with 4 bands of 16 bits,
+# two signatures within 3 differing bits always share at least one band
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Largest distance the bands can find: 4 differing bits may fall one in each band
+MAX_DISTANCE = BANDS - 1
+
+
+def _shingles(text: str):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    words = re.findall(r"\w+", text)
+    if len(words) < SHINGLE_SIZE:
+        return Counter([" ".join(words)]) if words else Counter()
+    return Counter(" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of the text's word 3-shingles (accent/case/punctuation-insensitive).
+    Near-identical texts get signatures that differ in only a few bits.
+    """
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in _shingles(text).items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _to_sqlite(signature):
+    # SQLite integers are signed 64-bit
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+
+def _from_sqlite(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """
+    SimHash index of article texts, used to analyze each story only once.
+
+    The same press release is republished by ilboursa, bvmt.com.tn and
+    Google News under different URLs with slightly different chrome. Every
+    registered article is clustered with the first copy seen within
+    `max_distance` bits (its canonical copy); only canonical copies should be
+    sent for analysis. Signatures are persisted in SQLite and kept in memory,
+    bucketed by band, so a lookup touches only a handful of candidates.
+
+    Articles added as pending are only indexed in memory until `confirm`
+    (e.g. once the canonical copy is saved); `discard` forgets them, so a
+    copy whose save failed does not hide the story from later runs.
+    """
+
+    def __init__(self, path=None, max_distance=None, min_shingles=20):
+        self.path = path or os.getenv("NEAR_DUPLICATE_INDEX_PATH", ".cache/near_duplicates.sqlite")
+        self.max_distance = max_distance if max_distance is not None else int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "3"))
+        if not 0 <= self.max_distance <= MAX_DISTANCE:
+            # A larger distance would silently miss copies whose differing bits hit every band
+            raise ValueError(f"NEAR_DUPLICATE_MAX_DISTANCE must be between 0 and {MAX_DISTANCE} "
+                             f"with {BANDS} bands, got {self.max_distance}")
+        self.min_shingles = min_shingles  # Shorter texts are too small to fingerprint reliably
+        self.duplicates_found = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                simhash INTEGER NOT NULL,
+                canonical_url TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self.canonical = {}   # url -> canonical url
+        self.signatures = {}  # canonical url -> signature
+        self.buckets = [{} for _ in range(BANDS)]  # band value -> [canonical urls]
+        self.pending = {}     # url -> (source, signature), indexed but not persisted yet
+        for url, signature, canonical_url in self.conn.execute(
+            "SELECT url, simhash, canonical_url FROM signatures ORDER BY created_at"
+        ):
+            self.canonical[url] = canonical_url
+            if url == canonical_url:
+                self._index(url, _from_sqlite(signature))
+
+    def _bands(self, signature):
+        return [(signature >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+    def _index(self, url, signature):
+        self.signatures[url] = signature
+        for band, value in enumerate(self._bands(signature)):
+            self.buckets[band].setdefault(value, []).append(url)
+
+    def find(self, signature):
+        """
+        Returns the closest canonical URL within max_distance bits, or None.
+        """
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band, value in enumerate(self._bands(signature)):
+            for url in self.buckets[band].get(value, ()):
+                if url in seen:
+                    continue
+                seen.add(url)
+                distance = hamming(signature, self.signatures[url])
+                if distance < best_distance:
+                    best, best_distance = url, distance
+        return best
+
+    def add(self, url, text, source=None, pending=False):
+        """
+        Registers an article and returns the URL of its canonical copy
+        (the article's own URL if it is the first copy of the story).
+        With pending=True it is persisted only by confirm(url).
+        """
+        if url in self.canonical:
+            return self.canonical[url]
+        if len(_shingles(text)) < self.min_shingles:
+            return url
+
+        signature = simhash(text)
+        canonical_url = self.find(signature) or url
+        if canonical_url == url:
+            self._index(url, signature)
+        else:
+            self.duplicates_found += 1
+        self.canonical[url] = canonical_url
+        if pending:
+            self.pending[url] = (source, signature)
+        else:
+            self._persist(url, source, signature, canonical_url)
+        return canonical_url
+
+    def _persist(self, url, source, signature, canonical_url):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO signatures (url, source, simhash, canonical_url, created_at) VALUES (?, ?, ?, ?, ?)",
+            (url, source, _to_sqlite(signature), canonical_url, time.time()),
+        )
+        self.conn.commit()
+
+    def is_pending(self, url):
+        return url in self.pending
+
+    def confirm(self, url):
+        """
+        Persists a pending article (no-op for articles already persisted or never added).
+        """
+        entry = self.pending.pop(url, None)
+        if entry:
+            self._persist(url, *entry, self.canonical[url])
+
+    def discard(self, url):
+        """
+        Forgets a pending article, and the pending copies clustered with it
+        if it was their canonical copy.
+        """
+        if url not in self.pending:
+            return
+        del self.pending[url]
+        canonical_url = self.canonical.pop(url)
+        if canonical_url != url:
+            return
+        signature = self.signatures.pop(url)
+        for band, value in enumerate(self._bands(signature)):
+            self.buckets[band][value].remove(url)
+        for other in [u for u, c in self.canonical.items() if c == url]:
+            self.discard(other)
+
+    def cluster(self, url):
+        """
+        All registered URLs sharing url's canonical copy.
+        """
+        canonical_url = self.canonical.get(url, url)
+        return [u for u, c in self.canonical.items() if c == canonical_url]
+
+    def stats(self):
+        return {
+            "articles": len(self.canonical),
+            "stories": len(self.signatures),
+            "duplicates_found": self.duplicates_found,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -16,6 +16,25 @@ CREATE TABLE IF NOT EXISTS scores (
     last_updated TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Row version, bumped on every score change (optimistic concurrency for cached writers)
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_score_version() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.score IS DISTINCT FROM OLD.score THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS scores_bump_version ON scores;
+CREATE TRIGGER scores_bump_version
+BEFORE UPDATE ON scores
+FOR EACH ROW EXECUTE FUNCTION bump_score_version();
+
 -- Create Score History Table
 CREATE TABLE IF NOT EXISTS score_history (
     id SERIAL PRIMARY KEY,
@@ -26,5 +45,347 @@ CREATE TABLE IF NOT EXISTS score_history (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Index for faster lookups
-CREATE INDEX IF NOT EXISTS idx_articles_url ON articles(url);
+-- Sentiment (-5..+5) behind each change; older rows only had it in the reason text
+ALTER TABLE score_history ADD COLUMN IF NOT EXISTS sentiment INTEGER;
+UPDATE score_history
+SET sentiment = substring(reason FROM '^\[Sentiment: ([+-]?[0-9]+)\]')::INTEGER
+WHERE sentiment IS NULL AND reason ~ '^\[Sentiment: [+-]?[0-9]+\]';
+
+-- url is indexed by its UNIQUE constraint; date/history indexes are in migrations/
+
+
+-- Earlier versions named this table stock_sentiment_summary, which is the
+-- dashboard's per-stock summary of sentiment_analyses (supabase/migrations).
+-- Drop only the scraper's version (keyed by ticker); it is rebuilt below.
+DROP TRIGGER IF EXISTS score_history_sentiment_summary ON score_history;
+DROP FUNCTION IF EXISTS refresh_stock_sentiment_summary();
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'stock_sentiment_summary' AND column_name = 'ticker') THEN
+        DROP TABLE stock_sentiment_summary;
+    END IF;
+END;
+$$;
+
+-- Per-ticker sentiment summary (mention count, average and recent sentiment).
+-- recent_sentiment is an exponential moving average (alpha = 0.3) starting
+-- from neutral, so it can be updated from new rows only. The table is
+-- refreshed by a statement-level trigger, i.e. once per inserted batch of
+-- score_history rows, and rebuilt from scratch whenever schema.sql is re-run.
+CREATE TABLE IF NOT EXISTS ticker_sentiment_summary (
+    ticker TEXT PRIMARY KEY,
+    mention_count INTEGER NOT NULL DEFAULT 0,
+    sentiment_sum NUMERIC NOT NULL DEFAULT 0,
+    avg_sentiment NUMERIC NOT NULL DEFAULT 0,
+    recent_sentiment NUMERIC NOT NULL DEFAULT 0,
+    last_sentiment INTEGER,
+    last_article_id INTEGER,
+    last_updated TIMESTAMP WITH TIME ZONE
+);
+
+TRUNCATE ticker_sentiment_summary;
+INSERT INTO ticker_sentiment_summary
+    (ticker, mention_count, sentiment_sum, avg_sentiment, recent_sentiment, last_sentiment, last_article_id, last_updated)
+SELECT
+    ticker,
+    COUNT(*),
+    SUM(sentiment),
+    AVG(sentiment),
+    SUM(0.3 * power(0.7, age) * sentiment),
+    MAX(sentiment) FILTER (WHERE age = 0),
+    MAX(article_id) FILTER (WHERE age = 0),
+    MAX(created_at)
+FROM (
+    SELECT ticker, sentiment, article_id, created_at,
+           ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY id DESC) - 1 AS age
+    FROM score_history
+    WHERE sentiment IS NOT NULL
+) ranked
+GROUP BY ticker;
+
+CREATE OR REPLACE FUNCTION refresh_ticker_sentiment_summary() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO ticker_sentiment_summary AS summary
+        (ticker, mention_count, sentiment_sum, avg_sentiment, recent_sentiment, last_sentiment, last_article_id, last_updated)
+    SELECT
+        ticker,
+        COUNT(*),
+        SUM(sentiment),
+        AVG(sentiment),
+        SUM(0.3 * power(0.7, age) * sentiment),
+        MAX(sentiment) FILTER (WHERE age = 0),
+        MAX(article_id) FILTER (WHERE age = 0),
+        MAX(created_at)
+    FROM (
+        SELECT ticker, sentiment, article_id, created_at,
+               ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY id DESC) - 1 AS age
+        FROM new_rows
+        WHERE sentiment IS NOT NULL
+    ) ranked
+    GROUP BY ticker
+    ON CONFLICT (ticker) DO UPDATE SET
+        mention_count = summary.mention_count + EXCLUDED.mention_count,
+        sentiment_sum = summary.sentiment_sum + EXCLUDED.sentiment_sum,
+        avg_sentiment = (summary.sentiment_sum + EXCLUDED.sentiment_sum) / (summary.mention_count + EXCLUDED.mention_count),
+        -- Older contributions decay once per new mention
+        recent_sentiment = power(0.7, EXCLUDED.mention_count) * summary.recent_sentiment + EXCLUDED.recent_sentiment,
+        last_sentiment = EXCLUDED.last_sentiment,
+        last_article_id = EXCLUDED.last_article_id,
+        last_updated = GREATEST(summary.last_updated, EXCLUDED.last_updated);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER score_history_sentiment_summary
+AFTER INSERT ON score_history
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_ticker_sentiment_summary();
+
+
+-- Running sum/count of all scores, so the market average is an O(1) read.
+-- Kept in sync by a trigger on scores; the INSERT below (re)builds it from
+-- the current table and is safe to re-run.
+CREATE TABLE IF NOT EXISTS market_stats (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    score_sum NUMERIC NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO market_stats (id, score_sum, score_count)
+SELECT 1, COALESCE(SUM(score), 0), COUNT(*) FROM scores
+ON CONFLICT (id) DO UPDATE
+SET score_sum = EXCLUDED.score_sum, score_count = EXCLUDED.score_count, last_updated = NOW();
+
+CREATE OR REPLACE FUNCTION maintain_market_stats() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE market_stats SET score_sum = score_sum + COALESCE(NEW.score, 0), score_count = score_count + 1, last_updated = NOW() WHERE id = 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE market_stats SET score_sum = score_sum - COALESCE(OLD.score, 0), score_count = score_count - 1, last_updated = NOW() WHERE id = 1;
+    ELSIF NEW.score IS DISTINCT FROM OLD.score THEN
+        UPDATE market_stats SET score_sum = score_sum + COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0), last_updated = NOW() WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS scores_market_stats ON scores;
+CREATE TRIGGER scores_market_stats
+AFTER INSERT OR UPDATE OF score OR DELETE ON scores
+FOR EACH ROW EXECUTE FUNCTION maintain_market_stats();
+
+
+-- Save an article and apply its ticker impacts in a single transaction.
+-- Mirrors DBManager.calculate_elo_change: every ticker impact is a "match"
+-- against the current market average, applied in order (so a ticker hit
+-- twice sees its first update). Sentiments are rounded to integers (chunk
+-- merges can produce 2.5); impacts without a numeric score are skipped,
+-- like sentiment_value() does in Python. The score_history rows are inserted in one
+-- statement after the loop, so the summary trigger runs once per article.
+-- Returns NULL if the URL already exists,
+-- otherwise {"article_id": ..., "updates": [{ticker, old, new, change, sentiment}]}.
+CREATE OR REPLACE FUNCTION save_article_with_impacts(
+    p_url TEXT,
+    p_title TEXT,
+    p_content TEXT,
+    p_published_date TEXT,
+    p_impacts JSONB,
+    p_k_factor NUMERIC DEFAULT 32,
+    p_default_average NUMERIC DEFAULT 1500
+) RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_article_id INTEGER;
+    v_impact JSONB;
+    v_ticker TEXT;
+    v_score NUMERIC;
+    v_sentiment INTEGER;
+    v_rating NUMERIC;
+    v_market_avg NUMERIC;
+    v_expected NUMERIC;
+    v_change NUMERIC;
+    v_updates JSONB := '[]'::JSONB;
+    v_history JSONB := '[]'::JSONB;
+BEGIN
+    INSERT INTO articles (url, title, content, published_date, analysis_json)
+    VALUES (p_url, p_title, p_content, p_published_date, jsonb_build_object('impacts', p_impacts))
+    ON CONFLICT (url) DO NOTHING
+    RETURNING id INTO v_article_id;
+
+    IF v_article_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    FOR v_impact IN SELECT * FROM jsonb_array_elements(p_impacts)
+    LOOP
+        CONTINUE WHEN v_impact->>'type' IS DISTINCT FROM 'ticker';
+        v_ticker := v_impact->>'target';
+        -- A missing or non-numeric score ("positive", "") skips the impact
+        -- instead of aborting the whole transaction on the cast
+        v_score := CASE
+            WHEN trim(v_impact->>'sentiment_score') ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]{1,3})?$'
+            THEN round(trim(v_impact->>'sentiment_score')::NUMERIC)
+        END;
+        CONTINUE WHEN v_score IS NULL OR abs(v_score) > 2147483647;
+        v_sentiment := v_score::INTEGER;
+
+        SELECT score INTO v_rating FROM scores WHERE ticker = v_ticker FOR UPDATE;
+        CONTINUE WHEN NOT FOUND;
+
+        SELECT CASE WHEN score_count > 0 THEN score_sum / score_count ELSE p_default_average END
+        INTO v_market_avg FROM market_stats WHERE id = 1;
+        v_market_avg := COALESCE(v_market_avg, p_default_average);
+
+        v_expected := 1 / (1 + power(10, (v_market_avg - v_rating) / 400));
+        v_change := p_k_factor * ((v_sentiment + 5) / 10.0 - v_expected);
+
+        UPDATE scores SET score = v_rating + v_change, last_updated = NOW() WHERE ticker = v_ticker;
+
+        v_history := v_history || jsonb_build_object(
+            'ticker', v_ticker,
+            'change', v_change,
+            'reason', format('[Sentiment: %s%s] %s', CASE WHEN v_sentiment >= 0 THEN '+' ELSE '' END, v_sentiment, COALESCE(v_impact->>'reasoning', '')),
+            'sentiment', v_sentiment
+        );
+
+        v_updates := v_updates || jsonb_build_object(
+            'ticker', v_ticker,
+            'old', v_rating,
+            'new', v_rating + v_change,
+            'change', v_change,
+            'sentiment', v_sentiment
+        );
+    END LOOP;
+
+    INSERT INTO score_history (ticker, change, reason, article_id, sentiment)
+    SELECT h->>'ticker', (h->>'change')::NUMERIC, h->>'reason', v_article_id, (h->>'sentiment')::INTEGER
+    FROM jsonb_array_elements(v_history) h;
+
+    RETURN jsonb_build_object('article_id', v_article_id, 'updates', v_updates);
+END;
+$$;
+
+
+-- Bulk variant for batch ingestion: saves every article of p_articles
+-- ([{url, title, content, published_date, impacts}]) in order, each through
+-- save_article_with_impacts, in one request and one transaction.
+-- Returns {url: article_id}, with NULL for URLs that were already stored
+-- (a URL repeated in p_articles keeps the id of its first copy).
+CREATE OR REPLACE FUNCTION save_articles_with_impacts(
+    p_articles JSONB,
+    p_k_factor NUMERIC DEFAULT 32,
+    p_default_average NUMERIC DEFAULT 1500
+) RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_article JSONB;
+    v_result JSONB;
+    v_ids JSONB := '{}'::JSONB;
+BEGIN
+    FOR v_article IN SELECT * FROM jsonb_array_elements(p_articles)
+    LOOP
+        v_result := save_article_with_impacts(
+            v_article->>'url',
+            v_article->>'title',
+            v_article->>'content',
+            v_article->>'published_date',
+            COALESCE(v_article->'impacts', '[]'::JSONB),
+            p_k_factor,
+            p_default_average
+        );
+        v_ids := jsonb_build_object(v_article->>'url', v_result->'article_id') || v_ids;
+    END LOOP;
+    RETURN v_ids;
+END;
+$$;
+
+
+-- Write-behind flush from DBManager's score cache.
+-- p_scores: [{ticker, score, version}] where version is the row version the
+-- new score was computed from; p_history: [{ticker, change, reason, article_id,
+-- article_url, sentiment}]; p_articles: [{url, title, content, published_date,
+-- analysis_json}] queued with their history rows, which reference them by
+-- article_url. Articles, scores and history are written in one transaction.
+-- If any row changed since (version mismatch or deleted), nothing is written
+-- and the current rows are returned as conflicts so the client can rebase;
+-- if a queued article URL already exists, nothing is written and the URLs
+-- are returned as duplicates.
+DROP FUNCTION IF EXISTS apply_score_batch(JSONB, JSONB);
+CREATE OR REPLACE FUNCTION apply_score_batch(
+    p_scores JSONB,
+    p_history JSONB,
+    p_articles JSONB DEFAULT '[]'::JSONB
+) RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row JSONB;
+    v_score NUMERIC;
+    v_version INTEGER;
+    v_conflicts JSONB := '[]'::JSONB;
+    v_duplicates JSONB;
+    v_article_ids JSONB;
+BEGIN
+    FOR v_row IN SELECT * FROM jsonb_array_elements(p_scores) ORDER BY value->>'ticker'
+    LOOP
+        SELECT score, version INTO v_score, v_version FROM scores WHERE ticker = v_row->>'ticker' FOR UPDATE;
+        IF NOT FOUND OR v_version <> (v_row->>'version')::INTEGER THEN
+            v_conflicts := v_conflicts || jsonb_build_object(
+                'ticker', v_row->>'ticker',
+                'score', v_score,
+                'version', v_version
+            );
+        END IF;
+    END LOOP;
+
+    IF jsonb_array_length(v_conflicts) > 0 THEN
+        RETURN jsonb_build_object('conflicts', v_conflicts);
+    END IF;
+
+    SELECT COALESCE(jsonb_agg(a.url), '[]'::JSONB) INTO v_duplicates
+    FROM articles a
+    JOIN jsonb_array_elements(p_articles) n ON a.url = n->>'url';
+
+    IF jsonb_array_length(v_duplicates) > 0 THEN
+        RETURN jsonb_build_object('conflicts', '[]'::JSONB, 'duplicates', v_duplicates);
+    END IF;
+
+    WITH inserted AS (
+        INSERT INTO articles (url, title, content, published_date, analysis_json)
+        SELECT n->>'url', n->>'title', n->>'content', n->>'published_date', n->'analysis_json'
+        FROM jsonb_array_elements(p_articles) n
+        RETURNING id, url
+    )
+    SELECT COALESCE(jsonb_object_agg(url, id), '{}'::JSONB) INTO v_article_ids FROM inserted;
+
+    UPDATE scores s
+    SET score = (u->>'score')::NUMERIC, last_updated = NOW()
+    FROM jsonb_array_elements(p_scores) u
+    WHERE s.ticker = u->>'ticker';
+
+    INSERT INTO score_history (ticker, change, reason, article_id, sentiment)
+    SELECT
+        h->>'ticker',
+        (h->>'change')::NUMERIC,
+        h->>'reason',
+        COALESCE((h->>'article_id')::INTEGER, (v_article_ids->>(h->>'article_url'))::INTEGER),
+        (h->>'sentiment')::INTEGER
+    FROM jsonb_array_elements(p_history) h;
+
+    RETURN jsonb_build_object(
+        'conflicts', '[]'::JSONB,
+        'duplicates', '[]'::JSONB,
+        'scores', jsonb_array_length(p_scores),
+        'history', jsonb_array_length(p_history),
+        'article_ids', v_article_ids
+    );
+END;
+$$;
@@ -0,0 +1,164 @@
+import os
+import time
+
+
+class ScoreCache:
+    """
+    In-process copy of the 'scores' table with write-behind changes.
+
+    Ratings are loaded once with their row version; ELO updates are applied
+    locally and queued (new score per ticker + history rows) until
+    `should_flush()` says a batch is due. Articles are queued with them
+    (`add_article`), so an article and its score changes are written by the
+    same flush or not at all; their history rows reference the article by
+    URL until the database assigns its id. Each flushed score carries the
+    version it was based on, so the database can reject it if another
+    writer changed the row in the meantime (see `rebase`).
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None):
+        self.flush_size = flush_size or int(os.getenv("SCORE_FLUSH_SIZE", "200"))
+        self.flush_interval = flush_interval or float(os.getenv("SCORE_FLUSH_INTERVAL", "5"))
+
+        self.scores = {}    # ticker -> current local rating
+        self.base = {}      # ticker -> rating last read from / written to the database
+        self.versions = {}  # ticker -> row version the local rating is based on
+        self.total = 0.0
+        self.dirty = set()
+        self.history = []
+        self.articles = []  # article rows waiting for the flush that writes their history
+        self.last_flush = time.monotonic()
+
+    def load(self, rows):
+        """
+        Replaces the cache with rows of {ticker, score, version}.
+        """
+        self.scores = {row['ticker']: float(row['score']) for row in rows}
+        self.base = dict(self.scores)
+        self.versions = {row['ticker']: int(row.get('version') or 0) for row in rows}
+        self.total = sum(self.scores.values())
+        self.dirty.clear()
+        self.history = []
+        self.articles = []
+        self.last_flush = time.monotonic()
+
+    def __contains__(self, ticker):
+        return ticker in self.scores
+
+    def get(self, ticker):
+        return self.scores.get(ticker)
+
+    def market_average(self, default):
+        if not self.scores:
+            return default
+        return self.total / len(self.scores)
+
+    def add_article(self, row):
+        """
+        Queues an article row ({url, title, content, published_date, analysis_json}).
+        Returns False if the URL is already queued.
+        """
+        if any(article['url'] == row['url'] for article in self.articles):
+            return False
+        self.articles.append(row)
+        return True
+
+    def apply(self, ticker, change, reason, article_id, sentiment=None, article_url=None):
+        """
+        Applies a rating change locally and queues its history row.
+        article_url links the row to a queued article whose id is not known yet.
+        Returns (old rating, new rating).
+        """
+        old = self.scores[ticker]
+        new = old + change
+        self.scores[ticker] = new
+        self.total += change
+        self.dirty.add(ticker)
+        self.history.append({
+            "ticker": ticker,
+            "change": change,
+            "reason": reason,
+            "article_id": article_id,
+            "article_url": article_url,
+            "sentiment": sentiment,
+        })
+        return old, new
+
+    def has_pending(self):
+        return bool(self.history or self.articles)
+
+    def should_flush(self):
+        if not self.has_pending():
+            return False
+        return len(self.history) + len(self.articles) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval
+
+    def pending(self):
+        """
+        Returns (score rows with expected versions, history rows, article rows) to write.
+        """
+        scores = [
+            {"ticker": ticker, "score": self.scores[ticker], "version": self.versions[ticker]}
+            for ticker in sorted(self.dirty)
+        ]
+        return scores, list(self.history), list(self.articles)
+
+    def mark_flushed(self):
+        for ticker in self.dirty:
+            # The database bumps the version only when the score actually changed
+            if self.scores[ticker] != self.base[ticker]:
+                self.versions[ticker] += 1
+            self.base[ticker] = self.scores[ticker]
+        self.dirty.clear()
+        self.history = []
+        self.articles = []
+        self.last_flush = time.monotonic()
+
+    def drop_articles(self, urls):
+        """
+        Removes queued articles (e.g. already stored by another writer) and
+        reverts the rating changes of their history rows.
+        """
+        urls = set(urls)
+        self.articles = [a for a in self.articles if a['url'] not in urls]
+        kept = []
+        for row in self.history:
+            if row.get('article_url') in urls:
+                if row['ticker'] in self.scores:
+                    self.scores[row['ticker']] -= row['change']
+                    self.total -= row['change']
+            else:
+                kept.append(row)
+        self.history = kept
+
+    def rebase(self, conflicts):
+        """
+        Re-applies local pending changes on top of the rows another writer updated.
+
+        Args:
+            conflicts: rows of {ticker, score, version} as currently stored
+        """
+        for row in conflicts:
+            ticker = row['ticker']
+            if row.get('version') is None:
+                # Row was deleted remotely: drop local changes for it
+                self.total -= self.scores.pop(ticker, 0.0)
+                self.base.pop(ticker, None)
+                self.versions.pop(ticker, None)
+                self.dirty.discard(ticker)
+                self.history = [h for h in self.history if h['ticker'] != ticker]
+                continue
+            pending_change = self.scores[ticker] - self.base[ticker]
+            server_score = float(row['score'])
+            new = server_score + pending_change
+            self.total += new - self.scores[ticker]
+            self.scores[ticker] = new
+            self.base[ticker] = server_score
+            self.versions[ticker] = int(row['version'])
+
+    def stats(self):
+        return {
+            "tickers": len(self.scores),
+            "dirty": len(self.dirty),
+            "pending_history": len(self.history),
+            "pending_articles": len(self.articles),
+        }
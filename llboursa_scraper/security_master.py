@@ -0,0 +1,152 @@
+"""
+Security master: one record per listed company linking its ISIN, the
+ticker name used by the news pipeline, its sector and its aliases.
+
+The detector identifies stocks by ISIN (TN0001100254) and the exchange's
+short name (SFBT, BT, POULINA GP HOLDING); the news pipeline uses the
+display names of tunisian_stocks_by_sector.json (AMEN BANK, BANQUE DE
+TUNISIE). Every key resolves through a dictionary lookup:
+
+    master = get_security_master()
+    master.ticker_for("TN0002200053")        # "BANQUE DE TUNISIE"
+    master.isin_for("BANQUE DE TUNISIE")     # "TN0002200053"
+    master.sector_for("BT")                  # "banks"
+
+Known ISINs are kept in security_master.json ({isin: {ticker, exchange_name}}).
+register_isin() links further ISINs at runtime from the exchange's name
+when that name is a known ticker, company name or alias.
+"""
+
+import os
+import json
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from entity_index import normalize_text
+
+DATA_DIR = Path(__file__).resolve().parent
+
+Security = namedtuple("Security", ["ticker", "name", "sector", "isin", "aliases"])
+
+
+class SecurityMaster:
+    """
+    O(1) indexes by ticker, ISIN and normalized name/alias over the stock universe.
+    """
+
+    def __init__(self, sector_file=None, alias_file=None, isin_file=None):
+        sector_file = sector_file or DATA_DIR / "tunisian_stocks_by_sector.json"
+        alias_file = alias_file or DATA_DIR / "stock_aliases.json"
+        isin_file = isin_file or os.getenv("SECURITY_MASTER_PATH", str(DATA_DIR / "security_master.json"))
+
+        with open(sector_file, "r", encoding="utf-8") as f:
+            stocks_data = json.load(f)
+        aliases = {}
+        if os.path.exists(alias_file):
+            with open(alias_file, "r", encoding="utf-8") as f:
+                alias_data = json.load(f)
+            # Strict aliases (short acronyms) only need care when scanning free text
+            for section in ("tickers", "strict_tickers"):
+                for ticker, names in alias_data.get(section, {}).items():
+                    aliases.setdefault(ticker, []).extend(names)
+        isins = {}
+        if os.path.exists(isin_file):
+            with open(isin_file, "r", encoding="utf-8") as f:
+                isins = json.load(f)
+
+        isin_by_ticker = {entry['ticker']: isin for isin, entry in isins.items()}
+        exchange_names = {entry['ticker']: entry.get('exchange_name') for entry in isins.values()}
+
+        self.by_ticker = {}  # ticker -> Security
+        self.by_isin = {}    # ISIN -> ticker
+        self.by_name = {}    # normalized ticker, name or alias -> ticker
+        self.lock = threading.Lock()
+
+        for sector, stocks in stocks_data.items():
+            for stock in stocks:
+                ticker = stock['ticker']
+                names = [ticker, stock['name'], *aliases.get(ticker, [])]
+                if exchange_names.get(ticker):
+                    names.append(exchange_names[ticker])
+                self.by_ticker[ticker] = Security(
+                    ticker=ticker,
+                    name=stock['name'],
+                    sector=sector,
+                    isin=isin_by_ticker.get(ticker),
+                    aliases=tuple(dict.fromkeys(name for name in names if name != ticker)),
+                )
+                for name in names:
+                    # First registration wins, so a ticker name is never taken over by another company's alias
+                    self.by_name.setdefault(normalize_text(name), ticker)
+
+        for isin, entry in isins.items():
+            if entry['ticker'] in self.by_ticker:
+                self.by_isin[isin.upper()] = entry['ticker']
+
+    def get(self, key):
+        """
+        Security for an ISIN, ticker, company name or alias (None if unknown).
+        """
+        if not key:
+            return None
+        if key in self.by_ticker:
+            return self.by_ticker[key]
+        ticker = self.by_isin.get(key.strip().upper()) or self.by_name.get(normalize_text(key))
+        return self.by_ticker.get(ticker) if ticker else None
+
+    def ticker_for(self, key):
+        security = self.get(key)
+        return security.ticker if security else None
+
+    def isin_for(self, key):
+        security = self.get(key)
+        return security.isin if security else None
+
+    def sector_for(self, key):
+        security = self.get(key)
+        return security.sector if security else None
+
+    def register_isin(self, isin, exchange_name):
+        """
+        Links an ISIN seen in market data to a ticker through its exchange name.
+        Returns the ticker, or None when the name is unknown (no fuzzy matching).
+        """
+        isin = isin.strip().upper()
+        with self.lock:
+            if isin in self.by_isin:
+                return self.by_isin[isin]
+            ticker = self.by_name.get(normalize_text(exchange_name))
+            if ticker is None:
+                return None
+            security = self.by_ticker[ticker]
+            if security.isin and security.isin != isin:
+                return None  # Another line (e.g. a preferred share) of an already mapped company
+            self.by_isin[isin] = ticker
+            self.by_ticker[ticker] = security._replace(isin=isin)
+            return ticker
+
+    def securities(self):
+        return list(self.by_ticker.values())
+
+    def stats(self):
+        return {
+            "securities": len(self.by_ticker),
+            "with_isin": len(self.by_isin),
+            "names": len(self.by_name),
+        }
+
+
+_default_master = None
+_default_lock = threading.Lock()
+
+
+def get_security_master():
+    """
+    Process-wide SecurityMaster, loaded on first use.
+    """
+    global _default_master
+    with _default_lock:
+        if _default_master is None:
+            _default_master = SecurityMaster()
+        return _default_master
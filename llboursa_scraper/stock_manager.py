@@ -1,12 +1,20 @@
 import json
 import os
+from entity_index import EntityIndex
+from security_master import get_security_master
+from db_manager import sentiment_value
 
 class StockManager:
-    def __init__(self, sector_file="tunisian_stocks_by_sector.json", score_file="current_scores.json"):
+    def __init__(self, sector_file="tunisian_stocks_by_sector.json", score_file="current_scores.json",
+                 alias_file="stock_aliases.json"):
         self.sector_file = sector_file
         self.score_file = score_file
         self.stocks_data = self._load_sector_data()
         self.scores = self._load_or_initialize_scores()
+        # Name/alias/sector matcher used to resolve mentions and LLM targets
+        self.entity_index = EntityIndex(self.stocks_data, alias_file=alias_file)
+        # ISIN <-> ticker links shared with the anomaly detector
+        self.security_master = get_security_master()
 
     def _load_sector_data(self):
         if not os.path.exists(self.sector_file):
@@ -39,6 +47,15 @@ class StockManager:
     def get_sectors(self):
         return list(self.stocks_data.keys())
 
+    def get_security(self, key):
+        """
+        Security master record (ticker, name, sector, isin, aliases) for a ticker, ISIN or alias.
+        """
+        return self.security_master.get(key)
+
+    def isin_for(self, ticker):
+        return self.security_master.isin_for(ticker)
+
     def update_score(self, target, impact_type, sentiment_score):
         """
         Updates scores based on impact.
@@ -49,15 +66,12 @@ class StockManager:
         
         # Validation and Logic
         if impact_type == "sector":
-            # Normalize target to match json keys (lowercase, underscores)
-            sector_key = target.lower().replace(" ", "_")
-            if sector_key not in self.stocks_data:
-                # Try partial match or robust finding if needed, 
-                # but for now assume LLM gives good keys or we map them.
-                # Let's try to map "Banking" -> "banks", etc. if strictly needed.
-                # For now, strict check.
+            # Normalize target to match json keys ("Banking" -> "banks")
+            resolved = self.entity_index.normalize_target(target, "sector")
+            if not resolved:
                 print(f"Warning: Sector '{target}' not found. Skipping update.")
                 return 0
+            sector_key = resolved[1]
             
             affected_stocks = self.stocks_data[sector_key]
             count = 0
@@ -70,6 +84,12 @@ class StockManager:
             return count
 
         elif impact_type == "ticker":
+            resolved = self.entity_index.normalize_target(target, "ticker")
+            if resolved:
+                target = resolved[1]
+            else:
+                # ISIN codes, e.g. from the anomaly detector
+                target = self.security_master.ticker_for(target) or target
             if target in self.scores:
                 self.scores[target] += sentiment_score
                 print(f"Updated ticker '{target}' by {sentiment_score}. New score: {self.scores[target]}")
@@ -88,9 +108,62 @@ class StockManager:
     def get_stocks_in_sector(self, sector):
         return [s['ticker'] for s in self.stocks_data.get(sector, [])]
 
-if __name__ == "__main__":
-    # Test
-    sm = StockManager()
-    print(f"Total tracked stocks: {len(sm.scores)}")
-    # sm.update_score("banks", "sector", -2)
-    # sm.save_scores()
+    def expand_impacts(self, impacts, verbose=True):
+        """
+        Expands sector impacts returned by the analysis into one impact per ticker.
+        Targets are normalized to canonical tickers/sector keys first; sector
+        entries are kept alongside the per-ticker entries for traceability.
+        Scores are rounded to the integer the ELO update uses (merged chunks
+        can give -3.5, the model sometimes returns "+2"); impacts without a
+        numeric score are dropped.
+        """
+        expanded_impacts = []
+
+        for impact in impacts:
+            target = impact.get("target")
+            itype = impact.get("type")
+            score = sentiment_value(impact.get("sentiment_score"))
+            reason = impact.get("reasoning", "")
+
+            if not target or score is None:
+                continue
+
+            # Trust the declared type first, then accept the other kind (e.g. a sector sent as "ticker")
+            resolved = self.entity_index.normalize_target(target, itype) or self.entity_index.normalize_target(target)
+            if not resolved and self.security_master.ticker_for(target):
+                resolved = ("ticker", self.security_master.ticker_for(target))
+            if not resolved:
+                if verbose:
+                    print(f"    ⚠️  Target '{target}' ({itype}) not found in stock data")
+                continue
+            kind, canonical = resolved
+
+            if kind == "sector":
+                tickers = self.get_stocks_in_sector(canonical)
+
+                # Add sector-level impact
+                expanded_impacts.append({
+                    "target": canonical,
+                    "type": "sector",
+                    "sentiment_score": score,
+                    "reasoning": reason
+                })
+
+                # Add individual ticker impacts
+                for ticker in tickers:
+                    expanded_impacts.append({
+                        "target": ticker,
+                        "type": "ticker",
+                        "sentiment_score": score,
+                        "reasoning": f"[Via {canonical} sector] {reason}"
+                    })
+
+                if verbose:
+                    print(f"    📊 Sector '{canonical}' → {len(tickers)} tickers (score: {score:+d})")
+
+            else:
+                expanded_impacts.append({**impact, "target": canonical, "type": "ticker", "sentiment_score": score})
+                if verbose:
+                    print(f"    📈 Ticker '{canonical}' (score: {score:+d})")
+
+        return expanded_impacts
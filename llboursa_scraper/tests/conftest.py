@@ -0,0 +1,17 @@
+"""
+The scraper modules are flat scripts run from llboursa_scraper/: import them
+the same way and resolve their data files (sector lists, aliases) from there.
+"""
+
+import os
+import sys
+
+import pytest
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPER_DIR)
+
+
+@pytest.fixture(autouse=True)
+def scraper_dir(monkeypatch):
+    monkeypatch.chdir(SCRAPER_DIR)
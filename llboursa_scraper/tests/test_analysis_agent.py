@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+import analysis_agent
+from analysis_agent import AnalysisEngine, PROMPT_VERSION
+from analysis_cache import AnalysisCache
+
+ARTICLE = "Résultats semestriels en hausse pour la banque. " * 20
+
+
+def make_engine(outputs, cache=None, chunks=1):
+    """Engine without an API client: chunk outputs are served from `outputs` in order"""
+    engine = object.__new__(AnalysisEngine)
+    engine.deployment = "test"
+    engine.cache = cache
+    engine.prepare = lambda text: (text, [text] * chunks)
+    served = iter(outputs)
+    engine._complete = lambda chunk: next(served)
+    return engine
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_valid_result_is_cached(cache):
+    output = json.dumps({"impacts": [{"type": "ticker", "target": "AMEN BANK", "sentiment_score": 2}]})
+    assert make_engine([output], cache).analyze(ARTICLE) == output
+    assert cache.get(ARTICLE, PROMPT_VERSION, "test") == output
+
+
+@pytest.mark.parametrize("outputs", [
+    ["not json"],
+    [json.dumps({"impacts": [], "error": "content filter"})],
+    ["not json", "```json\n{broken\n```"],
+])
+def test_unparseable_results_are_not_cached(cache, outputs):
+    make_engine(outputs, cache, chunks=len(outputs)).analyze(ARTICLE)
+    assert cache.get(ARTICLE, PROMPT_VERSION, "test") is None
+
+
+def test_multi_chunk_result_cached_if_one_chunk_parsed(cache):
+    good = json.dumps({"impacts": [{"type": "ticker", "target": "AMEN BANK", "sentiment_score": -1}]})
+    result = make_engine(["not json", good], cache, chunks=2).analyze(ARTICLE)
+    assert json.loads(result)["impacts"][0]["sentiment_score"] == -1
+    assert cache.get(ARTICLE, PROMPT_VERSION, "test") == result
+
+
+def test_analyze_article_does_not_replace_the_engine_cache(cache, monkeypatch):
+    output = json.dumps({"impacts": []})
+    engine_cache = object()
+    engine = make_engine([output, output])
+    engine.cache = engine_cache
+    monkeypatch.setattr(analysis_agent, "_default_engine", engine)
+
+    analysis_agent.analyze_article(ARTICLE, cache=cache)
+    assert engine.cache is engine_cache
+    assert cache.get(ARTICLE, PROMPT_VERSION, "test") == output
+
+
+def test_multi_chunk_result_without_any_parsed_chunk_is_an_error():
+    result = make_engine(["not json", json.dumps({"impacts": [], "error": "content filter"})], chunks=2).analyze(ARTICLE)
+    assert json.loads(result) == {"impacts": [], "error": "no chunk output parsed"}
@@ -0,0 +1,35 @@
+from article_cleaner import clean_article, merge_chunk_impacts
+
+PAGE = """Accueil
+Marchés
+Actualités
+Analyses
+Forum
+Publié le 12/07/2024
+Résultats semestriels
+La SFBT annonce un chiffre d'affaires en hausse de 12% au premier semestre.
+Perspectives
+Le groupe prévoit de poursuivre ses investissements à l'export.
+Partager sur Facebook
+Marchés
+Tous droits réservés 2024"""
+
+
+def test_clean_article_keeps_headings_and_drops_menus():
+    assert clean_article(PAGE).splitlines() == [
+        "Publié le 12/07/2024",
+        "Résultats semestriels",
+        "La SFBT annonce un chiffre d'affaires en hausse de 12% au premier semestre.",
+        "Perspectives",
+        "Le groupe prévoit de poursuivre ses investissements à l'export.",
+    ]
+
+
+def test_merge_chunk_impacts_coerces_and_skips_invalid_scores():
+    merged = merge_chunk_impacts([
+        [{"type": "ticker", "target": "SFBT", "sentiment_score": "+2", "reasoning": "a"}],
+        [{"type": "ticker", "target": "sfbt", "sentiment_score": "-3.5", "reasoning": "b"},
+         {"type": "ticker", "target": "BIAT", "sentiment_score": "fort"}],
+        [{"type": "ticker", "target": "SFBT", "sentiment_score": None}],
+    ])
+    assert merged == [{"type": "ticker", "target": "SFBT", "sentiment_score": -3.5, "reasoning": "a | b"}]
@@ -0,0 +1,80 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from analysis_agent import PROMPT_VERSION
+from analysis_cache import AnalysisCache
+from article_cleaner import clean_article
+from batch_analysis import BatchJob, LocalBatchRunner, custom_id_for, ingest_batch
+from job_ledger import JobLedger, STATE_SAVED, STATE_DISCOVERED
+from local_store import LocalDBManager
+from stock_manager import StockManager
+
+DATE = "02/01/2024"
+CONTENT = "La banque annonce une hausse de {} % de son produit net bancaire au premier semestre."
+
+
+def impact(target, score):
+    return {"type": "ticker", "target": target, "sentiment_score": score, "reasoning": "test"}
+
+
+@pytest.fixture
+def batch(tmp_path):
+    """Batch of four articles: one chunk, two chunks, no fixture (no impact) and unparseable output"""
+    job = BatchJob(str(tmp_path / "batch"))
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    articles = {
+        "https://example.com/a_1": [json.dumps({"impacts": [impact("AMEN BANK", 4)]})],
+        "https://example.com/b_2": [
+            json.dumps({"impacts": [impact("ARAB TUNISIAN BANK", -2)]}),
+            json.dumps({"impacts": [impact("ARAB TUNISIAN BANK", -3)]}),
+        ],
+        "https://example.com/c_3": [None],
+        "https://example.com/d_4": ["not json"],
+    }
+    for n, (url, outputs) in enumerate(articles.items()):
+        job.add(url, f"Article {n}", DATE, CONTENT.format(n), [[{"role": "user", "content": "x"}]] * len(outputs), "test")
+        for i, output in enumerate(outputs):
+            if output is not None:
+                (fixtures / f"{custom_id_for(url)}-{i}.json").write_text(output, encoding="utf-8")
+    LocalBatchRunner(str(fixtures)).run(job)
+    return job
+
+
+def test_local_batch_round_trip(batch, tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    urls = [entry["url"] for entry in batch.manifest().values()]
+    ledger.record_discovery(DATE, [{"url": url} for url in urls])
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    cache = AnalysisCache(str(tmp_path / "cache.sqlite"))
+
+    stats = asyncio.run(ingest_batch(batch, db, StockManager(), cache=cache, ledger=ledger,
+                                     deployment="test", chunk_size=2))
+
+    assert stats == {"saved": 3, "skipped": 0, "failed": 1, "impacts": 2}
+    scores = asyncio.run(db.get_all_scores())
+    assert scores["AMEN BANK"] > db.INITIAL_RATING
+    assert scores["ARAB TUNISIAN BANK"] < db.INITIAL_RATING
+
+    for url in urls[:3]:
+        job = ledger.get(url)
+        assert job["state"] == STATE_SAVED
+        assert job["article_id"]
+    failed = ledger.get(urls[3])
+    assert failed["state"] == STATE_DISCOVERED and failed["attempts"] == 1
+
+    # Multi-chunk results are cached merged, keyed like interactive analyses
+    merged = json.loads(cache.get(clean_article(CONTENT.format(1)), PROMPT_VERSION, "test"))
+    assert merged["chunks"] == 2
+    assert [i["sentiment_score"] for i in merged["impacts"]] == [-3]
+
+    # Ingesting the same results again saves nothing twice
+    again = asyncio.run(ingest_batch(batch, db, StockManager(), ledger=ledger, deployment="test"))
+    assert again["saved"] == 0 and again["skipped"] == 3
+    assert asyncio.run(db.get_all_scores()) == scores
@@ -0,0 +1,108 @@
+import asyncio
+import sys
+from datetime import date, datetime, timedelta
+from types import ModuleType
+
+import pytest
+
+from job_ledger import JobLedger
+
+TODAY = date(2024, 7, 15)
+
+
+@pytest.fixture
+def daily_run(monkeypatch, tmp_path):
+    """
+    daily_run with the backfill pipeline replaced by a recorder: each call's
+    arguments land in module.calls, and it returns module.completed_through.
+    """
+    pipeline = ModuleType("backfill_manager")
+
+    async def backfill_process(**kwargs):
+        module.calls.append(kwargs)
+        return module.completed_through
+
+    pipeline.backfill_process = backfill_process
+    monkeypatch.setitem(sys.modules, "backfill_manager", pipeline)
+    monkeypatch.delitem(sys.modules, "daily_run", raising=False)
+    import daily_run as module
+
+    module.calls = []
+    module.completed_through = None
+    monkeypatch.setattr(module, "datetime", type("FrozenDatetime", (datetime,), {
+        "now": classmethod(lambda cls: datetime(TODAY.year, TODAY.month, TODAY.day, 6, 15))}))
+    monkeypatch.setenv("JOB_LEDGER_PATH", str(tmp_path / "ledger.sqlite"))
+    yield module
+    sys.modules.pop("daily_run", None)  # Imported over the recorder: never reused by other tests
+
+
+def stored_mark(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    try:
+        return ledger.get_high_water_mark("ilboursa")
+    finally:
+        ledger.close()
+
+
+def set_mark(tmp_path, published_on):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    ledger.set_high_water_mark("ilboursa", published_on)
+    ledger.close()
+
+
+@pytest.mark.parametrize("mark, expected_start", [
+    (None, date(2024, 7, 12)),               # No mark: the last initial_days
+    (date(2024, 7, 10), date(2024, 7, 8)),   # Mark minus the overlap
+    (TODAY, date(2024, 7, 13)),
+    (date(2024, 7, 20), TODAY),              # A mark ahead of today never starts in the future
+])
+def test_incremental_range(daily_run, mark, expected_start):
+    assert daily_run.incremental_range(mark, TODAY, overlap_days=2, initial_days=3) == (expected_start, TODAY)
+
+
+def test_first_run_covers_the_initial_days_without_forced_rediscovery(daily_run, tmp_path):
+    daily_run.completed_through = TODAY - timedelta(days=1)
+    asyncio.run(daily_run.daily_run(overlap_days=2, initial_days=3))
+
+    assert daily_run.calls == [{"start_date": date(2024, 7, 12), "end_date": TODAY,
+                                "metrics_path": None, "rediscover_from": None}]
+    assert stored_mark(tmp_path) == date(2024, 7, 14)
+
+
+def test_next_run_rediscovers_the_overlap_and_advances_the_mark(daily_run, tmp_path):
+    set_mark(tmp_path, date(2024, 7, 10))
+    daily_run.completed_through = TODAY
+    asyncio.run(daily_run.daily_run(overlap_days=2, initial_days=3))
+
+    call, = daily_run.calls
+    assert (call["start_date"], call["end_date"], call["rediscover_from"]) == (date(2024, 7, 8), TODAY, date(2024, 7, 8))
+    assert stored_mark(tmp_path) == TODAY
+
+
+def test_mark_is_kept_when_no_day_completes(daily_run, tmp_path, capsys):
+    set_mark(tmp_path, date(2024, 7, 10))
+    asyncio.run(daily_run.daily_run(overlap_days=2, initial_days=3))
+
+    assert stored_mark(tmp_path) == date(2024, 7, 10)
+    assert "high-water mark unchanged" in capsys.readouterr().out
+
+
+def test_mark_never_moves_backwards(daily_run, tmp_path):
+    set_mark(tmp_path, date(2024, 7, 10))
+    daily_run.completed_through = date(2024, 7, 8)  # Only the overlap days completed
+    asyncio.run(daily_run.daily_run(overlap_days=2, initial_days=3))
+
+    assert stored_mark(tmp_path) == date(2024, 7, 10)
+
+
+def test_overlapping_runs_are_locked_out(daily_run, tmp_path):
+    if daily_run.fcntl is None:
+        pytest.skip("fcntl is not available")
+    path = str(tmp_path / "daily_run.lock")
+    lock = daily_run.acquire_lock(path)
+    assert lock is not None
+    assert daily_run.acquire_lock(path) is None
+    lock.close()
+    second = daily_run.acquire_lock(path)
+    assert second is not None
+    second.close()
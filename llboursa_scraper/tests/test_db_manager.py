@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from db_manager import sentiment_value
+
+
+# Same values and results as save_article_with_impacts in schema.sql (checked on PostgreSQL 16)
+@pytest.mark.parametrize("score, expected", [
+    ("+2 ", 2), (2.5, 3), ("2.5", 3), (-2.5, -3), (" .5", 1), ("1e2", 100), (7, 7), ("-0", 0),
+    ("positive", None), ("", None), (None, None), ("NaN", None), ("Infinity", None),
+    ("1e400", None), ("3e999", None), ("1_0", None), (float("nan"), None), (float("inf"), None), (True, None),
+])
+def test_sentiment_value_matches_the_rpc(score, expected):
+    assert sentiment_value(score) == expected
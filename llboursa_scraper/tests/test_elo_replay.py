@@ -0,0 +1,80 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+import elo_replay
+from elo_replay import ReplayEvents, load_events, replay, sweep_configs
+from local_store import LocalDBManager
+
+TICKERS = ["AMEN BANK", "ARAB TUNISIAN BANK", "SFBT", "AMEN BANK", "SFBT", "AMEN BANK"]
+SENTIMENTS = [4, -2, 5, -5, 0, 3]
+
+
+@pytest.fixture
+def stocks_data():
+    with open("tunisian_stocks_by_sector.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("kernel", ["compiled", "numpy"])
+def test_replay_matches_the_live_elo_updates(tmp_path, stocks_data, monkeypatch, kernel):
+    if kernel == "numpy":
+        monkeypatch.setattr(elo_replay, "njit", None)
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    for i, (ticker, sentiment) in enumerate(zip(TICKERS, SENTIMENTS)):
+        impact = {"type": "ticker", "target": ticker, "sentiment_score": sentiment, "reasoning": "test"}
+        asyncio.run(db.save_article_with_impacts(f"https://example.com/{i}", "t", "c", "02/01/2024", [impact]))
+    stored_changes = [row["change"] for row in db.conn.execute("SELECT change FROM score_history ORDER BY id")]
+    stored_scores = asyncio.run(db.get_all_scores())
+
+    events = asyncio.run(load_events(db, stocks_data))
+    config = {"k": db.K_FACTOR, "market": "mean", "initial": db.INITIAL_RATING}
+    result = replay(events, [config])
+
+    assert result["changes"][0] == pytest.approx(stored_changes)
+    replayed = dict(zip(result["tickers"], result["ratings"][0]))
+    assert replayed == pytest.approx(stored_scores)
+    db.close()
+
+
+def test_replay_of_one_event_is_calculate_elo_change(tmp_path, stocks_data):
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    events = ReplayEvents.from_rows([{"id": 1, "ticker": "SFBT", "sentiment": None, "reason": "[Sentiment: +3] test"}],
+                                    stocks_data)
+    result = replay(events, sweep_configs([16, 32], ["mean", "fixed"], [1500]))
+
+    expected = [db.calculate_elo_change(1500, 3, 1500) * k / db.K_FACTOR for k in (16, 16, 32, 32)]
+    assert result["changes"][:, 0] == pytest.approx(expected)
+    db.close()
+
+
+@pytest.mark.parametrize("config, error", [
+    ({"k": 32, "market": "mean", "initial": 1500}, None),
+    ({"k": 32, "market": "sector", "initial": 1500}, "market=sector"),
+    ({"k": 24, "market": "mean", "initial": 1500}, "ELO_K_FACTOR=32"),
+    ({"k": 32, "market": "mean", "initial": 1200}, "ELO_INITIAL_RATING=1500"),
+])
+def test_apply_only_accepts_the_live_configuration(tmp_path, monkeypatch, config, error):
+    monkeypatch.delenv("ELO_K_FACTOR", raising=False)
+    monkeypatch.delenv("ELO_INITIAL_RATING", raising=False)
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    configs = sweep_configs([config["k"]], [config["market"]], [config["initial"]])
+    message = elo_replay.apply_error(db, configs, 0)
+    if error is None:
+        assert message is None
+    else:
+        assert error in message
+    assert "no config #1" in elo_replay.apply_error(db, configs, 1)
+    db.close()
+
+
+def test_apply_follows_the_configured_k(tmp_path, monkeypatch):
+    monkeypatch.setenv("ELO_K_FACTOR", "24")
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    assert elo_replay.apply_error(db, sweep_configs([24], ["mean"], [1500]), 0) is None
+    assert elo_replay.apply_error(db, sweep_configs([32], ["mean"], [1500]), 0) is not None
+    db.close()
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from entity_index import EntityIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open("tunisian_stocks_by_sector.json", encoding="utf-8") as f:
+        return EntityIndex(json.load(f), alias_file="stock_aliases.json")
+
+
+@pytest.mark.parametrize("sentence", [
+    "BT Investment lance un nouveau fonds en Europe.",
+    "Le groupe britannique BT a publié ses résultats annuels.",
+    "La filiale bt de l'opérateur annonce un plan social.",
+    "Le transport de marchandises reprend au port de Rades.",
+    "La distribution d'eau sera coupée demain à Sfax.",
+    "L'index des prix à la consommation est stable.",
+    "Une startup tech lève des fonds auprès d'un investment club.",
+    "ATL : le nouvel album du groupe sort en mars.",
+])
+def test_generic_words_are_not_mentions(index, sentence):
+    assert index.find_mentions(sentence) == []
+
+
+@pytest.mark.parametrize("sentence, ticker", [
+    ("La BT (Banque de Tunisie) augmente son dividende.", "BANQUE DE TUNISIE"),
+    ("Le PNB de la BT progresse, porté par l'activité bancaire.", "BANQUE DE TUNISIE"),
+    ("L'ATL, société de leasing, publie ses indicateurs.", "ARAB TUNISIAN LEASE"),
+])
+def test_strict_aliases_need_a_second_signal(index, sentence, ticker):
+    assert index.mentioned_tickers(sentence) == [ticker]
+
+
+def test_strict_aliases_resolve_llm_targets(index):
+    assert index.normalize_target("BT", "ticker") == ("ticker", "BANQUE DE TUNISIE")
@@ -0,0 +1,139 @@
+import sqlite3
+import time
+
+import pytest
+
+from extraction_cache import (
+    ExtractionCache, normalize_url, content_hash,
+    STATUS_OK, STATUS_SHORT, STATUS_FAILED, STATUS_DEAD,
+)
+
+URL = "https://www.ilboursa.com/marches/article_1"
+TEXT = "La banque annonce une hausse de son produit net bancaire. " * 5
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "extraction.sqlite"))
+    yield cache
+    cache.close()
+
+
+def age(cache, url, seconds):
+    """Moves the entry's fetch time `seconds` into the past"""
+    cache.conn.execute(
+        "UPDATE extractions SET fetched_at = ? WHERE url_key = ?",
+        (time.time() - seconds, normalize_url(url)),
+    )
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.ilboursa.com/marches/article_1",
+    "HTTPS://ILBOURSA.COM/marches/article_1/",
+    "https://ilboursa.com/marches/article_1#comments",
+    "https://ilboursa.com/marches/article_1?utm_source=x&fbclid=y",
+])
+def test_normalize_url_variants_share_a_key(url):
+    assert normalize_url(url) == "https://ilboursa.com/marches/article_1"
+
+
+def test_normalize_url_sorts_and_keeps_real_parameters():
+    assert normalize_url("https://ilboursa.com/a?p=2&id=5&utm_medium=z") == "https://ilboursa.com/a?id=5&p=2"
+    assert normalize_url("https://ilboursa.com/a?id=5") != normalize_url("https://ilboursa.com/a?id=6")
+
+
+@pytest.mark.parametrize("content, http_status, expected", [
+    (TEXT, 200, STATUS_OK),
+    ("Lire la suite", 200, STATUS_SHORT),
+    ("", 200, STATUS_FAILED),
+    (TEXT, 404, STATUS_DEAD),
+    ("", 410, STATUS_DEAD),
+])
+def test_store_derives_status(cache, content, http_status, expected):
+    assert cache.store(URL, content=content, http_status=http_status) == expected
+    assert cache.get(URL)["status"] == expected
+
+
+def test_ok_entry_is_fresh_until_its_ttl(cache):
+    cache.store(URL, content=TEXT, http_status=200)
+    assert cache.is_fresh(cache.get(URL))
+    age(cache, URL, cache.fresh_ttl + 1)
+    assert not cache.is_fresh(cache.get(URL))
+
+
+def test_short_entry_is_never_fresh(cache):
+    cache.store(URL, content="Lire la suite", http_status=200)
+    assert not cache.is_fresh(cache.get(URL))
+
+
+def test_dead_entry_is_skipped_until_its_ttl(cache):
+    cache.store(URL, http_status=404)
+    assert cache.is_dead(cache.get(URL))
+    age(cache, URL, cache.dead_ttl + 1)
+    assert not cache.is_dead(cache.get(URL))
+
+
+def test_conditional_headers_need_cached_content(cache):
+    cache.store(URL, content=TEXT, http_status=200, etag='"v1"', last_modified="Mon, 19 Oct 2026 08:00:00 GMT")
+    assert cache.conditional_headers(cache.get(URL)) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 19 Oct 2026 08:00:00 GMT",
+    }
+
+    cache.store("https://ilboursa.com/other", content="", http_status=200, etag='"v2"')
+    assert cache.conditional_headers(cache.get("https://ilboursa.com/other")) == {}
+    assert cache.conditional_headers(None) == {}
+
+
+@pytest.mark.parametrize("http_status, status", [(None, STATUS_FAILED), (404, STATUS_DEAD)])
+def test_failed_fetch_keeps_content_and_validators(cache, http_status, status):
+    cache.store(URL, content=TEXT, http_status=200, etag='"v1"')
+    cache.store(URL, content="", http_status=http_status, status=STATUS_FAILED if http_status is None else None)
+
+    entry = cache.get(URL)
+    assert entry["status"] == status
+    assert entry["attempts"] == 2
+    assert entry["content"] == TEXT
+    assert entry["content_hash"] == content_hash(TEXT)
+    assert cache.conditional_headers(entry) == {"If-None-Match": '"v1"'}
+
+
+def test_revalidation_after_a_failure_restores_the_entry(cache):
+    cache.store(URL, content=TEXT, http_status=200, etag='"v1"')
+    cache.store(URL, content="", status=STATUS_FAILED)
+
+    assert cache.touch(URL) == STATUS_OK
+    entry = cache.get(URL)
+    assert cache.is_fresh(entry)
+    assert entry["content"] == TEXT
+    assert entry["attempts"] == 3
+
+
+def test_content_hash_tells_changed_from_unchanged(cache):
+    cache.store(URL, content=TEXT, http_status=200)
+    entry = cache.get(URL)
+    assert cache.is_unchanged(entry, TEXT)
+    assert not cache.is_unchanged(entry, TEXT + " Mise à jour.")
+    assert not cache.is_unchanged(None, TEXT)
+
+    cache.store(URL, content=TEXT + " Mise à jour.", http_status=200)
+    assert cache.get(URL)["content_hash"] == content_hash(TEXT + " Mise à jour.")
+
+
+def test_cache_file_without_hash_column_is_upgraded(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE extractions (
+            url_key TEXT PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL, content TEXT,
+            etag TEXT, last_modified TEXT, http_status INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0, fetched_at REAL NOT NULL
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+    cache = ExtractionCache(path)
+    cache.store(URL, content=TEXT, http_status=200)
+    assert cache.get(URL)["content_hash"] == content_hash(TEXT)
+    cache.close()
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from host_limiter import HostLimiter, RateLimiter, SLOW_SAMPLES, parse_retry_after
+
+
+@pytest.fixture
+def limiter():
+    return HostLimiter("example.com", initial_concurrency=4, max_concurrency=8, min_interval=0.2, latency_factor=3)
+
+
+def finish(limiter, latency=0.3, **kwargs):
+    """One request through the limiter; decreases are allowed every call (no round-trip wait)"""
+    limiter.in_flight += 1
+    limiter.last_decrease = 0.0
+    limiter.release(latency, **kwargs)
+
+
+def test_one_fast_reply_does_not_throttle_normal_traffic(limiter):
+    finish(limiter, 0.02)
+    for _ in range(40):
+        finish(limiter, 0.3)
+
+    stats = limiter.stats()
+    assert stats["slow"] == 0
+    assert stats["interval_s"] == 0.2
+    assert stats["window"] >= 4
+
+
+def test_sustained_slowdown_halves_the_window(limiter):
+    for _ in range(10):
+        finish(limiter, 0.1)
+    for _ in range(SLOW_SAMPLES - 1):
+        finish(limiter, 1.0)
+    assert limiter.slow == 0
+
+    window = limiter.window
+    finish(limiter, 1.0)
+    assert limiter.slow == 1
+    assert limiter.window == window / 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_throttling_and_server_errors_halve_the_window(limiter, status):
+    finish(limiter, status=status)
+    assert limiter.window == 2
+    finish(limiter, status=status)
+    finish(limiter, status=status)
+    # Down to one request at a time: the pacing slows down instead
+    assert limiter.window == 1
+    assert limiter.interval == 0.5
+
+
+def test_decrease_at_most_once_per_round_trip(limiter):
+    finish(limiter, 1.0)
+    window = limiter.window
+    limiter.in_flight += 2
+    limiter.release(None, status=429)
+    limiter.release(None, status=429)
+    assert limiter.window == window / 2
+    assert limiter.throttled == 2
+
+
+def test_retry_after_pauses_the_host(limiter):
+    finish(limiter, status=429, retry_after=5)
+    assert limiter.paused_until - time.monotonic() == pytest.approx(5, abs=0.5)
+    assert limiter._try_start() > 4
+
+    other = HostLimiter("other.com", min_interval=0.2)
+    finish(other, status=500, retry_after=5)
+    assert other.paused_until == 0.0
+
+
+def test_recovery_restores_pacing_then_adds_concurrency(limiter):
+    limiter.window, limiter.interval = 1.0, 1.0
+    finish(limiter)
+    assert (limiter.window, limiter.interval) == (1.0, 0.8)
+    while limiter.interval > limiter.min_interval:
+        finish(limiter)
+    assert limiter.window == 1.0
+
+    # +1/window per success, i.e. about +1 slot per window of successful requests
+    finish(limiter)
+    assert limiter.window == 2.0
+    finish(limiter)
+    assert limiter.window == 2.5
+    for _ in range(100):
+        finish(limiter)
+    assert limiter.window == 8  # max_concurrency
+
+
+def test_hosts_share_a_limiter_with_and_without_www():
+    limiter = RateLimiter()
+    assert limiter.for_host("https://www.ilboursa.com/marches") is limiter.for_host("ilboursa.com")
+    assert limiter.for_host("https://www.bvmt.com.tn/") is not limiter.for_host("ilboursa.com")
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert parse_retry_after(None) is None
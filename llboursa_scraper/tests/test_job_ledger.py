@@ -0,0 +1,71 @@
+from datetime import date
+
+from job_ledger import (JobLedger, STATE_ANALYZED, STATE_DISCOVERED, STATE_EXTRACTED,
+                        STATE_FAILED, STATE_SAVED, STATE_SKIPPED)
+
+DATE = "02/01/2024"
+ARTICLES = [{"url": "https://example.com/a", "title": "A"}, {"url": "https://example.com/b", "title": "B"}]
+
+
+def test_job_moves_through_its_states_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger = JobLedger(path)
+    ledger.record_discovery(DATE, ARTICLES)
+    url = ARTICLES[0]["url"]
+
+    ledger.mark_extracted(url, "content")
+    ledger.mark_analyzed(url, '{"impacts": []}')
+    assert ledger.get(url)["state"] == STATE_ANALYZED
+    assert ledger.get(url)["content"] == "content"
+    ledger.close()
+
+    # A restarted run sees the analysis, and rediscovery leaves the states alone
+    ledger = JobLedger(path)
+    assert ledger.is_discovered(DATE)
+    ledger.record_discovery(DATE, ARTICLES + [{"url": "https://example.com/c", "title": "C"}])
+    assert ledger.get(url)["analysis"] == '{"impacts": []}'
+    assert [job["url"] for job in ledger.jobs_for_date(DATE)] == [a["url"] for a in ARTICLES] + ["https://example.com/c"]
+    assert ledger.pending_count(DATE) == 3
+
+    ledger.mark_saved(url, article_id=7)
+    ledger.mark_skipped(ARTICLES[1]["url"], "near-duplicate of https://example.com/a")
+    saved = ledger.get(url)
+    assert (saved["state"], saved["article_id"], saved["content"], saved["analysis"]) == (STATE_SAVED, 7, None, None)
+    assert ledger.get(ARTICLES[1]["url"])["state"] == STATE_SKIPPED
+    assert ledger.pending_count(DATE) == 1
+    assert ledger.stats() == {STATE_SAVED: 1, STATE_SKIPPED: 1, STATE_DISCOVERED: 1}
+
+
+def test_incomplete_discovery_is_not_marked_done(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    ledger.record_discovery(DATE, ARTICLES, complete=False)
+    assert not ledger.is_discovered(DATE)
+    assert ledger.pending_count(DATE) == 2
+
+
+def test_failures_give_up_after_max_attempts_and_retry_resumes(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"), max_attempts=2)
+    ledger.record_discovery(DATE, ARTICLES)
+    extracted, discovered = (a["url"] for a in ARTICLES)
+    ledger.mark_extracted(extracted, "content")
+
+    for url in (extracted, discovered):
+        assert ledger.record_failure(url, "timeout") is True
+        assert ledger.record_failure(url, "timeout") is False
+        assert ledger.get(url)["state"] == STATE_FAILED
+    assert [job["url"] for job in ledger.failed()] == [extracted, discovered]
+    assert ledger.pending_count(DATE) == 0
+
+    assert ledger.retry_failed() == 2
+    assert ledger.get(extracted)["state"] == STATE_EXTRACTED
+    assert ledger.get(discovered)["state"] == STATE_DISCOVERED
+    assert ledger.get(extracted)["attempts"] == 0
+
+
+def test_high_water_mark_never_moves_backwards(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    assert ledger.get_high_water_mark("bvmt") is None
+    ledger.set_high_water_mark("bvmt", date(2024, 7, 12))
+    ledger.set_high_water_mark("bvmt", date(2024, 7, 10))
+    assert ledger.get_high_water_mark("bvmt") == date(2024, 7, 12)
+    assert ledger.marks() == {"bvmt": "2024-07-12"}
@@ -0,0 +1,188 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import RateLimitScheduler, TokenBucket
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        self.retry_after = retry_after
+
+
+class VirtualClock(asyncio.SelectorEventLoop):
+    """
+    Event loop on virtual time: when every task is waiting, it jumps to the
+    next timer instead of blocking, and the scheduler reads the same clock.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1000.0
+        select = self._selector.select
+
+        def advance(timeout=None):
+            if timeout:
+                self.now += timeout
+            return select(0)
+
+        self._selector.select = advance
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = VirtualClock()
+    monkeypatch.setattr(llm_scheduler, "time", SimpleNamespace(monotonic=clock.time))
+    # Backoff without jitter: always the upper bound
+    monkeypatch.setattr(llm_scheduler, "random", SimpleNamespace(uniform=lambda low, high: high))
+    yield clock
+    clock.close()
+
+
+def schedule(clock, scheduler, calls, estimated_tokens=100, delays=None):
+    """Runs the calls concurrently through the scheduler, each submitted after its delay"""
+    async def submit(call, delay):
+        await asyncio.sleep(delay)
+        return await scheduler.run(call, estimated_tokens, is_throttle=lambda e: isinstance(e, Throttled),
+                                   is_retryable=lambda e: isinstance(e, TimeoutError),
+                                   retry_after=lambda e: getattr(e, "retry_after", None))
+
+    async def run_all():
+        return await asyncio.gather(*(submit(call, delay) for call, delay in zip(calls, delays or [0] * len(calls))))
+    return clock.run_until_complete(run_all())
+
+
+def recorder(clock, starts, tokens=None, result="ok"):
+    async def call():
+        starts.append(clock.time())
+        return result, tokens
+    return call
+
+
+def test_bucket_refills_continuously_up_to_capacity(clock):
+    bucket = TokenBucket(60)  # One unit per second
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now += 29
+    assert bucket.wait_time(31) == pytest.approx(1.5)
+    clock.now += 3600
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.tokens == 60
+
+
+def test_bucket_caps_requests_larger_than_capacity(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(500) == 0.0  # Would otherwise never be satisfiable
+    bucket.consume(500)
+    assert bucket.tokens == 0
+
+
+def test_bucket_refund_returns_unused_and_charges_overruns(clock):
+    bucket = TokenBucket(1000)
+    bucket.consume(600)
+    bucket.refund(500)
+    assert bucket.tokens == 900
+    bucket.refund(-300)
+    assert bucket.tokens == 600
+    bucket.refund(10000)
+    assert bucket.tokens == 1000
+
+
+def test_requests_per_minute_are_paced(clock):
+    scheduler = RateLimitScheduler(rpm=2, tpm=100000, concurrency=4)
+    starts = []
+    schedule(clock, scheduler, [recorder(clock, starts) for _ in range(4)])
+
+    # Two requests right away, then one every 30 s as the request bucket refills
+    assert [start - 1000 for start in starts] == pytest.approx([0, 0, 30, 60])
+
+
+def test_tokens_per_minute_are_paced_on_the_estimate(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=1000, concurrency=4)
+    starts = []
+    schedule(clock, scheduler, [recorder(clock, starts) for _ in range(2)], estimated_tokens=600)
+
+    # 400 tokens left, 200 more refill in 12 s at 1000 tokens/min
+    assert [start - 1000 for start in starts] == pytest.approx([0, 12])
+
+
+def test_actual_usage_refunds_the_reservation(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=1000, concurrency=1)
+    starts = []
+    schedule(clock, scheduler, [recorder(clock, starts, tokens=100) for _ in range(2)], estimated_tokens=600)
+
+    assert [start - 1000 for start in starts] == [0, 0]
+    assert scheduler.tokens.tokens == pytest.approx(800)
+
+
+def test_throttle_waits_for_retry_after_and_pauses_every_caller(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=100000, concurrency=2, base_delay=1.0)
+    starts, attempts = [], []
+
+    async def throttled_once():
+        attempts.append(clock.time())
+        if len(attempts) == 1:
+            raise Throttled(retry_after=5)
+        return "retried", None
+
+    # The second request is submitted 1 s after the 429
+    results = schedule(clock, scheduler, [throttled_once, recorder(clock, starts, result="other")], delays=[0, 1])
+    assert results == ["retried", "other"]
+    # Retry-After 5 s plus up to base_delay of jitter (the upper bound here)
+    assert [at - 1000 for at in attempts] == pytest.approx([0, 6])
+    assert [at - 1000 for at in starts] == pytest.approx([6])
+    assert scheduler.stats()["throttled"] == 1
+    assert scheduler.stats()["retries"] == 1
+
+
+def test_transient_errors_back_off_exponentially_then_give_up(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=100000, concurrency=1, max_retries=3, base_delay=1.0)
+    attempts = []
+
+    async def timing_out():
+        attempts.append(clock.time())
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        schedule(clock, scheduler, [timing_out])
+    assert [at - 1000 for at in attempts] == pytest.approx([0, 1, 3, 7])
+    assert scheduler.retries == 3 and scheduler.throttled == 0
+    assert scheduler.paused_until == 0.0  # Only a throttle pauses other callers
+
+
+def test_other_errors_are_not_retried(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=100000, concurrency=1)
+    attempts = []
+
+    async def broken():
+        attempts.append(clock.time())
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        schedule(clock, scheduler, [broken])
+    assert len(attempts) == 1 and scheduler.retries == 0
+
+
+def test_concurrency_is_bounded(clock):
+    scheduler = RateLimitScheduler(rpm=1000, tpm=100000, concurrency=2)
+    in_flight, peak = 0, 0
+
+    async def slow_call():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(1)
+        in_flight -= 1
+        return "ok", None
+
+    assert schedule(clock, scheduler, [slow_call for _ in range(6)]) == ["ok"] * 6
+    assert peak == 2
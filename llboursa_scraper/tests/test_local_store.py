@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from db_manager import StorageBackend, create_db_manager
+from local_store import LocalDBManager
+
+DATE = "02/01/2024"
+
+
+def impact(target, score, kind="ticker"):
+    return {"type": kind, "target": target, "sentiment_score": score, "reasoning": "test"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = LocalDBManager(str(tmp_path / "local.sqlite"))
+    yield db
+    db.close()
+
+
+def test_bulk_save_keeps_the_first_id_of_a_repeated_url(db):
+    articles = [
+        {"url": "https://example.com/a", "title": "A", "content": "x", "published_date": DATE, "impacts": [impact("AMEN BANK", 2)]},
+        {"url": "https://example.com/a", "title": "A", "content": "x", "published_date": DATE, "impacts": [impact("AMEN BANK", 2)]},
+        {"url": "https://example.com/b", "title": "B", "content": "y", "published_date": DATE, "impacts": []},
+    ]
+    ids = asyncio.run(db.save_articles_bulk(articles))
+
+    stored = dict(db.conn.execute("SELECT url, id FROM articles").fetchall())
+    assert ids == stored and len(stored) == 2
+    assert db.conn.execute("SELECT COUNT(*) FROM score_history").fetchone()[0] == 1
+
+
+def test_save_applies_ticker_impacts_in_one_transaction(db):
+    impacts = [
+        impact("AMEN BANK", 2.5),            # Merged chunks: rounded half away from zero
+        impact("SFBT", "-3"),                # String scores are accepted
+        impact("banks", 4, kind="sector"),   # Sector impacts are not rated
+        impact("NOT LISTED", 5),
+        impact("ARAB TUNISIAN BANK", None),
+    ]
+    market = db._market_average()
+    article_id = asyncio.run(db.save_article_with_impacts("https://example.com/a", "A", "x", DATE, impacts))
+
+    assert article_id and db.take_saved_articles() == {"https://example.com/a": article_id}
+    history = [tuple(row) for row in db.conn.execute(
+        "SELECT ticker, sentiment, reason, article_id FROM score_history ORDER BY id")]
+    assert history == [("AMEN BANK", 3, "[Sentiment: +3] test", article_id),
+                       ("SFBT", -3, "[Sentiment: -3] test", article_id)]
+
+    scores = asyncio.run(db.get_all_scores())
+    amen_change = db.calculate_elo_change(db.INITIAL_RATING, 3, market)
+    assert scores["AMEN BANK"] == pytest.approx(db.INITIAL_RATING + amen_change)
+    # The second update sees the market average moved by the first one
+    assert scores["SFBT"] == pytest.approx(db.INITIAL_RATING + db.calculate_elo_change(
+        db.INITIAL_RATING, -3, market + amen_change / len(scores)))
+
+    summary = asyncio.run(db.get_stock_sentiment_summary())
+    assert summary["AMEN BANK"]["mention_count"] == 1
+    assert summary["SFBT"]["last_sentiment"] == -3
+
+
+def test_saving_a_stored_url_changes_nothing(db):
+    first = asyncio.run(db.save_article_with_impacts("https://example.com/a", "A", "x", DATE, [impact("SFBT", 5)]))
+    scores = asyncio.run(db.get_all_scores())
+
+    assert asyncio.run(db.save_article_with_impacts("https://example.com/a", "A", "x", DATE, [impact("SFBT", 5)])) is None
+    assert asyncio.run(db.get_all_scores()) == scores
+    assert db.take_saved_articles() == {"https://example.com/a": first}
+    assert db.conn.execute("SELECT COUNT(*) FROM score_history").fetchone()[0] == 1
+
+
+INTERFACE = [
+    name for name, member in vars(StorageBackend).items()
+    if callable(member) and not name.startswith("_")
+]
+
+
+def test_local_backend_implements_the_whole_interface_and_nothing_supabase_only():
+    for name in INTERFACE:
+        assert getattr(LocalDBManager, name) is not getattr(StorageBackend, name) or name in (
+            "calculate_elo_change", "take_saved_articles"), name
+    for name in ("load_score_cache", "apply_impact_cached", "update_ticker_score_simple", "_save_article_write_behind"):
+        assert not hasattr(LocalDBManager, name), name
+
+
+def test_backfill_surface_from_create_db_manager(tmp_path, capsys):
+    db = create_db_manager("local", path=str(tmp_path / "local.sqlite"))
+    try:
+        asyncio.run(db.check_connection_and_setup())
+        assert "Local database ready" in capsys.readouterr().out
+
+        asyncio.run(db.initialize_scores(["NEW LISTING"]))
+        scores = asyncio.run(db.get_all_scores())
+        assert scores["NEW LISTING"] == db.INITIAL_RATING
+        assert asyncio.run(db.get_market_average()) == pytest.approx(db.INITIAL_RATING)
+
+        ids = asyncio.run(db.save_articles_bulk([
+            {"url": "https://example.com/a", "title": "A", "content": "x", "published_date": DATE,
+             "impacts": [impact("SFBT", 3)]},
+        ]))
+        assert db.take_saved_articles() == ids and db.take_saved_articles() == {}
+        assert asyncio.run(db.flush_scores())
+        assert asyncio.run(db.get_existing_urls()) == {"https://example.com/a"}
+        assert asyncio.run(db.find_existing_urls(["https://example.com/a", "https://example.com/b", None])) == {
+            "https://example.com/a"}
+
+        asyncio.run(db.update_ticker_score("AMEN BANK", -2, "test", None))
+        asyncio.run(db.update_ticker_score("NOT LISTED", -2, "test", None))
+        summary = asyncio.run(db.get_stock_sentiment_summary(limit=1))
+        assert len(summary) == 1
+
+        # What elo_replay --apply reads and writes
+        history = asyncio.run(db.get_score_history())
+        assert [(row["ticker"], row["sentiment"]) for row in history] == [("SFBT", 3), ("AMEN BANK", -2)]
+        asyncio.run(db.bulk_update_history_changes([{"id": row["id"], "change": 1.5} for row in history]))
+        asyncio.run(db.bulk_upsert_scores([{"ticker": "SFBT", "score": 1600.0}]))
+        assert asyncio.run(db.get_all_scores())["SFBT"] == 1600.0
+        assert {row[0] for row in db.conn.execute("SELECT change FROM score_history")} == {1.5}
+    finally:
+        db.close()
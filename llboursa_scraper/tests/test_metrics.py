@@ -0,0 +1,101 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry
+
+PRICES = {"gpt-5.2": {"input": 1.25, "cached_input": 0.125, "output": 10.0}, "no-cache-rate": {"input": 2.0, "output": 4.0}}
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(prices=PRICES)
+
+
+def test_prometheus_exposition_format(registry):
+    registry.inc("articles_total", result="saved")
+    registry.inc("articles_total", 2, result="saved")
+    registry.inc("articles_total", result="failed")
+    registry.inc("custom_total", source='say "hi"\n')
+    for latency in (0.03, 0.2, 400):
+        registry.observe("stage_seconds", latency, stage="analysis")
+
+    lines = registry.to_prometheus().splitlines()
+    assert lines[:4] == [
+        "# HELP news_pipeline_articles_total Articles by outcome",
+        "# TYPE news_pipeline_articles_total counter",
+        'news_pipeline_articles_total{result="failed"} 1',
+        'news_pipeline_articles_total{result="saved"} 3',
+    ]
+    # No HELP line for an undocumented metric; label values escaped
+    assert lines[4:6] == ["# TYPE news_pipeline_custom_total counter",
+                          'news_pipeline_custom_total{source="say \\"hi\\"\\n"} 1']
+
+    assert lines[6:8] == ["# HELP news_pipeline_stage_seconds Duration of a pipeline stage for one item",
+                          "# TYPE news_pipeline_stage_seconds histogram"]
+    buckets = [line for line in lines if line.startswith("news_pipeline_stage_seconds_bucket")]
+    assert len(buckets) == len(metrics.DEFAULT_BUCKETS) + 1
+    assert buckets[0] == 'news_pipeline_stage_seconds_bucket{stage="analysis",le="0.01"} 0'
+    assert 'news_pipeline_stage_seconds_bucket{stage="analysis",le="0.05"} 1' in buckets
+    assert 'news_pipeline_stage_seconds_bucket{stage="analysis",le="0.25"} 2' in buckets
+    assert buckets[-2:] == ['news_pipeline_stage_seconds_bucket{stage="analysis",le="300"} 2',
+                            'news_pipeline_stage_seconds_bucket{stage="analysis",le="+Inf"} 3']
+    assert lines[-2:] == ['news_pipeline_stage_seconds_sum{stage="analysis"} 400.23',
+                          'news_pipeline_stage_seconds_count{stage="analysis"} 3']
+
+
+def test_json_snapshot(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metrics, "time", SimpleNamespace(time=lambda: now[0], perf_counter=lambda: now[0]))
+    registry = MetricsRegistry(prices=PRICES)
+    registry.inc("pages_total", result="ok")
+    with registry.timer("stage_seconds", stage="extraction"):
+        now[0] += 0.4
+    with pytest.raises(RuntimeError):
+        with registry.timer("stage_seconds", stage="extraction"):
+            now[0] += 2
+            raise RuntimeError("timed even when it raises")
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+    assert snapshot["started_at"] == 1000.0 and snapshot["duration_s"] == pytest.approx(2.4)
+    assert snapshot["counters"] == [{"name": "pages_total", "labels": {"result": "ok"}, "value": 1}]
+    histogram, = snapshot["histograms"]
+    assert histogram["labels"] == {"stage": "extraction"}
+    assert (histogram["count"], histogram["sum"], histogram["avg"]) == (2, pytest.approx(2.4), pytest.approx(1.2))
+    assert (histogram["p50"], histogram["p95"]) == (0.5, 2.5)
+    assert histogram["buckets"]["0.5"] == 1 and histogram["buckets"]["2.5"] == 1 and histogram["buckets"]["+Inf"] == 0
+
+
+def test_write_picks_the_format_from_the_extension(registry, tmp_path):
+    registry.inc("articles_total", result="saved")
+    registry.write(str(tmp_path / "out" / "run.json"))
+    registry.write(str(tmp_path / "out" / "run.prom"))
+
+    assert json.loads((tmp_path / "out" / "run.json").read_text())["counters"][0]["value"] == 1
+    assert (tmp_path / "out" / "run.prom").read_text() == registry.to_prometheus()
+    assert sorted(path.name for path in (tmp_path / "out").iterdir()) == ["run.json", "run.prom"]
+
+
+def test_llm_cost_totals(registry):
+    registry.record_llm_call("gpt-5.2", 1.5, prompt_tokens=10_000, cached_tokens=4_000, completion_tokens=1_000)
+    registry.record_llm_call("gpt-5.2", 0.5, prompt_tokens=2_000, cached_tokens=0, completion_tokens=500)
+    # Without a cached rate, cached tokens are billed at the input rate
+    registry.record_llm_call("no-cache-rate", 1.0, prompt_tokens=1_000, cached_tokens=1_000, completion_tokens=0)
+    registry.record_llm_call(None, 1.0, prompt_tokens=100, cached_tokens=0, completion_tokens=100)  # No price
+
+    gpt = (6_000 * 1.25 + 4_000 * 0.125 + 1_000 * 10.0 + 2_000 * 1.25 + 500 * 10.0) / 1_000_000
+    assert registry.counters[("llm_cost_usd_total", (("deployment", "gpt-5.2"),))] == pytest.approx(gpt)
+    assert registry.total("llm_cost_usd_total") == pytest.approx(gpt + 1_000 * 2.0 / 1_000_000)
+    assert registry.total("llm_requests_total") == 4
+    assert registry.total("llm_tokens_total") == 13_100 + 5_000 + 1_600
+    assert registry.counters[("llm_tokens_total", (("deployment", "unknown"), ("kind", "completion")))] == 100
+    assert registry.histograms[("llm_request_seconds", (("deployment", "gpt-5.2"),))].count == 2
+
+
+def test_prices_default_to_the_environment(monkeypatch):
+    monkeypatch.setenv("LLM_PRICES", json.dumps(PRICES))
+    assert MetricsRegistry().prices == PRICES
+    monkeypatch.setenv("LLM_PRICES", "")
+    assert MetricsRegistry().prices == {}
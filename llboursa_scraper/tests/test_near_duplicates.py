@@ -0,0 +1,52 @@
+import pytest
+
+from near_duplicates import NearDuplicateIndex, MAX_DISTANCE
+
+STORY = ("La Société Frigorifique et Brasserie de Tunis annonce un chiffre d'affaires "
+         "consolidé en hausse de douze pour cent au premier semestre, porté par les ventes "
+         "de boissons gazeuses et l'export vers les marchés africains de la région.")
+
+
+def test_pending_copy_is_persisted_only_when_confirmed(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    index = NearDuplicateIndex(path)
+    assert index.add("https://a/1", STORY, pending=True) == "https://a/1"
+    assert index.add("https://b/1", STORY + " Source: BVMT", pending=True) == "https://a/1"
+    assert index.is_pending("https://a/1")
+
+    index.confirm("https://a/1")
+    index.confirm("https://b/1")
+    reopened = NearDuplicateIndex(path)
+    assert reopened.add("https://c/1", STORY) == "https://a/1"
+    assert sorted(reopened.cluster("https://a/1")) == ["https://a/1", "https://b/1", "https://c/1"]
+
+
+def test_discarded_canonical_releases_its_copies(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "index.sqlite"))
+    index.add("https://a/1", STORY, pending=True)
+    index.add("https://b/1", STORY + " Source: BVMT", pending=True)
+
+    index.discard("https://a/1")
+    assert not index.is_pending("https://b/1")
+    # The next copy becomes canonical instead of pointing at the failed one
+    assert index.add("https://b/1", STORY + " Source: BVMT", pending=True) == "https://b/1"
+    assert NearDuplicateIndex(str(tmp_path / "index.sqlite")).stats()["articles"] == 0
+
+
+@pytest.mark.parametrize("max_distance", [MAX_DISTANCE + 1, 8, -1])
+def test_distance_beyond_the_band_guarantee_is_rejected(tmp_path, monkeypatch, max_distance):
+    with pytest.raises(ValueError, match="NEAR_DUPLICATE_MAX_DISTANCE"):
+        NearDuplicateIndex(str(tmp_path / "index.sqlite"), max_distance=max_distance)
+
+    monkeypatch.setenv("NEAR_DUPLICATE_MAX_DISTANCE", str(max_distance))
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(str(tmp_path / "index.sqlite"))
+
+
+def test_every_signature_within_max_distance_is_found(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "index.sqlite"), max_distance=MAX_DISTANCE)
+    index.add("https://a/1", STORY)
+    signature = index.signatures["https://a/1"]
+    # Worst case: the differing bits fall in different 16-bit bands
+    flipped = signature ^ (1 << 0) ^ (1 << 16) ^ (1 << 32)
+    assert index.find(flipped) == "https://a/1"
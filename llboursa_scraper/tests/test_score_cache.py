@@ -0,0 +1,184 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import score_cache
+from score_cache import ScoreCache
+
+ROWS = [
+    {"ticker": "AMEN BANK", "score": 1500, "version": 3},
+    {"ticker": "SFBT", "score": 1520, "version": 0},
+    {"ticker": "BIAT", "score": 1480, "version": None},
+]
+
+
+@pytest.fixture
+def cache():
+    cache = ScoreCache(flush_size=4, flush_interval=60)
+    cache.load(ROWS)
+    return cache
+
+
+def queue(cache, url, ticker, change):
+    cache.add_article({"url": url, "title": url, "content": "", "published_date": "02/01/2024", "analysis_json": {}})
+    return cache.apply(ticker, change, "test", None, sentiment=1, article_url=url)
+
+
+def test_pending_rows_carry_the_version_they_were_based_on(cache):
+    assert queue(cache, "a", "AMEN BANK", 10) == (1500, 1510)
+    queue(cache, "b", "SFBT", -5)
+
+    scores, history, articles = cache.pending()
+    assert scores == [{"ticker": "AMEN BANK", "score": 1510, "version": 3},
+                      {"ticker": "SFBT", "score": 1515, "version": 0}]
+    assert [(h["ticker"], h["article_url"]) for h in history] == [("AMEN BANK", "a"), ("SFBT", "b")]
+    assert [a["url"] for a in articles] == ["a", "b"]
+    assert cache.market_average(0) == pytest.approx((1510 + 1515 + 1480) / 3)
+
+
+def test_an_article_is_queued_once(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    assert not cache.add_article({"url": "a"})
+    assert cache.stats()["pending_articles"] == 1
+
+
+def test_mark_flushed_bumps_versions_of_changed_rows_only(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    queue(cache, "b", "SFBT", 4)
+    queue(cache, "c", "SFBT", -4)  # Back to the stored score: the database keeps the version
+    cache.mark_flushed()
+
+    assert cache.versions == {"AMEN BANK": 4, "SFBT": 0, "BIAT": 0}
+    assert cache.base["AMEN BANK"] == 1510
+    assert not cache.has_pending() and cache.pending() == ([], [], [])
+
+    queue(cache, "d", "AMEN BANK", 1)
+    assert cache.pending()[0] == [{"ticker": "AMEN BANK", "score": 1511, "version": 4}]
+
+
+def test_rebase_replays_local_changes_on_the_stored_row(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    queue(cache, "b", "AMEN BANK", 2)
+
+    # Another writer moved AMEN BANK to 1490 (version 5) in the meantime
+    cache.rebase([{"ticker": "AMEN BANK", "score": 1490, "version": 5}])
+    assert cache.get("AMEN BANK") == 1502
+    assert cache.pending()[0] == [{"ticker": "AMEN BANK", "score": 1502, "version": 5}]
+    assert len(cache.pending()[1]) == 2
+    assert cache.market_average(0) == pytest.approx((1502 + 1520 + 1480) / 3)
+
+    cache.mark_flushed()
+    assert cache.versions["AMEN BANK"] == 6 and cache.base["AMEN BANK"] == 1502
+
+
+def test_rebase_drops_changes_of_a_deleted_row(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    queue(cache, "b", "SFBT", 3)
+    cache.rebase([{"ticker": "AMEN BANK", "score": None, "version": None}])
+
+    assert "AMEN BANK" not in cache
+    assert cache.pending()[0] == [{"ticker": "SFBT", "score": 1523, "version": 0}]
+    assert [h["ticker"] for h in cache.pending()[1]] == ["SFBT"]
+    assert cache.market_average(0) == pytest.approx((1523 + 1480) / 2)
+
+
+def test_drop_articles_reverts_their_changes(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    queue(cache, "b", "AMEN BANK", 2)
+    queue(cache, "c", "SFBT", 3)
+    cache.drop_articles(["a", "c"])
+
+    assert cache.get("AMEN BANK") == 1502 and cache.get("SFBT") == 1520
+    _, history, articles = cache.pending()
+    assert [a["url"] for a in articles] == ["b"]
+    assert [(h["ticker"], h["article_url"]) for h in history] == [("AMEN BANK", "b")]
+    assert cache.market_average(0) == pytest.approx((1502 + 1520 + 1480) / 3)
+
+    # SFBT is back at its stored score: written unchanged, its version kept
+    cache.mark_flushed()
+    assert cache.versions["SFBT"] == 0 and cache.versions["AMEN BANK"] == 4
+
+
+def test_should_flush_on_size_or_interval(cache, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(score_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache.load(ROWS)
+    assert not cache.should_flush()
+
+    queue(cache, "a", "AMEN BANK", 1)
+    assert not cache.should_flush()
+    queue(cache, "b", "SFBT", 1)  # 2 articles + 2 history rows
+    assert cache.should_flush()
+
+    cache.mark_flushed()
+    queue(cache, "c", "AMEN BANK", 1)
+    now[0] += 59
+    assert not cache.should_flush()
+    now[0] += 1
+    assert cache.should_flush()
+
+
+class FakeRpc:
+    """apply_score_batch answering with the queued responses, recording each call"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.responses.pop(0)))
+
+
+def write_behind_db(supabase, cache):
+    pytest.importorskip("dotenv")
+    from db_manager import DBManager
+
+    db = object.__new__(DBManager)
+    db._configure(write_behind=True)
+    db.supabase = supabase
+    db.score_cache = cache
+    return db
+
+
+def test_flush_rebases_on_a_version_conflict_and_retries(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    supabase = FakeRpc([
+        {"conflicts": [{"ticker": "AMEN BANK", "score": 1490, "version": 5}], "duplicates": []},
+        {"conflicts": [], "duplicates": [], "article_ids": {"a": 7}},
+    ])
+    db = write_behind_db(supabase, cache)
+
+    assert asyncio.run(db.flush_scores())
+    first, retry = (params["p_scores"] for _, params in supabase.calls)
+    assert first == [{"ticker": "AMEN BANK", "score": 1510, "version": 3}]
+    assert retry == [{"ticker": "AMEN BANK", "score": 1500, "version": 5}]
+    assert db.take_saved_articles() == {"a": 7}
+    assert cache.versions["AMEN BANK"] == 6 and not cache.has_pending()
+
+
+def test_flush_drops_articles_stored_by_another_writer(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    queue(cache, "b", "SFBT", 3)
+    supabase = FakeRpc([
+        {"conflicts": [], "duplicates": ["a"]},
+        {"conflicts": [], "duplicates": [], "article_ids": {"b": 8}},
+    ])
+    db = write_behind_db(supabase, cache)
+
+    assert asyncio.run(db.flush_scores())
+    retry = supabase.calls[1][1]
+    assert [a["url"] for a in retry["p_articles"]] == ["b"]
+    assert [h["ticker"] for h in retry["p_history"]] == ["SFBT"]
+    assert db.take_saved_articles() == {"a": None, "b": 8}
+    assert cache.get("AMEN BANK") == 1500
+
+
+def test_flush_gives_up_and_keeps_changes_after_repeated_conflicts(cache):
+    queue(cache, "a", "AMEN BANK", 10)
+    conflict = {"conflicts": [{"ticker": "AMEN BANK", "score": 1490, "version": 5}], "duplicates": []}
+    db = write_behind_db(FakeRpc([conflict] * 3), cache)
+
+    assert not asyncio.run(db.flush_scores(max_attempts=3))
+    assert cache.has_pending() and db.take_saved_articles() == {}
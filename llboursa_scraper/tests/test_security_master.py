@@ -0,0 +1,95 @@
+import json
+import threading
+
+import pytest
+
+from security_master import SecurityMaster
+
+STOCKS = {
+    "banks": [{"name": "AMEN BANK", "ticker": "AMEN BANK"},
+              {"name": "BANQUE DE TUNISIE", "ticker": "BANQUE DE TUNISIE"},
+              {"name": "BANQUE INTERNATIONALE ARABE DE TUNISIE", "ticker": "BIAT"}],
+    "food": [{"name": "SOCIETE FRIGORIFIQUE ET BRASSERIE DE TUNIS", "ticker": "SFBT"}],
+}
+ALIASES = {
+    "tickers": {"SFBT": ["Brasserie de Tunis"]},
+    "strict_tickers": {"BANQUE DE TUNISIE": ["BT"]},
+}
+ISINS = {
+    "TN0002200053": {"ticker": "BANQUE DE TUNISIE", "exchange_name": "BT"},
+    "TN0001100254": {"ticker": "SFBT", "exchange_name": "SFBT"},
+    "TN9999999999": {"ticker": "DELISTED", "exchange_name": "GONE"},
+}
+
+
+@pytest.fixture
+def master(tmp_path):
+    files = {}
+    for name, data in (("stocks", STOCKS), ("aliases", ALIASES), ("isins", ISINS)):
+        files[name] = tmp_path / f"{name}.json"
+        files[name].write_text(json.dumps(data), encoding="utf-8")
+    return SecurityMaster(files["stocks"], files["aliases"], str(files["isins"]))
+
+
+@pytest.mark.parametrize("key", ["TN0002200053", " tn0002200053 ", "BANQUE DE TUNISIE", "Banque de Tunisie", "BT"])
+def test_every_key_resolves_to_the_same_security(master, key):
+    assert master.ticker_for(key) == "BANQUE DE TUNISIE"
+    assert master.isin_for(key) == "TN0002200053"
+    assert master.sector_for(key) == "banks"
+
+
+def test_aliases_and_company_names_resolve(master):
+    assert master.ticker_for("brasserie de tunis") == "SFBT"
+    assert master.ticker_for("Banque Internationale Arabe de Tunisie") == "BIAT"
+    assert master.get("SFBT").aliases == ("SOCIETE FRIGORIFIQUE ET BRASSERIE DE TUNIS", "Brasserie de Tunis")
+    assert master.ticker_for("UNKNOWN CO") is None and master.ticker_for("") is None and master.ticker_for(None) is None
+    # An ISIN of a ticker outside the universe is not indexed
+    assert master.ticker_for("TN9999999999") is None
+
+
+def test_register_isin_round_trips(master):
+    assert master.isin_for("BIAT") is None
+    assert master.register_isin(" tn0001800457 ", "Banque Internationale Arabe de Tunisie") == "BIAT"
+
+    assert master.ticker_for("TN0001800457") == "BIAT"
+    assert master.isin_for("BIAT") == "TN0001800457"
+    assert master.get("TN0001800457") == master.get("BIAT")
+    assert master.stats()["with_isin"] == 3
+
+    # Registering again returns the mapped ticker, whatever the name
+    assert master.register_isin("TN0001800457", "anything") == "BIAT"
+
+
+def test_register_isin_refuses_unknown_names_and_second_lines(master):
+    assert master.register_isin("TN0003400058", "AMEN BNK") is None  # No fuzzy matching
+    assert master.ticker_for("TN0003400058") is None
+
+    # A second ISIN (e.g. a preferred share) of an already mapped company
+    assert master.register_isin("TN0002200099", "BT") is None
+    assert master.isin_for("BT") == "TN0002200053"
+    assert master.ticker_for("TN0002200099") is None
+
+
+def test_concurrent_registrations_map_each_isin_once(master):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(master.register_isin("TN0003400058", "AMEN BANK")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["AMEN BANK"] * 8
+    assert master.isin_for("AMEN BANK") == "TN0003400058"
+
+
+def test_shipped_data_resolves_the_documented_examples(monkeypatch):
+    monkeypatch.delenv("SECURITY_MASTER_PATH", raising=False)
+    master = SecurityMaster()
+    assert master.ticker_for("TN0002200053") == "BANQUE DE TUNISIE"
+    assert master.isin_for("BANQUE DE TUNISIE") == "TN0002200053"
+    assert master.sector_for("BT") == "banks"
+    # Every ISIN on file points at a ticker of the universe
+    with open("security_master.json", encoding="utf-8") as f:
+        for isin, entry in json.load(f).items():
+            assert master.ticker_for(isin) == entry["ticker"], isin
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from article_cleaner import merge_chunk_impacts
+from stock_manager import StockManager
+
+
+@pytest.fixture
+def stock_manager(tmp_path):
+    return StockManager(score_file=str(tmp_path / "scores.json"))
+
+
+def test_merged_and_string_scores_are_expanded(stock_manager):
+    impacts = merge_chunk_impacts([
+        [{"type": "ticker", "target": "AMEN BANK", "sentiment_score": -3.5, "reasoning": "a"}],
+        [{"type": "sector", "target": "banks", "sentiment_score": "+2", "reasoning": "b"}],
+    ])
+    expanded = stock_manager.expand_impacts(impacts)
+
+    assert expanded[0] == {"type": "ticker", "target": "AMEN BANK", "sentiment_score": -4, "reasoning": "a"}
+    assert expanded[1]["type"] == "sector" and expanded[1]["sentiment_score"] == 2
+    banks = stock_manager.get_stocks_in_sector("banks")
+    assert [i["target"] for i in expanded[2:]] == banks
+    assert all(i["sentiment_score"] == 2 for i in expanded[2:])
+
+
+def test_impacts_without_a_numeric_score_are_dropped(stock_manager):
+    impacts = [{"type": "ticker", "target": "AMEN BANK", "sentiment_score": "positive"},
+               {"type": "ticker", "target": "AMEN BANK", "sentiment_score": None}]
+    assert stock_manager.expand_impacts(impacts) == []
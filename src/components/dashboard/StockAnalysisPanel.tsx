@@ -1,5 +1,5 @@
 import { motion } from "framer-motion";
-import { useSentimentByStock, computeStockSentiment } from "@/hooks/useSentimentData";
+import { useSentimentByStock, useStockSentimentSummary, computeStockSentiment } from "@/hooks/useSentimentData";
 import { SentimentTimeline } from "./SentimentTimeline";
 import { RecommendationCard } from "./RecommendationCard";
 import { RecentArticles } from "./RecentArticles";
@@ -11,6 +11,7 @@ type Props = {
 
 export const StockAnalysisPanel = ({ stockName }: Props) => {
   const { data, isLoading } = useSentimentByStock(stockName);
+  const { data: summary } = useStockSentimentSummary(stockName);
 
   if (isLoading) {
     return (
@@ -49,10 +50,10 @@ export const StockAnalysisPanel = ({ stockName }: Props) => {
     >
       <RecommendationCard
         stockName={stockName}
-        recommendation={stockSentiment.recommendation}
-        confidence={Number(stockSentiment.confidence)}
-        avgScore={stockSentiment.avgScore}
-        totalArticles={stockSentiment.totalArticles}
+        recommendation={summary?.last_recommendation ?? stockSentiment.recommendation}
+        confidence={Number(summary?.last_confidence ?? stockSentiment.confidence)}
+        avgScore={summary ? Number(summary.avg_score) : stockSentiment.avgScore}
+        totalArticles={summary?.mention_count ?? stockSentiment.totalArticles}
       />
       <SentimentTimeline data={stockSentiment.timeline} title={`Sentiment - ${stockName}`} />
       <RecentArticles articles={stockSentiment.recentArticles} title="Articles Associés" />
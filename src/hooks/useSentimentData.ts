@@ -1,7 +1,10 @@
 import { useQuery } from "@tanstack/react-query";
 import { supabase } from "@/integrations/supabase/client";
+import type { Tables } from "@/integrations/supabase/types";
 import type { SentimentAnalysis } from "@/types";
 
+export type StockSentimentSummary = Tables<"stock_sentiment_summary">;
+
 /**
  * Hook pour récupérer toutes les analyses de sentiment
  * 
@@ -67,6 +70,40 @@ export const useSentimentByStock = (stockSymbol: string) => {
 
 };
 
+/**
+ * Hook pour récupérer le résumé agrégé d'une valeur (une seule ligne,
+ * maintenue côté serveur à chaque nouvelle analyse)
+ *
+ * @param stockSymbol - Symbole de la valeur (ex: "BNA", "STB", "ATTIJARI BANK")
+ * @returns Query object avec le résumé (ou null si aucune analyse)
+ *
+ * @example
+ * ```tsx
+ * const { data: summary } = useStockSentimentSummary("BNA");
+ * ```
+ */
+export const useStockSentimentSummary = (stockSymbol: string) => {
+  return useQuery({
+    queryKey: ["stock-sentiment-summary", stockSymbol],
+    queryFn: async () => {
+      const { data, error } = await supabase
+        .from("stock_sentiment_summary")
+        .select("*")
+        .eq("stock_name", stockSymbol)
+        .maybeSingle();
+
+      if (error) {
+        console.error(`Error fetching sentiment summary for ${stockSymbol}:`, error);
+        throw error;
+      }
+
+      return data as StockSentimentSummary | null;
+    },
+    enabled: !!stockSymbol && stockSymbol.trim().length > 0,
+    staleTime: 5 * 60 * 1000,
+  });
+};
+
 export const useAnalyzeSentiment = () => {
   const analyze = async (limit = 20) => {
     const { data, error } = await supabase.functions.invoke("analyze-sentiment", {
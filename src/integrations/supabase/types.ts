@@ -209,6 +209,48 @@ export type Database = {
         }
         Relationships: []
       }
+      stock_sentiment_summary: {
+        Row: {
+          avg_score: number
+          last_analyzed_at: string | null
+          last_confidence: number | null
+          last_recommendation: string | null
+          mention_count: number
+          negative_count: number
+          neutral_count: number
+          positive_count: number
+          recent_score: number
+          stock_name: string
+          updated_at: string
+        }
+        Insert: {
+          avg_score?: number
+          last_analyzed_at?: string | null
+          last_confidence?: number | null
+          last_recommendation?: string | null
+          mention_count?: number
+          negative_count?: number
+          neutral_count?: number
+          positive_count?: number
+          recent_score?: number
+          stock_name: string
+          updated_at?: string
+        }
+        Update: {
+          avg_score?: number
+          last_analyzed_at?: string | null
+          last_confidence?: number | null
+          last_recommendation?: string | null
+          mention_count?: number
+          negative_count?: number
+          neutral_count?: number
+          positive_count?: number
+          recent_score?: number
+          stock_name?: string
+          updated_at?: string
+        }
+        Relationships: []
+      }
       user_portfolio_holdings: {
         Row: {
           created_at: string
@@ -0,0 +1,124 @@
+
+-- Per-stock sentiment summary read by the dashboard in one small query
+-- (instead of downloading every sentiment analysis and aggregating client-side).
+-- recent_score is an exponential moving average (alpha = 0.3) over the stock's
+-- analyses, newest weighted most.
+CREATE TABLE public.stock_sentiment_summary (
+  stock_name TEXT NOT NULL PRIMARY KEY,
+  mention_count INTEGER NOT NULL DEFAULT 0,
+  avg_score NUMERIC NOT NULL DEFAULT 0,
+  recent_score NUMERIC NOT NULL DEFAULT 0,
+  positive_count INTEGER NOT NULL DEFAULT 0,
+  negative_count INTEGER NOT NULL DEFAULT 0,
+  neutral_count INTEGER NOT NULL DEFAULT 0,
+  last_recommendation TEXT,
+  last_confidence NUMERIC,
+  last_analyzed_at TIMESTAMP WITH TIME ZONE,
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- Enable RLS
+ALTER TABLE public.stock_sentiment_summary ENABLE ROW LEVEL SECURITY;
+
+-- Public read access (same as sentiment_analyses); written only by triggers
+CREATE POLICY "Anyone can view stock sentiment summary"
+  ON public.stock_sentiment_summary
+  FOR SELECT
+  USING (true);
+
+-- Recompute the summary rows of the given stocks from their analyses
+-- (uses the GIN index on affected_stocks)
+CREATE OR REPLACE FUNCTION public.refresh_stock_sentiment_summary(p_stocks TEXT[])
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  DELETE FROM public.stock_sentiment_summary WHERE stock_name = ANY (p_stocks);
+
+  INSERT INTO public.stock_sentiment_summary (
+    stock_name, mention_count, avg_score, recent_score,
+    positive_count, negative_count, neutral_count,
+    last_recommendation, last_confidence, last_analyzed_at, updated_at
+  )
+  SELECT
+    stock_name,
+    COUNT(*),
+    AVG(sentiment_score),
+    SUM(0.3 * power(0.7, age) * sentiment_score),
+    COUNT(*) FILTER (WHERE sentiment = 'positive'),
+    COUNT(*) FILTER (WHERE sentiment = 'negative'),
+    COUNT(*) FILTER (WHERE sentiment = 'neutral'),
+    MAX(recommendation) FILTER (WHERE age = 0),
+    MAX(confidence_score) FILTER (WHERE age = 0),
+    MAX(analyzed_at),
+    now()
+  FROM (
+    SELECT
+      s.stock_name,
+      a.sentiment,
+      a.sentiment_score,
+      a.recommendation,
+      a.confidence_score,
+      a.analyzed_at,
+      ROW_NUMBER() OVER (PARTITION BY s.stock_name ORDER BY a.analyzed_at DESC, a.id DESC) - 1 AS age
+    FROM unnest(p_stocks) AS s(stock_name)
+    JOIN public.sentiment_analyses a ON a.affected_stocks @> ARRAY[s.stock_name]
+  ) ranked
+  GROUP BY stock_name;
+END;
+$$;
+
+-- Only called from the triggers below
+REVOKE EXECUTE ON FUNCTION public.refresh_stock_sentiment_summary(TEXT[]) FROM PUBLIC, anon, authenticated;
+
+-- Refresh once per statement (the analyze-sentiment function upserts a whole
+-- batch at a time), touching only the stocks named by the changed rows
+CREATE OR REPLACE FUNCTION public.sentiment_analyses_refresh_summary()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_stocks TEXT[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(DISTINCT stock) INTO v_stocks FROM new_rows, unnest(new_rows.affected_stocks) AS stock;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(DISTINCT stock) INTO v_stocks FROM old_rows, unnest(old_rows.affected_stocks) AS stock;
+  ELSE
+    SELECT array_agg(DISTINCT stock) INTO v_stocks FROM (
+      SELECT unnest(affected_stocks) AS stock FROM new_rows
+      UNION
+      SELECT unnest(affected_stocks) AS stock FROM old_rows
+    ) changed;
+  END IF;
+
+  IF v_stocks IS NOT NULL THEN
+    PERFORM public.refresh_stock_sentiment_summary(v_stocks);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER sentiment_analyses_summary_insert
+  AFTER INSERT ON public.sentiment_analyses
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.sentiment_analyses_refresh_summary();
+
+CREATE TRIGGER sentiment_analyses_summary_update
+  AFTER UPDATE ON public.sentiment_analyses
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.sentiment_analyses_refresh_summary();
+
+CREATE TRIGGER sentiment_analyses_summary_delete
+  AFTER DELETE ON public.sentiment_analyses
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.sentiment_analyses_refresh_summary();
+
+-- Initial build from existing analyses
+SELECT public.refresh_stock_sentiment_summary(
+  ARRAY(SELECT DISTINCT unnest(affected_stocks) FROM public.sentiment_analyses)
+);